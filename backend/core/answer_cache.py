@@ -0,0 +1,182 @@
+# backend/core/answer_cache.py
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator
+from cachetools import TTLCache
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Answers the LLM wrapper yields when generation failed; these must never be cached.
+_ERROR_PREFIX = "An error occurred while generating"
+
+def normalize_question(question: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+def conversation_fingerprint(chat_history: list[dict] | None, summary: str = "") -> str:
+    """
+    Identifies the conversation a question was asked in, as far as the prompt
+    sees it. Empty for a fresh conversation, so opening questions are shared.
+    """
+    if not chat_history and not summary:
+        return ""
+    digest = hashlib.sha256(summary.encode("utf-8"))
+    for message in chat_history or ():
+        for part in (message["sender"], message["text"]):
+            digest.update(b"\x00")
+            digest.update(part.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+class CachedAnswer:
+    def __init__(self, answer: str, sources: list[str]):
+        self.answer = answer
+        self.sources = sources
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 3600, semantic_threshold: float | None = 0.95):
+        """
+        Caches finished answers per document.
+
+        Entries are keyed by (document, conversation, normalized question,
+        retrieved chunk IDs) and expire by TTL or LRU eviction. The
+        conversation is a `conversation_fingerprint`, so a follow-up like "what
+        about the second one?" is only answered from the cache within the same
+        conversation state. If `semantic_threshold` is set, a question whose
+        embedding is at least that similar to a cached question with the same
+        conversation and retrieved chunks also counts as a hit.
+        """
+        self.entries = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self.semantic_threshold = semantic_threshold
+        # document -> {cache key: (unit question embedding, (conversation, chunk ids key))}
+        self._embeddings: dict[str, OrderedDict] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(document: str, question: str, chunk_ids: list[str], conversation: str) -> tuple:
+        return document, conversation, normalize_question(question), tuple(sorted(chunk_ids))
+
+    @staticmethod
+    def _unit(embedding: list[float]) -> "np.ndarray":
+        # numpy is only needed for near-duplicate matching; importing it lazily keeps startup fast.
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(
+        self,
+        document: str,
+        question: str,
+        chunk_ids: list[str],
+        question_embedding: list[float] | None = None,
+        conversation: str = "",
+    ) -> CachedAnswer | None:
+        key = self._key(document, question, chunk_ids, conversation)
+        with self._lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.exact_hits += 1
+                return cached
+            if self.semantic_threshold is not None and question_embedding is not None:
+                cached = self._semantic_lookup(document, (key[1], key[3]), self._unit(question_embedding))
+                if cached is not None:
+                    self.semantic_hits += 1
+                    return cached
+            self.misses += 1
+            return None
+
+    def _semantic_lookup(self, document: str, scope: tuple, query: "np.ndarray") -> CachedAnswer | None:
+        candidates = self._embeddings.get(document)
+        if not candidates:
+            return None
+        best, best_score = None, self.semantic_threshold
+        for key, (embedding, candidate_scope) in list(candidates.items()):
+            cached = self.entries.get(key)
+            if cached is None:
+                # Expired or evicted from the main cache.
+                del candidates[key]
+                continue
+            if candidate_scope != scope:
+                continue
+            score = float(embedding @ query)
+            if score >= best_score:
+                best, best_score = cached, score
+        return best
+
+    def put(
+        self,
+        document: str,
+        question: str,
+        chunk_ids: list[str],
+        answer: CachedAnswer,
+        question_embedding: list[float] | None = None,
+        conversation: str = "",
+    ):
+        key = self._key(document, question, chunk_ids, conversation)
+        with self._lock:
+            self.entries[key] = answer
+            if self.semantic_threshold is not None and question_embedding is not None:
+                candidates = self._embeddings.setdefault(document, OrderedDict())
+                candidates[key] = (self._unit(question_embedding), (key[1], key[3]))
+                # Bound the side index the same way as the main cache.
+                while len(candidates) > self.entries.maxsize:
+                    candidates.popitem(last=False)
+
+    def drop_document(self, document: str):
+        """Forgets every answer for a document, e.g. when its collection is deleted."""
+        with self._lock:
+            for key in [key for key in self.entries.keys() if key[0] == document]:
+                self.entries.pop(key, None)
+            self._embeddings.pop(document, None)
+
+    async def replay(self, cached: CachedAnswer, piece_size: int = 64) -> AsyncGenerator[str, None]:
+        """Streams a cached answer back in small pieces, like a live generation."""
+        for start in range(0, len(cached.answer), piece_size):
+            yield cached.answer[start:start + piece_size]
+
+    async def record(
+        self,
+        stream: AsyncIterator[str],
+        document: str,
+        question: str,
+        chunk_ids: list[str],
+        sources: list[str],
+        question_embedding: list[float] | None = None,
+        conversation: str = "",
+    ) -> AsyncGenerator[str, None]:
+        """Passes a live answer stream through and caches it once it completes successfully."""
+        pieces = []
+        async for piece in stream:
+            pieces.append(piece)
+            yield piece
+        answer = "".join(pieces)
+        if answer and _ERROR_PREFIX not in answer:
+            self.put(document, question, chunk_ids, CachedAnswer(answer, sources), question_embedding, conversation)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.entries.maxsize,
+            }
+
+_semantic_threshold = os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95")
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+    # An empty value turns off near-duplicate matching.
+    semantic_threshold=float(_semantic_threshold) if _semantic_threshold else None,
+)
@@ -1,29 +1,150 @@
 # backend/core/chunker.py
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import hashlib
+import os
+from collections import deque
+from typing import Callable, Iterable, Iterator
 
-def chunk_text(text: str) -> list[str]:
+from .context_builder import estimate_tokens
+
+# Preferred split points, best first; a hard cut is the last resort.
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+# Segments (pages, paragraphs) are joined with a blank line in the virtual document.
+_SEGMENT_JOINER = "\n\n"
+# Long segments are fed in slices so the working buffer stays small.
+_FEED_SIZE = 64 * 1024
+
+# Sizes are in CHUNK_UNIT ('chars' or 'tokens'); the defaults match the previous splitter.
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+
+class Chunk:
+    def __init__(self, text: str, start: int, end: int, segment):
+        """
+        A chunk of a document stream.
+
+        `start` and `end` are character offsets into the document (segments
+        joined by a blank line), `segment` is the page or paragraph number the
+        chunk starts in, and `content_hash` is a stable SHA-256 of the text.
+        """
+        self.text = text
+        self.start = start
+        self.end = end
+        self.segment = segment
+        self.content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _split_point(text: str, limit: int, start: int = 0) -> int:
+    """
+    Offset from `start` just after the best separator in text[start:start + limit],
+    preferring the latter half.
+    """
+    floor = limit // 2
+    for separator in _SEPARATORS:
+        position = text.rfind(separator, start + floor, start + limit)
+        if position != -1:
+            return position - start + len(separator)
+    return limit
+
+def iter_chunks(
+    segments: Iterable[tuple[object, str]],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    unit: str = "chars",
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Chunk]:
     """
-    Splits a long text into smaller, manageable chunks.
+    Splits a stream of (segment_id, text) pairs into overlapping chunks.
+
+    Text is consumed incrementally and chunks are yielded as soon as they are
+    complete, so memory stays bounded by the chunk size regardless of document
+    length, and every character is scanned a constant number of times.
 
     Args:
-        text: The full text content of the document.
+        segments: (page or paragraph number, text) pairs, in document order.
+        chunk_size: Maximum chunk length, in characters or tokens.
+        chunk_overlap: Overlap carried into the next chunk, in the same unit.
+        unit: 'chars' or 'tokens'.
+        token_counter: Counts tokens when unit is 'tokens'.
 
-    Returns:
-        A list of strings, where each string is a text chunk.
+    Yields:
+        Chunk objects with their offsets, segment and content hash.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        # Set a chunk size that's reasonable for context.
-        # This can be tuned depending on the LLM's context window.
-        chunk_size=1000, 
-        
-        # Add a small overlap between chunks to maintain context continuity.
-        chunk_overlap=200, 
-        
-        length_function=len,
-        is_separator_regex=False,
-    )
-    
-    chunks = text_splitter.split_text(text)
-    print(f"Text split into {len(chunks)} chunks.")
-    return chunks
\ No newline at end of file
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size.")
+    if unit == "tokens":
+        # Size the character window from the estimate, then verify with the real counter.
+        max_chars, overlap_chars = chunk_size * 4, chunk_overlap * 4
+    elif unit == "chars":
+        max_chars, overlap_chars = chunk_size, chunk_overlap
+    else:
+        raise ValueError(f"Unknown chunk size unit: {unit}")
+
+    buffer = ""
+    position = 0  # where the unchunked text starts in buffer
+    buffer_start = 0  # document offset of buffer[position]
+    boundaries = deque()  # (document offset, segment id) for segment starts
+    document_length = 0
+
+    def emit(final: bool) -> Iterator[Chunk]:
+        nonlocal position, buffer_start
+        while len(buffer) - position > max_chars or (final and buffer[position:].strip()):
+            remaining = len(buffer) - position
+            if remaining <= max_chars:
+                end = remaining
+            else:
+                end = _split_point(buffer, max_chars, position)
+            if unit == "tokens":
+                while end > 1 and token_counter(buffer[position:position + end]) > chunk_size:
+                    end = _split_point(buffer, end - 1, position)
+
+            raw = buffer[position:position + end]
+            text = raw.strip()
+            if text:
+                start = buffer_start + (len(raw) - len(raw.lstrip()))
+                while len(boundaries) > 1 and boundaries[1][0] <= start:
+                    boundaries.popleft()
+                segment = boundaries[0][1] if boundaries else None
+                yield Chunk(text, start, start + len(text), segment)
+
+            if end >= remaining:
+                buffer_start += remaining
+                position = len(buffer)
+                return
+            # Start the next chunk inside the overlap, on a word boundary.
+            next_start = max(end - overlap_chars, 1)
+            boundary = max(
+                buffer.rfind(" ", position, position + next_start), buffer.rfind("\n", position, position + next_start)
+            )
+            if boundary != -1 and boundary - position + 1 > end // 2:
+                next_start = boundary - position + 1
+            position += next_start
+            buffer_start += next_start
+
+    def feed(piece: str):
+        nonlocal buffer, position
+        # Consumed text is only dropped when new text arrives, not after every chunk.
+        if position:
+            buffer = buffer[position:]
+            position = 0
+        buffer += piece
+
+    first = True
+    for segment, text in segments:
+        if not text:
+            continue
+        if not first:
+            feed(_SEGMENT_JOINER)
+            document_length += len(_SEGMENT_JOINER)
+        first = False
+        boundaries.append((document_length, segment))
+        for offset in range(0, len(text), _FEED_SIZE):
+            piece = text[offset:offset + _FEED_SIZE]
+            feed(piece)
+            document_length += len(piece)
+            yield from emit(final=False)
+    yield from emit(final=True)
+
+def chunk_document(segments: Iterable[tuple[object, str]]) -> Iterator[Chunk]:
+    """Chunks a document stream with the configured size, overlap and unit."""
+    return iter_chunks(segments, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT)
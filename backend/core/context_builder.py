@@ -0,0 +1,136 @@
+# backend/core/context_builder.py
+
+import os
+from typing import Dict, List
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+def _overlap(left: str, right: str, min_overlap: int, max_overlap: int) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    probe = right[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    tail = left[-max_overlap:]
+    start = tail.find(probe)
+    # The earliest match in the tail is the longest candidate overlap.
+    while start != -1:
+        if right.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+def merge_overlapping_chunks(chunks: list[str], min_overlap: int = 20, max_overlap: int = 1000) -> list[str]:
+    """
+    Stitches chunks that overlap (as adjacent chunks from the splitter do) back
+    into contiguous spans and drops chunks fully contained in another span.
+    Spans keep the relevance order of their first chunk.
+    """
+    spans: list[tuple[int, str]] = []
+    for order, chunk in enumerate(chunks):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        # Keep absorbing existing spans until nothing else touches this one.
+        while True:
+            for i, (span_order, span) in enumerate(spans):
+                if chunk in span:
+                    combined = span
+                elif span in chunk:
+                    combined = chunk
+                elif overlap := _overlap(span, chunk, min_overlap, max_overlap):
+                    combined = span + chunk[overlap:]
+                elif overlap := _overlap(chunk, span, min_overlap, max_overlap):
+                    combined = chunk + span[overlap:]
+                else:
+                    continue
+                spans.pop(i)
+                order, chunk = min(order, span_order), combined
+                break
+            else:
+                break
+        spans.append((order, chunk))
+    spans.sort()
+    return [span for _, span in spans]
+
+class PromptContext:
+    def __init__(self, context_str: str, history_str: str, usage: dict):
+        """The budgeted pieces of an answer prompt plus the token counts used."""
+        self.context_str = context_str
+        self.history_str = history_str
+        self.usage = usage
+
+class ContextBuilder:
+    def __init__(self, context_budget: int = 6000, history_budget: int = 1500):
+        """
+        Assembles document context and chat history within token budgets.
+
+        Overlapping chunks are merged before budgeting so shared text is only
+        paid for once; the most relevant spans are kept first. History keeps
+        the most recent turns that fit and notes how many were left out; a
+        conversation summary, if any, comes out of the history budget first.
+        """
+        self.context_budget = context_budget
+        self.history_budget = history_budget
+
+    def _fit_context(self, chunks: list[str]) -> tuple[list[str], int, int]:
+        spans, used, dropped = [], 0, 0
+        for span in merge_overlapping_chunks(chunks):
+            remaining = self.context_budget - used
+            if estimate_tokens(span) > remaining:
+                # A relevant span is better cut short than lost, if a useful amount still fits.
+                if remaining < 64:
+                    dropped += 1
+                    continue
+                span = span[:remaining * 4]
+            spans.append(span)
+            used += estimate_tokens(span)
+        return spans, used, dropped
+
+    def _fit_history(self, chat_history: List[Dict[str, str]], budget: int) -> tuple[list[str], int, int]:
+        lines, used = [], 0
+        for message in reversed(chat_history):
+            role = "User" if message.get('sender') == 'user' else "Assistant"
+            line = f"{role}: {message.get('text')}"
+            tokens = estimate_tokens(line)
+            if used + tokens > budget:
+                break
+            lines.append(line)
+            used += tokens
+        lines.reverse()
+        return lines, used, len(chat_history) - len(lines)
+
+    def build(self, question: str, context_chunks: list[str], chat_history: List[Dict[str, str]], summary: str = "") -> PromptContext:
+        spans, context_tokens, dropped_spans = self._fit_context(context_chunks)
+        if summary:
+            # The summary never takes more than half the history budget.
+            summary = f"Summary of the earlier conversation: {summary[:self.history_budget * 2]}"
+        summary_tokens = estimate_tokens(summary)
+        history_lines, history_tokens, omitted_messages = self._fit_history(chat_history, self.history_budget - summary_tokens)
+
+        if omitted_messages:
+            history_lines.insert(0, f"[{omitted_messages} earlier messages omitted]")
+        if summary:
+            history_lines.insert(0, summary)
+        history_tokens += summary_tokens
+        history_str = "\n".join(history_lines) if history_lines else "No previous conversation history."
+
+        question_tokens = estimate_tokens(question)
+        usage = {
+            "context_tokens": context_tokens,
+            "history_tokens": history_tokens,
+            "summary_tokens": summary_tokens,
+            "question_tokens": question_tokens,
+            "total_tokens": context_tokens + history_tokens + question_tokens,
+            "chunks_in": len(context_chunks),
+            "spans_used": len(spans),
+            "spans_dropped": dropped_spans,
+            "messages_omitted": omitted_messages,
+        }
+        return PromptContext("\n---\n".join(spans), history_str, usage)
+
+context_builder = ContextBuilder(
+    context_budget=int(os.getenv("PROMPT_CONTEXT_TOKENS", "6000")),
+    history_budget=int(os.getenv("PROMPT_HISTORY_TOKENS", "1500")),
+)
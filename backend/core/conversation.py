@@ -0,0 +1,181 @@
+# backend/core/conversation.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable
+
+from .metrics import metrics
+from .streaming import SuggestionSplitter
+
+# Given the current summary and the messages aging out of the window, returns the new summary.
+Summarizer = Callable[[str, list[dict]], Awaitable[str]]
+
+class ConversationState:
+    def __init__(self, summary: str, recent: list[dict], total_messages: int):
+        """A session's conversation as prompts see it: a rolling summary plus every message it doesn't cover yet."""
+        self.summary = summary
+        self.recent = recent
+        self.total_messages = total_messages
+
+class ConversationStore:
+    def __init__(self, path: str = "./sessions.db", recent_messages: int = 6, fold_batch: int = 4):
+        """
+        Keeps each session's conversation on the server.
+
+        Messages are sent to the LLM verbatim until they are folded into a
+        rolling summary. Folding happens in the background once `fold_batch`
+        messages have aged out of the last `recent_messages`, so each summary
+        update costs the same no matter how long the session is. Until a fold
+        succeeds, the aged-out messages stay verbatim rather than vanish.
+        Stored in the shared SQLite database, next to the sessions themselves.
+        """
+        self.recent_messages = recent_messages
+        self.fold_batch = fold_batch
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " session_id TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL DEFAULT '',"
+            " summarized_through INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " sender TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        self._conn.commit()
+
+    def append(self, session_id: str, messages: list[dict]):
+        """Adds messages ({'sender', 'text'}) to the end of a session's conversation."""
+        now = time.time()
+        with self._lock:
+            # Take the write lock first so workers appending to one session can't pick the same seq.
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("INSERT OR IGNORE INTO conversations (session_id) VALUES (?)", (session_id,))
+            (last,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, sender, text, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(session_id, last + i, m["sender"], m["text"], now) for i, m in enumerate(messages, start=1)],
+            )
+            self._conn.commit()
+
+    def get_state(self, session_id: str) -> ConversationState:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_through FROM conversations WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            summary, through = row or ("", 0)
+            # Everything the summary doesn't cover, including messages waiting to be folded.
+            recent = self._conn.execute(
+                "SELECT sender, text FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, through),
+            ).fetchall()
+            (total,) = self._conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        recent = [{"sender": sender, "text": text} for sender, text in recent]
+        return ConversationState(summary, recent, total)
+
+    def messages(self, session_id: str) -> list[dict]:
+        """Returns the full transcript of a session."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sender, text FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [{"sender": sender, "text": text} for sender, text in rows]
+
+    def drop(self, session_ids: list[str]):
+        """Forgets the conversations of sessions that have ended."""
+        if not session_ids:
+            return
+        with self._lock:
+            for i in range(0, len(session_ids), 500):
+                batch = session_ids[i:i + 500]
+                placeholders = ",".join("?" for _ in batch)
+                self._conn.execute(f"DELETE FROM messages WHERE session_id IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM conversations WHERE session_id IN ({placeholders})", batch)
+            self._conn.commit()
+
+    def _aged_out(self, session_id: str) -> tuple[str, int, list[tuple[int, str, str]]]:
+        """Returns the summary, its position, and the unsummarized messages that left the window."""
+        with self._lock:
+            summary, through = self._conn.execute(
+                "SELECT summary, summarized_through FROM conversations WHERE session_id = ?", (session_id,)
+            ).fetchone() or ("", 0)
+            rows = self._conn.execute(
+                "SELECT seq, sender, text FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, through),
+            ).fetchall()
+        return summary, through, rows[:max(0, len(rows) - self.recent_messages)]
+
+    async def fold(self, session_id: str, summarizer: Summarizer) -> bool:
+        """Folds messages that aged out of the recent window into the summary, if enough have."""
+        summary, through, aged = await asyncio.to_thread(self._aged_out, session_id)
+        if len(aged) < self.fold_batch:
+            return False
+        with metrics.stage("conversation_fold", messages=len(aged)):
+            new_summary = await summarizer(summary, [{"sender": sender, "text": text} for _, sender, text in aged])
+        if not new_summary:
+            return False
+        with self._lock:
+            # Only applies if no other fold (possibly in another worker) got there first.
+            updated = self._conn.execute(
+                "UPDATE conversations SET summary = ?, summarized_through = ?"
+                " WHERE session_id = ? AND summarized_through = ?",
+                (new_summary, aged[-1][0], session_id, through),
+            ).rowcount
+            self._conn.commit()
+        return bool(updated)
+
+    async def record(
+        self,
+        stream: AsyncIterator[str],
+        session_id: str,
+        question: str,
+        summarizer: Summarizer,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Passes an answer stream through, then stores the question and the
+        answer (without its suggestion lines) and folds old turns if needed.
+        """
+        splitter = SuggestionSplitter()
+        answer = []
+        async for piece in stream:
+            answer.extend(text for kind, text in splitter.feed(piece) if kind == "token")
+            yield piece
+        answer.extend(text for kind, text in splitter.flush() if kind == "token")
+
+        await asyncio.to_thread(self.append, session_id, [
+            {"sender": "user", "text": question},
+            {"sender": "ai", "text": "".join(answer).strip()},
+        ])
+        # Summarizing takes an LLM call; don't hold the response open for it.
+        task = asyncio.create_task(self._fold_quietly(session_id, summarizer))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold_quietly(self, session_id: str, summarizer: Summarizer):
+        try:
+            if await self.fold(session_id, summarizer):
+                print(f"Updated the conversation summary for session {session_id}.")
+        except Exception as e:
+            print(f"Error updating the conversation summary for session {session_id}: {e}")
+
+conversation_store = ConversationStore(
+    path=os.getenv("SESSION_DB_PATH", "./sessions.db"),
+    recent_messages=int(os.getenv("CONVERSATION_RECENT_MESSAGES", "6")),
+    fold_batch=int(os.getenv("CONVERSATION_FOLD_BATCH", "4")),
+)
@@ -1,48 +1,229 @@
 # backend/core/embedder.py
 
+import asyncio
 import os
-import google.generativeai as genai
+from abc import ABC, abstractmethod
 from dotenv import load_dotenv
 
-class GeminiEmbedder:
-    def __init__(self, model_name: str = "models/text-embedding-004"):
+from .embedding_cache import EmbeddingCache
+from .executors import QUERY, io_pool
+from .metrics import coalesced_embeddings, query_embed_batch_size
+from .providers import provider_registry
+
+class Embedder(ABC):
+    def __init__(self, model_name: str, cache: EmbeddingCache | None = None):
+        """
+        Base class for embedding backends.
+
+        Subclasses implement `_embed`; the embedding cache sits in front of it
+        here, so every backend gets the same caching behaviour.
+        """
+        self.model_name = model_name
+        self.cache = cache
+
+    async def embed_documents(
+        self, texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT", priority: int = QUERY
+    ) -> list[list[float]]:
+        """
+        Generates embeddings for a list of text chunks.
+        Texts already present in the embedding cache are not re-embedded;
+        the cached and freshly generated vectors are returned in input order.
+        Cache reads and writes run on the I/O pool at `priority`.
+        This is an async function.
+        """
+        if not texts or not any(texts):
+            return []
+
+        if self.cache is None:
+            return await self._embed(texts, task_type)
+
+        keys = [EmbeddingCache.make_key(text, self.model_name, task_type) for text in texts]
+        cached = await io_pool.run(self.cache.get_many, keys, priority=priority)
+
+        # De-duplicate misses so identical chunks in one upload are embedded once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_embeddings = await self._embed(list(missing.values()), task_type)
+            fresh = dict(zip(missing.keys(), new_embeddings))
+            await io_pool.run(self.cache.put_many, fresh, priority=priority)
+            cached.update(fresh)
+
+        print(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} sent to {type(self).__name__}.")
+        return [cached[key] for key in keys]
+
+    @abstractmethod
+    async def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        """Embeds texts with the backend, bypassing the cache."""
+
+class GeminiEmbedder(Embedder):
+    def __init__(self, model_name: str = "models/text-embedding-004", cache: EmbeddingCache | None = None):
         """
         Initializes the Gemini Embedder.
         It configures the API key and specifies the embedding model.
         """
+        # The model name for the latest text embedding model
+        super().__init__(model_name, cache)
+
         # Load environment variables from .env file
         load_dotenv()
-        
+
         self.api_key = os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment variables.")
-        
-        # The model name for the latest text embedding model
-        self.model_name = model_name
-        
+
         print("Configuring Gemini API...")
+        # The client library alone takes about half a second to import; only pay for it when it is used.
+        import google.generativeai as genai
+        self._genai = genai
         genai.configure(api_key=self.api_key)
         print("Gemini Embedder initialized.")
 
-    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        """
-        Generates embeddings for a list of text chunks using the Gemini API.
-        This is an async function.
-        """
-        if not texts or not any(texts):
-            return []
-            
+    async def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
         print(f"Generating embeddings for {len(texts)} documents with Gemini...")
-        
+
         # The Gemini API can handle batching automatically.
-        result = await genai.embed_content_async(
+        result = await self._genai.embed_content_async(
             model=self.model_name,
             content=texts,
-            task_type="RETRIEVAL_DOCUMENT" # Important for RAG
+            task_type=task_type # RETRIEVAL_DOCUMENT is important for RAG
         )
-        
+
         print("Embeddings generated successfully.")
         return result['embedding']
 
-# Create a single, global instance of the embedder to be used by the app.
-embedder_instance = GeminiEmbedder()
\ No newline at end of file
+class EmbeddingCoalescer:
+    def __init__(self, embedder: Embedder, window_seconds: float = 0.005, max_batch: int = 100):
+        """
+        Merges embedding requests from concurrent callers into shared batches.
+
+        Each caller's texts join a pending batch for their task type. The batch
+        goes out as one `embed_documents` call when it reaches `max_batch`
+        texts, or after `window_seconds`. When no call is in flight, the batch
+        goes out as soon as the callers already queued on the event loop have
+        added their texts, so a lone user waits no longer than before. A text
+        that is already pending or in flight is not sent again; its callers
+        share the result. A `window_seconds` of 0 turns coalescing off.
+        """
+        self.embedder = embedder
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        # task type -> {text: future}, waiting to be sent
+        self._pending: dict[str, dict[str, asyncio.Future]] = {}
+        # (task type, text) -> future, sent and awaiting the result
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        self._timers: dict[str, asyncio.Handle] = {}
+        self._batches: set[asyncio.Task] = set()
+
+    async def embed_documents(self, texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT") -> list[list[float]]:
+        """Same contract as Embedder.embed_documents, batched with other callers."""
+        if not texts or not any(texts):
+            return []
+        if self.window_seconds <= 0:
+            return await self.embedder.embed_documents(texts, task_type)
+
+        futures = [self._submit(text, task_type) for text in texts]
+        self._schedule(task_type)
+        # Shielded, so one caller giving up doesn't cancel a result others are waiting for.
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def _submit(self, text: str, task_type: str) -> asyncio.Future:
+        pending = self._pending.setdefault(task_type, {})
+        future = pending.get(text) or self._in_flight.get((task_type, text))
+        if future is not None:
+            coalesced_embeddings.inc(outcome="deduplicated")
+            return future
+        future = pending[text] = asyncio.get_running_loop().create_future()
+        return future
+
+    def _schedule(self, task_type: str):
+        pending = self._pending.get(task_type)
+        if not pending:
+            return
+        if len(pending) >= self.max_batch:
+            self._flush(task_type)
+        elif task_type not in self._timers:
+            loop = asyncio.get_running_loop()
+            if self._batches:
+                self._timers[task_type] = loop.call_later(self.window_seconds, self._flush, task_type)
+            else:
+                # Nothing in flight: send once this tick's callers have joined, without waiting for the window.
+                self._timers[task_type] = loop.call_soon(self._flush, task_type)
+
+    def _flush(self, task_type: str):
+        timer = self._timers.pop(task_type, None)
+        if timer is not None:
+            timer.cancel()
+        pending = list(self._pending.pop(task_type, {}).items())
+        for start in range(0, len(pending), self.max_batch):
+            batch = dict(pending[start:start + self.max_batch])
+            for text, future in batch.items():
+                self._in_flight[(task_type, text)] = future
+            task = asyncio.create_task(self._send(task_type, batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _send(self, task_type: str, batch: dict[str, asyncio.Future]):
+        query_embed_batch_size.observe(len(batch))
+        coalesced_embeddings.inc(len(batch), outcome="sent")
+        try:
+            vectors = await self.embedder.embed_documents(list(batch), task_type)
+            for future, vector in zip(batch.values(), vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for text in batch:
+                self._in_flight.pop((task_type, text), None)
+
+def create_embedder(backend: str | None = None) -> Embedder:
+    """
+    Builds the embedder selected by EMBEDDER_BACKEND ('gemini', 'local' or 'fake').
+    The local and fake backends are imported on demand, so Gemini deployments never load them.
+    """
+    backend = backend or os.getenv("EMBEDDER_BACKEND", "gemini")
+    cache = EmbeddingCache(
+        path=os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db"),
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+    )
+    if backend == "gemini":
+        return GeminiEmbedder(cache=cache)
+    if backend == "local":
+        from .local_embedder import LocalEmbedder
+        return LocalEmbedder(
+            model_name=os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            cache=cache,
+            # 'onnx' is opt-in: it needs optimum[onnxruntime] on top of requirements.txt.
+            runtime=os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch"),
+            num_threads=int(os.getenv("LOCAL_EMBEDDING_THREADS", str(os.cpu_count() or 1))),
+            max_batch_tokens=int(os.getenv("LOCAL_EMBEDDING_BATCH_TOKENS", "16384")),
+        )
+    if backend == "fake":
+        # Deterministic and offline, for benchmarks and local development without an API key.
+        from .fake_provider import FakeEmbedder
+        return FakeEmbedder(
+            dimensions=int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", "768")),
+            latency_seconds=float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "0")) / 1000,
+            cache=cache,
+        )
+    raise ValueError(f"Unknown embedder backend: {backend}")
+
+# A single, global embedder for the app, built on first use or during warm-up.
+embedder_instance = provider_registry.register("embedder", create_embedder)
+
+# Query-time embeddings go through the coalescer; ingestion already sends full batches.
+query_embedder = EmbeddingCoalescer(
+    embedder_instance,
+    window_seconds=float(os.getenv("EMBED_COALESCE_WINDOW_MS", "5")) / 1000,
+    max_batch=int(os.getenv("EMBED_COALESCE_MAX_BATCH", "100")),
+)
@@ -0,0 +1,142 @@
+# backend/core/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path: str = "./embedding_cache.db",
+        max_entries: int = 200_000,
+        touch_batch: int = 512,
+        recount_seconds: float = 60.0,
+    ):
+        """
+        A persistent, content-addressed cache for embedding vectors.
+
+        Vectors are stored in SQLite as packed float32 blobs, keyed by a hash of
+        (text, model_name, task_type). When the cache grows past `max_entries`,
+        the least recently used rows are evicted.
+
+        Lookups only read: the recency of hits is buffered and written in one
+        statement once `touch_batch` keys have accumulated, or before the next
+        insert. The row count is tracked as rows are added and evicted, and
+        re-read from the table every `recount_seconds`, since other worker
+        processes write to the same file. The methods block on SQLite;
+        call them from a thread, not the event loop.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self.recount_seconds = recount_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> last access, not yet written back.
+        self._touched: dict[str, float] = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self._recount()
+        print(f"Embedding cache initialized at {path} (max {max_entries} entries).")
+
+    @staticmethod
+    def make_key(text: str, model_name: str, task_type: str) -> str:
+        """Builds the content address for a single text."""
+        digest = hashlib.sha256()
+        for part in (model_name, task_type, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def _recount(self):
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self._counted_at = time.monotonic()
+
+    def _write_touched(self):
+        """Writes buffered recency updates. Holds the lock; the caller commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Returns the cached vectors for whichever keys are present, and notes their recency."""
+        if not keys:
+            return {}
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look keys up in slices.
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._touched.update((key, now) for key in found)
+                if len(self._touched) >= self.touch_batch:
+                    self._write_touched()
+                    self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        """Stores vectors and evicts the least recently used rows beyond the size bound."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            # Recency goes in first, so eviction doesn't pick rows that were just read.
+            self._write_touched()
+            # Keys are content addresses: an existing row already holds the same vector.
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows
+            ).rowcount
+            self._entries += max(inserted, 0)
+            if time.monotonic() - self._counted_at > self.recount_seconds:
+                self._recount()
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                self._entries -= self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                print(f"Embedding cache evicted {overflow} least recently used entries.")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the number of cached vectors (as of the last count)."""
+        entries = self._entries
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,235 @@
+# backend/core/executors.py
+
+import asyncio
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Lower runs first. Queries are latency-sensitive; ingestion is throughput work;
+# prefetching for questions nobody has asked yet goes last.
+QUERY = 0
+INGEST = 1
+PREFETCH = 2
+
+class PriorityThreadPool:
+    def __init__(self, name: str, max_workers: int, low_priority_limit: int | None = None):
+        """
+        A bounded thread pool for blocking I/O, such as vector store and index calls.
+
+        Queued calls run in priority order, so a query's search jumps ahead
+        of the ingestion writes waiting before it. At most `low_priority_limit`
+        threads run non-query work at once. The rest stay free for queries,
+        even while a large upload is being written.
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.low_priority_limit = max(1, min(low_priority_limit or max_workers, max_workers))
+        self._queue: list = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._low_running = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, priority: int = QUERY, **kwargs) -> Future:
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError(f"{self.name} pool has been shut down.")
+            heapq.heappush(self._queue, (priority, next(self._sequence), future, fn, args, kwargs))
+            if self._idle == 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return future
+
+    async def run(self, fn, *args, priority: int = QUERY, **kwargs):
+        """Runs a blocking call on the pool and awaits its result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, **kwargs))
+
+    def _next(self):
+        """Pops the most urgent runnable call, or returns None if there is none. Holds the condition."""
+        if not self._queue:
+            return None
+        if self._queue[0][0] != QUERY:
+            # Everything queued is low priority (the heap puts queries first).
+            if self._low_running >= self.low_priority_limit:
+                return None
+            self._low_running += 1
+        return heapq.heappop(self._queue)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                self._idle += 1
+                item = self._next()
+                while item is None:
+                    if self._shutdown:
+                        self._idle -= 1
+                        return
+                    self._condition.wait()
+                    item = self._next()
+                self._idle -= 1
+            priority, _, future, fn, args, kwargs = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                if priority != QUERY:
+                    with self._condition:
+                        self._low_running -= 1
+                        # A low-priority slot opened up; wake a thread that may be waiting for one.
+                        self._condition.notify()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "threads": len(self._threads),
+                "queued": len(self._queue),
+                "low_priority_running": self._low_running,
+                "low_priority_limit": self.low_priority_limit,
+            }
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            for _, _, future, *_ in self._queue:
+                future.cancel()
+            self._queue.clear()
+            self._condition.notify_all()
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many requests in progress; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+class AdmissionSlot:
+    def __init__(self, controller: "AdmissionController"):
+        """A reserved place in an admission controller, held from admission until the work finishes."""
+        self._controller = controller
+        self._started = None
+        self._released = False
+
+    async def __aenter__(self):
+        # Waits (queued) until one of the active slots is free.
+        try:
+            await self._controller._semaphore.acquire()
+        except BaseException:
+            self.release()
+            raise
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._controller._semaphore.release()
+        self._controller._record(time.monotonic() - self._started)
+        self.release()
+        return False
+
+    def release(self):
+        """Gives up the reservation, e.g. when the work is abandoned before it starts."""
+        if not self._released:
+            self._released = True
+            self._controller._reserved -= 1
+
+class AdmissionController:
+    def __init__(self, name: str, max_active: int, max_queued: int):
+        """
+        Limits how much of one kind of work a worker process takes on.
+
+        Up to `max_active` items run at once and `max_queued` more wait their
+        turn. Anything beyond that is rejected with a Retry-After estimate
+        based on how long recent items took.
+        """
+        self.name = name
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_active)
+        self._reserved = 0
+        self._average_seconds = None
+
+    def reserve(self) -> AdmissionSlot:
+        """Claims a place or raises AdmissionRejected. Call from the event loop, before doing any work."""
+        if self._reserved >= self.max_active + self.max_queued:
+            raise AdmissionRejected(self.retry_after())
+        self._reserved += 1
+        return AdmissionSlot(self)
+
+    def _record(self, seconds: float):
+        # Exponentially weighted, so the estimate follows the current mix of documents.
+        if self._average_seconds is None:
+            self._average_seconds = seconds
+        else:
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        """Seconds until a place is likely to free up."""
+        average = self._average_seconds if self._average_seconds is not None else 10.0
+        waiting = max(0, self._reserved - self.max_active)
+        return max(1, min(300, math.ceil(average * (waiting + 1) / self.max_active)))
+
+    def stats(self) -> dict:
+        return {
+            "reserved": self._reserved,
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "average_seconds": round(self._average_seconds, 2) if self._average_seconds is not None else None,
+        }
+
+_cpu_executor = None
+
+def cpu_executor() -> ProcessPoolExecutor:
+    """The shared process pool for CPU-bound parsing."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        # 'spawn' avoids forking a process that is running threads and an event loop.
+        _cpu_executor = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_executor
+
+_cpu_manager = None
+
+def cpu_manager():
+    """A manager process for queues that stream results back from the CPU pool."""
+    global _cpu_manager
+    if _cpu_manager is None:
+        _cpu_manager = multiprocessing.get_context("spawn").Manager()
+    return _cpu_manager
+
+async def run_cpu(fn, *args):
+    """Runs a picklable, CPU-bound function in the shared process pool."""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor(), fn, *args)
+
+def shutdown():
+    io_pool.shutdown()
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+    if _cpu_manager is not None:
+        _cpu_manager.shutdown()
+
+CPU_WORKERS = int(os.getenv("CPU_POOL_WORKERS", os.getenv("PDF_PARSER_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+_io_workers = int(os.getenv("IO_POOL_WORKERS", "16"))
+io_pool = PriorityThreadPool(
+    "io",
+    max_workers=_io_workers,
+    # By default ingestion may use half the threads; the other half is kept for queries.
+    low_priority_limit=int(os.getenv("IO_POOL_INGEST_THREADS", str(max(1, _io_workers // 2)))),
+)
+
+ingestion_admission = AdmissionController(
+    "ingestion",
+    max_active=int(os.getenv("INGEST_MAX_ACTIVE", "2")),
+    max_queued=int(os.getenv("INGEST_MAX_QUEUED", "8")),
+)
@@ -0,0 +1,209 @@
+# backend/core/exporter.py
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from .llm import llm_instance
+from .metrics import metrics
+from .report_renderer import render_pdf
+
+class ExportService:
+    def __init__(
+        self,
+        llm,
+        path: str = "./sessions.db",
+        max_workers: int = 2,
+        max_entries: int = 256,
+        stale_after_seconds: int = 600,
+    ):
+        """
+        Turns conversations into PDF reports without blocking the event loop.
+
+        The LLM writes a Markdown summary and a pool of worker processes
+        renders it to PDF in memory. Summaries and PDFs are cached in SQLite by
+        a hash of the conversation, so exporting the same conversation again
+        (from any worker) is instant; the `max_entries` least recently used
+        exports are kept. Background exports are tracked in the same table:
+        the conversation hash doubles as the job ID, and a pending export
+        older than `stale_after_seconds` is assumed lost and can be restarted.
+        """
+        self.llm = llm
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.stale_after_seconds = stale_after_seconds
+        self._executor = None
+        # Conversation key -> the render in flight in this process.
+        self._in_flight: dict[str, asyncio.Future] = {}
+        # Keys of background exports being started or run by this process.
+        self._jobs: set[str] = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS exports ("
+            " key TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"  # 'pending', 'ready' or 'failed'
+            " summary TEXT,"
+            " pdf BLOB,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_exports_last_access ON exports (last_access)")
+        self._conn.commit()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 'spawn' avoids forking a process that is running threads and an event loop.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def conversation_key(chat_history: List[Dict[str, str]], summary: str = "") -> str:
+        """A stable hash of everything the report is generated from."""
+        canonical = json.dumps(
+            {"summary": summary, "messages": [[m.get("sender"), m.get("text")] for m in chat_history]},
+            ensure_ascii=False, separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _row(self, key: str) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, summary, pdf, error, updated_at FROM exports WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _write(self, key: str, **fields):
+        now = time.time()
+        fields.update(updated_at=now, last_access=now)
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO exports (key, {columns}) VALUES (?, {placeholders})"
+                f" ON CONFLICT (key) DO UPDATE SET {updates}",
+                (key, *fields.values()),
+            )
+            if fields.get("status") == "ready":
+                self._conn.execute(
+                    "DELETE FROM exports WHERE key IN (SELECT key FROM exports WHERE status = 'ready'"
+                    " ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def cached_pdf(self, key: str) -> bytes | None:
+        """Returns the finished PDF for a conversation, if there is one."""
+        row = self._row(key)
+        if row is None or row[0] != "ready":
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE exports SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return row[2]
+
+    def status(self, key: str) -> dict | None:
+        row = self._row(key)
+        if row is None:
+            return None
+        status, _, pdf, error, updated_at = row
+        if status == "pending" and time.time() - updated_at > self.stale_after_seconds:
+            status, error = "failed", "The export was interrupted."
+        return {"job_id": key, "status": status, "error": error, "size_bytes": len(pdf) if pdf else None}
+
+    async def export(self, chat_history: List[Dict[str, str]], summary: str = "") -> bytes:
+        """Returns the PDF for a conversation, generating it if it isn't cached."""
+        key = self.conversation_key(chat_history, summary)
+        pdf = await asyncio.to_thread(self.cached_pdf, key)
+        if pdf is not None:
+            print(f"Export {key[:12]} served from cache.")
+            return pdf
+        # Identical exports already running in this process share the result.
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(key, chat_history, summary))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _generate(self, key: str, chat_history: List[Dict[str, str]], summary: str) -> bytes:
+        row = await asyncio.to_thread(self._row, key)
+        await asyncio.to_thread(self._write, key, status="pending", error=None)
+        try:
+            # A previous attempt may have got as far as the summary.
+            markdown_content = row[1] if row and row[1] else None
+            if markdown_content is None:
+                with metrics.stage("export_summarize", messages=len(chat_history)):
+                    markdown_content = await self.llm.summarize_conversation(chat_history, summary=summary)
+                if markdown_content.startswith("Error:"):
+                    raise RuntimeError(markdown_content)
+                await asyncio.to_thread(self._write, key, status="pending", summary=markdown_content)
+
+            loop = asyncio.get_running_loop()
+            with metrics.stage("export_render"):
+                pdf = await loop.run_in_executor(self._get_executor(), render_pdf, markdown_content)
+            await asyncio.to_thread(self._write, key, status="ready", pdf=pdf)
+            print(f"Export {key[:12]} rendered ({len(pdf)} bytes).")
+            return pdf
+        except Exception as e:
+            await asyncio.to_thread(self._write, key, status="failed", error=str(e))
+            raise
+
+    async def start_job(self, chat_history: List[Dict[str, str]], summary: str = "") -> str:
+        """Starts an export in the background, unless it is done or already running, and returns its ID."""
+        key = self.conversation_key(chat_history, summary)
+        # Claimed before the first await, so concurrent requests in this process start one job.
+        if key in self._jobs:
+            return key
+        self._jobs.add(key)
+        started = False
+        try:
+            current = await asyncio.to_thread(self.status, key)
+            if current is None or current["status"] == "failed":
+                # Recorded before returning, so a status request sees the job straight away.
+                await asyncio.to_thread(self._write, key, status="pending", error=None)
+
+                async def run():
+                    try:
+                        await self.export(chat_history, summary)
+                    except Exception as e:
+                        print(f"Export {key[:12]} failed: {e}")
+                    finally:
+                        self._jobs.discard(key)
+
+                # Keep a reference so the task isn't garbage collected mid-flight.
+                task = asyncio.create_task(run())
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                started = True
+        finally:
+            if not started:
+                self._jobs.discard(key)
+        return key
+
+export_service = ExportService(
+    llm_instance,
+    path=os.getenv("SESSION_DB_PATH", "./sessions.db"),
+    max_workers=int(os.getenv("EXPORT_WORKERS", "2")),
+    max_entries=int(os.getenv("EXPORT_CACHE_ENTRIES", "256")),
+)
@@ -0,0 +1,106 @@
+# backend/core/fake_provider.py
+
+import asyncio
+import hashlib
+import re
+from typing import AsyncGenerator, Dict, List
+
+import numpy as np
+
+from .context_builder import PromptContext
+from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+
+_WORD = re.compile(r"\w+")
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+class FakeEmbedder(Embedder):
+    def __init__(
+        self,
+        dimensions: int = 768,
+        latency_seconds: float = 0.0,
+        cache: EmbeddingCache | None = None,
+    ):
+        """
+        A deterministic, offline stand-in for the Gemini embedder.
+
+        Each word is hashed to a signed position in a `dimensions`-long vector
+        (feature hashing), so texts that share words get similar embeddings
+        and retrieval behaves plausibly. Every batch waits `latency_seconds`,
+        standing in for the round trip to the API.
+        """
+        super().__init__(f"fake-hash-{dimensions}", cache)
+        self.dimensions = dimensions
+        self.latency_seconds = latency_seconds
+        print(f"Fake embedder initialized ({dimensions} dimensions).")
+
+    def embed_one(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = _hash(word)
+            vector[h % self.dimensions] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Texts without words still get a stable, non-zero vector.
+            vector[_hash(text) % self.dimensions] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    async def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return [self.embed_one(text) for text in texts]
+
+class FakeLLM:
+    def __init__(self, answer_tokens: int = 120, first_token_seconds: float = 0.0, token_seconds: float = 0.0):
+        """
+        A deterministic, offline stand-in for GeminiLLM.
+
+        Answers are a scripted stream of `answer_tokens` words followed by two
+        suggestion lines. The first token arrives after `first_token_seconds`
+        and each later one after `token_seconds`, so streaming behaves like a
+        real model at a known speed.
+        """
+        self.answer_tokens = answer_tokens
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        print("Fake LLM initialized.")
+
+    def _script(self, question: str) -> list[str]:
+        words = _WORD.findall(question) or ["document"]
+        tokens = [f"{words[i % len(words)]} " for i in range(self.answer_tokens)]
+        tokens[-1] = tokens[-1].rstrip() + ".\n"
+        return tokens + [
+            f"SUGGESTION: What else does the document say about {words[0]}?\n",
+            f"SUGGESTION: Where is {words[-1]} discussed?\n",
+        ]
+
+    async def generate_answer_stream(
+        self,
+        question: str,
+        prompt_context: PromptContext
+    ) -> AsyncGenerator[str, None]:
+        if not prompt_context.context_str:
+            yield "I could not find any relevant information in the document to answer your question."
+            return
+        await asyncio.sleep(self.first_token_seconds)
+        for i, token in enumerate(self._script(question)):
+            if i and self.token_seconds:
+                await asyncio.sleep(self.token_seconds)
+            yield token
+
+    async def summarize_conversation(self, chat_history: List[Dict[str, str]], summary: str = "") -> str:
+        await asyncio.sleep(self.first_token_seconds)
+        lines = ["# Conversation Summary", ""]
+        if summary:
+            lines += ["## Earlier", "", summary, ""]
+        lines += ["## Discussion", ""]
+        lines += [f"* **{message.get('sender')}:** {message.get('text')}" for message in chat_history]
+        return "\n".join(lines)
+
+    async def update_summary(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        await asyncio.sleep(self.first_token_seconds)
+        words = (summary + " " + " ".join(message.get("text", "") for message in messages)).split()
+        return " ".join(words[-200:])
@@ -0,0 +1,185 @@
+# backend/core/ingestion.py
+
+import asyncio
+import os
+import random
+import uuid
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+from backend.core.embedder import embedder_instance
+from backend.core.executors import INGEST, io_pool
+from backend.core.lexical import lexical_index_registry
+from backend.core.metrics import metrics
+from backend.vector_store import vector_store_instance
+
+# Marks the end of a stage's output on the queues between stages.
+_DONE = object()
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Returns True for quota / throttling errors that are worth retrying."""
+    try:
+        from google.api_core import exceptions as google_exceptions
+        if isinstance(error, (google_exceptions.ResourceExhausted,
+                              google_exceptions.TooManyRequests,
+                              google_exceptions.ServiceUnavailable)):
+            return True
+    except ImportError:
+        pass
+    if getattr(error, "code", None) in (429, 503):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "quota" in message
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        embedder,
+        vector_store,
+        lexical_indexes=None,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        queue_size: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        """
+        Runs chunking, embedding and vector-store writes as overlapping stages.
+
+        Batches flow through bounded queues, so a slow stage applies backpressure
+        to the stages before it instead of buffering the whole document.
+        `concurrency` controls how many embedding batches are in flight at once.
+        If `lexical_indexes` is given, each stored batch is also added to the
+        collection's BM25 index.
+        """
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.lexical_indexes = lexical_indexes
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def run(
+        self,
+        collection_name: str,
+        chunks: Iterable[tuple[str, dict]],
+        on_batch: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Embeds and stores `(chunk_text, metadata)` pairs into a collection.
+
+        `chunks` may be a lazy iterator; it is advanced in a worker thread so
+        parsing and chunking overlap with embedding. `on_batch` is called with
+        the number of chunks after each batch is written.
+
+        Returns:
+            The total number of chunks written.
+        """
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue = asyncio.Queue(maxsize=self.queue_size)
+        written = 0
+        if self.lexical_indexes is not None:
+            self.lexical_indexes.create(collection_name)
+
+        async def produce():
+            iterator = iter(chunks)
+            while True:
+                batch = await io_pool.run(self._next_batch, iterator, priority=INGEST)
+                if not batch:
+                    break
+                await embed_queue.put(batch)
+            for _ in range(self.concurrency):
+                await embed_queue.put(_DONE)
+
+        async def embed():
+            while True:
+                batch = await embed_queue.get()
+                if batch is _DONE:
+                    await write_queue.put(_DONE)
+                    return
+                texts = [text for text, _ in batch]
+                embeddings = await self._embed_with_retry(texts)
+                await write_queue.put((batch, embeddings))
+
+        async def write():
+            nonlocal written
+            finished_workers = 0
+            while finished_workers < self.concurrency:
+                item = await write_queue.get()
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+                batch, embeddings = item
+                storing = io_pool.submit(self._store_batch, collection_name, batch, embeddings, priority=INGEST)
+                try:
+                    await asyncio.wrap_future(storing)
+                except asyncio.CancelledError:
+                    # A write already running in its thread can't be stopped; wait for it, so
+                    # whoever cleans up after a failed run sees everything that was stored.
+                    if not storing.cancel():
+                        await asyncio.wait([asyncio.wrap_future(storing)])
+                    raise
+                written += len(batch)
+                if on_batch:
+                    on_batch(len(batch))
+                print(f"Stored {written} chunks in collection '{collection_name}'.")
+
+        tasks = [asyncio.create_task(produce()), asyncio.create_task(write())]
+        tasks += [asyncio.create_task(embed()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return written
+
+    def _store_batch(self, collection_name: str, batch: list[tuple[str, dict]], embeddings: list[list[float]]):
+        ids = [str(uuid.uuid4()) for _ in batch]
+        chunks = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        with metrics.stage("vector_write", chunks=len(batch)):
+            self.vector_store.add_documents(
+                collection_name=collection_name, chunks=chunks, embeddings=embeddings, metadatas=metadatas, ids=ids
+            )
+        if self.lexical_indexes is not None:
+            with metrics.stage("lexical_write", chunks=len(batch)):
+                self.lexical_indexes.add(collection_name, ids, chunks, metadatas)
+
+    def _next_batch(self, iterator: Iterator[tuple[str, dict]]) -> list[tuple[str, dict]]:
+        batch = []
+        while len(batch) < self.batch_size:
+            items = list(islice(iterator, self.batch_size - len(batch)))
+            if not items:
+                break
+            batch.extend(item for item in items if item[0].strip())
+        return batch
+
+    async def _embed_with_retry(self, texts: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                with metrics.stage("embed", chunks=len(texts)):
+                    return await self.embedder.embed_documents(texts, priority=INGEST)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    raise
+                # Full jitter keeps concurrent workers from retrying in lockstep.
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                print(f"Embedding rate-limited ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+ingestion_pipeline = IngestionPipeline(
+    embedder_instance,
+    vector_store_instance,
+    lexical_indexes=lexical_index_registry,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "100")),
+    concurrency=int(os.getenv("INGEST_CONCURRENCY", "4")),
+    queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "8")),
+)
@@ -0,0 +1,234 @@
+# backend/core/jobs.py
+
+import asyncio
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Coroutine
+
+# Columns persisted for every job, in table order.
+_FIELDS = (
+    "job_id", "session_id", "collection_name", "filename", "status", "error",
+    "pages_parsed", "pages_total", "chunks_embedded", "chunks_total",
+    "created_at", "started_at", "finished_at",
+)
+
+class IngestionJob:
+    def __init__(self, session_id: str, collection_name: str, filename: str):
+        """Tracks the progress of one background document ingestion."""
+        self.job_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.collection_name = collection_name
+        self.filename = filename
+        self.status = "queued"  # 'queued', 'running', 'completed', 'failed'
+        self.error = None
+        self.pages_parsed = 0
+        self.pages_total = None
+        self.chunks_embedded = 0
+        self.chunks_total = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "IngestionJob":
+        """Rebuilds a job snapshot stored by another worker."""
+        job = cls.__new__(cls)
+        for field, value in zip(_FIELDS, row):
+            setattr(job, field, value)
+        return job
+
+    def to_row(self) -> tuple:
+        return tuple(getattr(self, field) for field in _FIELDS)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def eta_seconds(self) -> float | None:
+        """Estimates the remaining time from the embedding rate observed so far."""
+        if self.is_finished:
+            return 0.0
+        if not self.started_at:
+            return None
+        elapsed = time.time() - self.started_at
+        if self.chunks_total and self.chunks_embedded:
+            remaining = self.chunks_total - self.chunks_embedded
+            return round(elapsed / self.chunks_embedded * remaining, 1)
+        if self.pages_total and 0 < self.pages_parsed < self.pages_total:
+            remaining = self.pages_total - self.pages_parsed
+            return round(elapsed / self.pages_parsed * remaining, 1)
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "collection_name": self.collection_name,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "pages_parsed": self.pages_parsed,
+            "pages_total": self.pages_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_total": self.chunks_total,
+            "eta_seconds": self.eta_seconds(),
+        }
+
+class JobManager:
+    def __init__(self, path: str = "./sessions.db", retention_minutes: int = 60, heartbeat_seconds: float = 1.0):
+        """
+        Runs ingestion jobs and shares their progress through SQLite.
+
+        Jobs run in the worker that accepted the upload; while running, their
+        progress is written back every `heartbeat_seconds`, so any worker can
+        answer progress requests. A job whose heartbeat stops (its worker
+        died) no longer counts as in progress.
+        """
+        # Jobs running in this worker, keyed by job ID.
+        self.jobs: dict[str, IngestionJob] = {}
+        self.retention_seconds = retention_minutes * 60
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = max(30.0, heartbeat_seconds * 10)
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, session_id TEXT, collection_name TEXT NOT NULL, filename TEXT,"
+            " status TEXT NOT NULL, error TEXT,"
+            " pages_parsed INTEGER, pages_total INTEGER, chunks_embedded INTEGER, chunks_total INTEGER,"
+            " created_at REAL, started_at REAL, finished_at REAL, heartbeat REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_collection ON jobs (collection_name, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at)")
+        self._conn.commit()
+
+    def _save(self, job: IngestionJob):
+        placeholders = ",".join("?" for _ in range(len(_FIELDS) + 1))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(_FIELDS)}, heartbeat) VALUES ({placeholders})",
+                job.to_row() + (time.time(),),
+            )
+            self._conn.commit()
+
+    def _select(self, where: str, params: tuple) -> IngestionJob | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM jobs WHERE {where} ORDER BY created_at DESC LIMIT 1", params
+            ).fetchone()
+        return IngestionJob.from_row(row) if row else None
+
+    def create_job(self, session_id: str, collection_name: str, filename: str) -> IngestionJob:
+        job = IngestionJob(session_id, collection_name, filename)
+        self.jobs[job.job_id] = job
+        self._save(job)
+        print(f"Ingestion job {job.job_id} created for session {session_id}.")
+        return job
+
+    def get_job(self, job_id: str) -> IngestionJob | None:
+        """Returns the live job if it runs here, otherwise the latest stored snapshot."""
+        return self.jobs.get(job_id) or self._select("job_id = ?", (job_id,))
+
+    def job_for_collection(self, collection_name: str) -> IngestionJob | None:
+        # Copied first: this runs on the I/O pool while the event loop adds and removes jobs.
+        for job in list(self.jobs.values()):
+            if job.collection_name == collection_name:
+                return job
+        return self._select("collection_name = ?", (collection_name,))
+
+    def is_local(self, collection_name: str) -> bool:
+        """True if this worker is the one ingesting the collection."""
+        return any(job.collection_name == collection_name for job in list(self.jobs.values()))
+
+    def is_partial(self, collection_name: str) -> bool:
+        """True while the collection's document is still being ingested, by any live worker."""
+        if self.is_local(collection_name):
+            return True
+        job = self._select(
+            "collection_name = ? AND status IN ('queued', 'running') AND heartbeat > ?",
+            (collection_name, time.time() - self.stale_seconds),
+        )
+        return job is not None
+
+    def start(
+        self,
+        job: IngestionJob,
+        work: Coroutine[Any, Any, None],
+        slot=None,
+        cleanup: Callable[[], None] | None = None,
+    ):
+        """
+        Runs the ingestion coroutine in the background and records its outcome.
+        With an admission `slot`, the job stays queued until the slot lets it run.
+        If the job is cancelled before `work` starts, `work` is closed and
+        `cleanup` (e.g. removing the spooled upload) runs in its place.
+        """
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.heartbeat_seconds)
+                await asyncio.to_thread(self._save, job)
+
+        async def runner():
+            beating = asyncio.create_task(heartbeat())
+            started = False
+            try:
+                async with slot or contextlib.nullcontext():
+                    job.status = "running"
+                    job.started_at = time.time()
+                    started = True
+                    await work
+                job.status = "completed"
+                print(f"Ingestion job {job.job_id} completed.")
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "The job was cancelled."
+                print(f"Ingestion job {job.job_id} was cancelled.")
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Ingestion job {job.job_id} failed: {e}")
+            finally:
+                if not started:
+                    # `work` never ran, so its own cleanup won't either.
+                    work.close()
+                    if cleanup is not None:
+                        await asyncio.to_thread(cleanup)
+                job.finished_at = time.time()
+                beating.cancel()
+                await asyncio.to_thread(self._save, job)
+                self.jobs.pop(job.job_id, None)
+
+        # Keep a reference so the task isn't garbage collected mid-flight.
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def prune_finished_jobs(self):
+        """Forgets jobs that finished longer ago than the retention window and fails abandoned ones."""
+        now = time.time()
+        with self._lock:
+            abandoned = self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'The worker running this job stopped.', finished_at = ?"
+                " WHERE status IN ('queued', 'running') AND heartbeat < ?",
+                (now, now - self.stale_seconds),
+            ).rowcount
+            pruned = self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ?", (now - self.retention_seconds,)
+            ).rowcount
+            self._conn.commit()
+        if abandoned:
+            print(f"Marked {abandoned} abandoned ingestion jobs as failed.")
+        if pruned:
+            print(f"Pruned {pruned} finished ingestion jobs.")
+
+job_manager = JobManager(path=os.getenv("SESSION_DB_PATH", "./sessions.db"))
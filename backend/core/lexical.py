@@ -0,0 +1,162 @@
+# backend/core/lexical.py
+
+import math
+import re
+import threading
+from collections import Counter
+
+from backend.vector_store import vector_store_instance
+from backend.vector_store.base import matches_where
+
+# Keeps dotted numbers like "4.2.1" together so clause references match exactly.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """An in-memory inverted index scored with Okapi BM25."""
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_lengths: list[int] = []
+        self.total_length = 0
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self._known_ids = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        with self._lock:
+            self._add(ids, texts, metadatas)
+
+    def _add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            if chunk_id in self._known_ids:
+                continue
+            doc_index = len(self.ids)
+            terms = Counter(tokenize(text))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_index] = frequency
+            length = sum(terms.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+            self.ids.append(chunk_id)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+            self._known_ids.add(chunk_id)
+
+    def remove(self, where: dict) -> int:
+        """Removes every chunk whose metadata matches `where` and returns how many there were."""
+        with self._lock:
+            keep = [i for i, metadata in enumerate(self.metadatas) if not matches_where(metadata, where)]
+            removed = len(self.ids) - len(keep)
+            if removed:
+                # Postings are keyed by position, so the survivors are indexed afresh.
+                ids, texts, metadatas = self.ids, self.texts, self.metadatas
+                self.postings, self.doc_lengths, self.total_length = {}, [], 0
+                self.ids, self.texts, self.metadatas, self._known_ids = [], [], [], set()
+                self._add([ids[i] for i in keep], [texts[i] for i in keep], [metadatas[i] for i in keep])
+        return removed
+
+    def search(self, query: str, n_results: int = 5, where: dict | None = None) -> list[dict]:
+        """
+        Returns the best-scoring chunks for a query, highest BM25 score first.
+        `where` is a metadata filter, as for the vector stores. Statistics stay collection-wide.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            doc_count = len(self.ids)
+            if not doc_count or not query_terms:
+                return []
+            average_length = self.total_length / doc_count
+            scores: dict[int, float] = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_index, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / average_length)
+                    scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            if where:
+                scores = {i: score for i, score in scores.items() if matches_where(self.metadatas[i], where)}
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+            return [
+                {"id": self.ids[i], "text": self.texts[i], "metadata": self.metadatas[i], "score": score}
+                for i, score in best
+            ]
+
+class LexicalIndexRegistry:
+    def __init__(self, vector_store):
+        """
+        Holds one BM25 index per collection. Indexes are built as chunks are
+        ingested; collections from before a restart are rebuilt on first use
+        from the documents in the vector store.
+        """
+        self.vector_store = vector_store
+        self.indexes: dict[str, BM25Index] = {}
+        # Collections whose index was built while another worker was still ingesting them.
+        self._provisional: set[str] = set()
+        self._lock = threading.Lock()
+
+    def create(self, collection_name: str) -> BM25Index:
+        """Starts an empty index for a collection that is about to be ingested, if it has none."""
+        with self._lock:
+            return self.indexes.setdefault(collection_name, BM25Index())
+
+    def get(self, collection_name: str) -> BM25Index:
+        with self._lock:
+            index = self.indexes.get(collection_name)
+        if index is not None:
+            return index
+        print(f"Rebuilding lexical index for collection '{collection_name}'...")
+        documents = self.vector_store.get_documents(collection_name)
+        index = BM25Index()
+        index.add(
+            [document["id"] for document in documents],
+            [document["text"] for document in documents],
+            [document["metadata"] for document in documents],
+        )
+        with self._lock:
+            return self.indexes.setdefault(collection_name, index)
+
+    def add(self, collection_name: str, ids: list[str], texts: list[str], metadatas: list[dict]):
+        self.get(collection_name).add(ids, texts, metadatas)
+
+    def search(self, collection_name: str, query: str, n_results: int = 5, where: dict | None = None) -> list[dict]:
+        return self.get(collection_name).search(query, n_results, where)
+
+    def remove(self, collection_name: str, where: dict):
+        """Removes matching chunks from a loaded index; an unloaded one is rebuilt from the store anyway."""
+        with self._lock:
+            index = self.indexes.get(collection_name)
+        if index is not None:
+            index.remove(where)
+
+    def refresh(self, collection_name: str, complete: bool):
+        """
+        Keeps an index in step with a collection another worker is ingesting:
+        while it is incomplete the index is rebuilt from the store on every
+        use, and once more after it completes.
+        """
+        with self._lock:
+            if complete and collection_name not in self._provisional:
+                return
+            self.indexes.pop(collection_name, None)
+            if complete:
+                self._provisional.discard(collection_name)
+            else:
+                self._provisional.add(collection_name)
+
+    def drop(self, collection_name: str):
+        with self._lock:
+            self.indexes.pop(collection_name, None)
+            self._provisional.discard(collection_name)
+
+lexical_index_registry = LexicalIndexRegistry(vector_store_instance)
@@ -137,12 +137,16 @@
 
 # backend/core/llm.py
 
-import google.generativeai as genai
+import os
 from typing import AsyncGenerator, List, Dict
 
+from .context_builder import PromptContext
+from .providers import provider_registry
+
 class GeminiLLM:
     def __init__(self, model_name: str = "gemini-1.5-flash-latest"):
         print("Initializing Gemini LLM for generation...")
+        import google.generativeai as genai
         self.model = genai.GenerativeModel(model_name)
         print("Gemini LLM initialized.")
 
@@ -158,15 +162,15 @@ class GeminiLLM:
     async def generate_answer_stream(
         self, 
         question: str, 
-        context_chunks: list[str],
-        chat_history: List[Dict[str, str]]
+        prompt_context: PromptContext
     ) -> AsyncGenerator[str, None]:
-        if not context_chunks:
+        """Streams an answer from context and history already fitted to the token budget."""
+        if not prompt_context.context_str:
             yield "I could not find any relevant information in the document to answer your question."
             return
 
-        context_str = "\n---\n".join(context_chunks)
-        history_str = self._format_chat_history(chat_history)
+        context_str = prompt_context.context_str
+        history_str = prompt_context.history_str
 
         # Reverted to the simpler, single-call prompt for memory efficiency
         prompt = f"""
@@ -191,7 +195,7 @@ class GeminiLLM:
         ANSWER:
         """
         
-        print("Generating streamed answer (memory-efficient mode)...")
+        print(f"Generating streamed answer (prompt ~{prompt_context.usage['total_tokens']} tokens)...")
         try:
             response_stream = await self.model.generate_content_async(prompt, stream=True)
             async for chunk in response_stream:
@@ -201,4 +205,86 @@ class GeminiLLM:
             print(f"Error during LLM stream generation: {e}")
             yield f"An error occurred while generating the answer: {e}"
 
-llm_instance = GeminiLLM()
\ No newline at end of file
+    async def summarize_conversation(self, chat_history: List[Dict[str, str]], summary: str = "") -> str:
+        """
+        Takes a conversation (and the running summary of anything older) and
+        synthesizes it into a structured Markdown document.
+        """
+        print("Invoking Summarizer Agent...")
+
+        full_conversation_str = self._format_chat_history(chat_history)
+        if summary:
+            full_conversation_str = f"(Summary of the earlier conversation: {summary})\n{full_conversation_str}"
+
+        summarizer_prompt = f"""
+        You are a professional editor and report generator named "DocuMentor AI".
+        Your task is to transform a raw conversation log between a User and an AI Assistant into a clean, structured, and easy-to-read document.
+
+        **Instructions:**
+        1.  Read the entire "CONVERSATION LOG" to understand the key topics discussed.
+        2.  Do NOT just copy the conversation. Synthesize the information.
+        3.  Create a title for the document based on the content.
+        4.  Use Markdown for formatting: use headings (`#`, `##`), subheadings, bullet points (`*`), and bold text (`**`) to structure the information logically.
+        5.  Group related questions and answers into coherent sections.
+        6.  Summarize the key findings and answers. Ignore conversational pleasantries like "hello" or "thank you".
+        7.  The final output should be a professional-looking document, ready to be saved as a PDF.
+
+        ---
+        CONVERSATION LOG:
+        {full_conversation_str}
+        ---
+
+        STRUCTURED DOCUMENT (IN MARKDOWN):
+        """
+
+        try:
+            response = await self.model.generate_content_async(summarizer_prompt)
+            print("Structured summary generated successfully.")
+            return response.text
+        except Exception as e:
+            print(f"Error during summary generation: {e}")
+            return f"Error: Could not generate the document summary. Reason: {e}"
+
+    async def update_summary(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Folds messages that left the recent window into the running conversation
+        summary. Returns an empty string on failure, so the old summary is kept.
+        """
+        prompt = f"""
+        You maintain a running summary of a conversation between a user and an assistant about a document.
+        Update the "CURRENT SUMMARY" so it also covers the "NEW MESSAGES".
+        Keep the facts, figures and open questions the user may refer back to; drop pleasantries.
+        Write at most 200 words of plain prose. Reply with the updated summary only.
+
+        ---
+        CURRENT SUMMARY:
+        {summary or "(empty)"}
+        ---
+        NEW MESSAGES:
+        {self._format_chat_history(messages)}
+        ---
+        UPDATED SUMMARY:
+        """
+        try:
+            response = await self.model.generate_content_async(prompt)
+            return response.text.strip()
+        except Exception as e:
+            print(f"Error during conversation summary update: {e}")
+            return ""
+
+def create_llm(backend: str | None = None):
+    """Builds the LLM selected by LLM_BACKEND ('gemini' or 'fake')."""
+    backend = backend or os.getenv("LLM_BACKEND", "gemini")
+    if backend == "gemini":
+        return GeminiLLM()
+    if backend == "fake":
+        # Deterministic and offline, for benchmarks and local development without an API key.
+        from .fake_provider import FakeLLM
+        return FakeLLM(
+            answer_tokens=int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "120")),
+            first_token_seconds=float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "0")) / 1000,
+            token_seconds=float(os.getenv("FAKE_LLM_TOKEN_MS", "0")) / 1000,
+        )
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+llm_instance = provider_registry.register("llm", create_llm)
\ No newline at end of file
@@ -0,0 +1,99 @@
+# backend/core/local_embedder.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+
+def plan_batches(lengths: list[int], max_batch_tokens: int, max_batch_size: int) -> list[list[int]]:
+    """
+    Groups text indices into batches of similar token length.
+
+    Every row in a batch pads to its longest member, so indices are taken
+    shortest first and a batch is closed once its padded size would pass
+    `max_batch_tokens` or it holds `max_batch_size` texts. A text longer than
+    the budget gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches, current, longest = [], [], 0
+    for index in order:
+        longest_if_added = max(longest, lengths[index])
+        if current and (longest_if_added * (len(current) + 1) > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current, longest_if_added = [], lengths[index]
+        current.append(index)
+        longest = longest_if_added
+    if current:
+        batches.append(current)
+    return batches
+
+class LocalEmbedder(Embedder):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        cache: EmbeddingCache | None = None,
+        runtime: str = "torch",
+        num_threads: int = 4,
+        max_batch_tokens: int = 16384,
+        max_batch_size: int = 128,
+    ):
+        """
+        Embeds text on the local CPU with sentence-transformers.
+
+        `runtime='torch'` uses the regular PyTorch backend. 'onnx' runs
+        inference through onnxruntime and is opt-in: it also needs
+        `optimum[onnxruntime]`, which requirements.txt doesn't install.
+        Texts are grouped into batches by token length, so each batch pads to
+        roughly the same length and stays within `max_batch_tokens`.
+
+        The model and its tokenizer aren't safe to call from several threads
+        at once, so batches run one at a time on a single worker, and
+        `num_threads` goes to the runtime's intra-op thread pool instead.
+        """
+        super().__init__(model_name, cache)
+        if runtime not in ("torch", "onnx"):
+            raise ValueError(f"Unknown local embedding runtime: {runtime}")
+        # Imported here, so deployments that don't embed locally never load torch.
+        from sentence_transformers import SentenceTransformer
+
+        print(f"Loading local embedding model {model_name} ({runtime})...")
+        model_kwargs = None
+        if runtime == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = num_threads
+            model_kwargs = {"session_options": options}
+        else:
+            import torch
+            torch.set_num_threads(num_threads)
+        self.model = SentenceTransformer(model_name, backend=runtime, device="cpu", model_kwargs=model_kwargs)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        print(f"Local embedder initialized with {num_threads} inference threads.")
+
+    def _token_lengths(self, texts: list[str]) -> list[int]:
+        encoded = self.model.tokenizer(
+            texts, truncation=True, max_length=self.model.max_seq_length, add_special_tokens=True
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _plan_batches(self, texts: list[str]) -> list[list[int]]:
+        return plan_batches(self._token_lengths(texts), self.max_batch_tokens, self.max_batch_size)
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        embeddings = self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return embeddings.tolist()
+
+    async def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        loop = asyncio.get_running_loop()
+        batches = await loop.run_in_executor(self.executor, self._plan_batches, texts)
+        print(f"Embedding {len(texts)} documents locally in {len(batches)} batches...")
+        embeddings = [None] * len(texts)
+        # One executor call per batch, so another caller's batches can run in between.
+        for batch in batches:
+            vectors = await loop.run_in_executor(self.executor, self._encode, [texts[i] for i in batch])
+            for index, vector in zip(batch, vectors):
+                embeddings[index] = vector
+        return embeddings
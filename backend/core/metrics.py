@@ -0,0 +1,313 @@
+# backend/core/metrics.py
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import AsyncGenerator, AsyncIterator, Callable, Iterable, Iterator
+
+# Seconds; spans everything from a cache lookup to a large ingestion.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Returned by Metrics.stage when disabled: entering and leaving it costs next to nothing.
+_NULL_STAGE = nullcontext()
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, enabled: bool, callback=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        # Called on each scrape; returns a value, or {label values tuple: value} for labelled metrics.
+        self.callback = callback
+        self._otel = None
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def samples(self) -> dict[tuple, float]:
+        if self.callback is not None:
+            value = self.callback()
+            return value if isinstance(value, dict) else {(): value}
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if self._otel is not None:
+            self._otel.add(amount, labels)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames, enabled, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames, enabled)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., count above the last bucket, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+        if self._otel is not None:
+            self._otel.record(value, labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {cumulative}")
+            labels = _label_str(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class _Stage:
+    def __init__(self, metrics: "Metrics", name: str, attributes: dict):
+        self.metrics = metrics
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        if self.metrics._tracer is not None:
+            self._span = self.metrics._tracer.start_as_current_span(f"documentor.{self.name}", attributes=self.attributes)
+            self._span.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started
+        self.metrics.stage_seconds.observe(elapsed, stage=self.name)
+        if exc_type is not None:
+            self.metrics.stage_errors.inc(stage=self.name)
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+        return False
+
+class Metrics:
+    def __init__(
+        self,
+        enabled: bool = True,
+        namespace: str = "documentor",
+        otlp_endpoint: str | None = None,
+        service_name: str = "documentor-api",
+    ):
+        """
+        Process-local latency histograms, counters and gauges, rendered in the
+        Prometheus text format for `/metrics`.
+
+        `stage` times one pipeline stage into a shared histogram labelled by
+        stage name. If `otlp_endpoint` is set and the OpenTelemetry SDK is
+        installed, each stage is also a span, and histograms and counters are
+        mirrored to OTLP. With `enabled=False` every call returns immediately.
+        Each worker process keeps its own numbers; Prometheus sums them.
+        """
+        self.enabled = enabled
+        self.namespace = namespace
+        self._metrics: list[_Metric] = []
+        self._tracer = None
+        self._meter = None
+        if enabled and otlp_endpoint:
+            self._setup_otlp(otlp_endpoint, service_name)
+
+        self.stage_seconds = self.histogram("stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+        self.stage_errors = self.counter("stage_errors_total", "Pipeline stages that raised.", ("stage",))
+
+    def _setup_otlp(self, endpoint: str, service_name: str):
+        try:
+            from opentelemetry import metrics as otel_metrics, trace
+            from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError as e:
+            print(f"OTLP export disabled; OpenTelemetry is not installed ({e}).")
+            return
+        resource = Resource.create({"service.name": service_name})
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+        trace.set_tracer_provider(tracer_provider)
+        reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=endpoint))
+        otel_metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[reader]))
+        self._tracer = trace.get_tracer("documentor")
+        self._meter = otel_metrics.get_meter("documentor")
+        print(f"Exporting traces and metrics over OTLP to {endpoint}.")
+
+    def _register(self, metric: _Metric, otel=None) -> _Metric:
+        metric._otel = otel
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = (), callback=None) -> Counter:
+        """A monotonically increasing count. With `callback`, the value is read on each scrape instead."""
+        name = f"{self.namespace}_{name}"
+        otel = None
+        if self._meter is not None and callback is None:
+            otel = self._meter.create_counter(name, description=help_text)
+        return self._register(Counter(name, help_text, labelnames, self.enabled, callback), otel)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = (), callback=None) -> Gauge:
+        """A value that goes up and down. With `callback`, it is read on each scrape."""
+        name = f"{self.namespace}_{name}"
+        if self._meter is not None and callback is not None:
+            from opentelemetry.metrics import Observation
+
+            def observe(_options):
+                samples = callback()
+                samples = samples if isinstance(samples, dict) else {(): samples}
+                return [Observation(value, dict(zip(labelnames, key))) for key, value in samples.items()]
+
+            self._meter.create_observable_gauge(name, callbacks=[observe], description=help_text)
+        return self._register(Gauge(name, help_text, labelnames, self.enabled, callback))
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS, unit: str = "s"
+    ) -> Histogram:
+        name = f"{self.namespace}_{name}"
+        otel = None
+        if self._meter is not None:
+            otel = self._meter.create_histogram(name, unit=unit, description=help_text)
+        return self._register(Histogram(name, help_text, labelnames, self.enabled, buckets), otel)
+
+    def stage(self, name: str, **attributes):
+        """Times a block as one pipeline stage: `with metrics.stage('embed', batch=100): ...`"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, attributes)
+
+    def observe_stage(self, name: str, seconds: float):
+        """Records a stage duration measured elsewhere, e.g. summed over an iterator."""
+        self.stage_seconds.observe(seconds, stage=name)
+
+    def timed_iter(self, iterable: Iterable, on_done: Callable[[float], None]) -> Iterator:
+        """
+        Yields from `iterable`, adding up only the time spent producing items,
+        and passes the total to `on_done` once it is exhausted.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        spent = 0.0
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                spent += time.perf_counter() - started
+                break
+            spent += time.perf_counter() - started
+            yield item
+        on_done(spent)
+
+    async def timed_stream(
+        self,
+        stream: AsyncIterator[str],
+        first_stage: str,
+        total_stage: str,
+        on_piece: Callable[[str], None] | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """Passes a token stream through, timing the first piece and the whole stream as two stages."""
+        if not self.enabled:
+            async for piece in stream:
+                yield piece
+            return
+        started = time.perf_counter()
+        first = True
+        async for piece in stream:
+            if first:
+                self.observe_stage(first_stage, time.perf_counter() - started)
+                first = False
+            if on_piece:
+                on_piece(piece)
+            yield piece
+        self.observe_stage(total_stage, time.perf_counter() - started)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One failing callback shouldn't take down the whole scrape.
+                print(f"Error collecting metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics(
+    enabled=os.getenv("METRICS_ENABLED", "1") == "1",
+    otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or None,
+    service_name=os.getenv("OTEL_SERVICE_NAME", "documentor-api"),
+)
+
+documents_ingested = metrics.counter("documents_ingested_total", "Documents ingested, by format and outcome.", ("format", "status"))
+chunks_ingested = metrics.counter("chunks_ingested_total", "Chunks embedded and stored, by document format.", ("format",))
+admission_rejections = metrics.counter("admission_rejections_total", "Requests turned away with 429, by kind.", ("kind",))
+llm_tokens = metrics.counter("llm_tokens_total", "Estimated LLM tokens, by 'prompt' or 'output'.", ("kind",))
+coalesced_embeddings = metrics.counter(
+    "coalesced_embeddings_total", "Query texts embedded through the coalescer: 'sent' or 'deduplicated'.", ("outcome",)
+)
+query_embed_batch_size = metrics.histogram(
+    "query_embed_batch_size", "Texts per coalesced query embedding call.", buckets=(1, 2, 4, 8, 16, 32, 64, 100), unit="1"
+)
+retrieved_chunks = metrics.histogram(
+    "retrieved_chunks", "Chunks kept per retrieval, by mode.", ("mode",), buckets=(1, 2, 3, 4, 5, 6, 8, 10, 12, 16), unit="1"
+)
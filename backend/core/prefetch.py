@@ -0,0 +1,131 @@
+# backend/core/prefetch.py
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import AsyncGenerator, AsyncIterator
+
+from cachetools import TTLCache
+
+from backend.core.answer_cache import normalize_question
+from backend.core.executors import PREFETCH
+from backend.core.metrics import metrics
+from backend.core.retriever import RetrievalResult, retriever_instance
+from backend.core.streaming import SuggestionSplitter
+
+class RetrievalPrefetcher:
+    def __init__(
+        self,
+        retriever,
+        max_sessions: int = 1024,
+        per_session: int = 6,
+        ttl_seconds: int = 300,
+        max_running: int = 4,
+    ):
+        """
+        Retrieves chunks for suggested follow-up questions before anyone asks them.
+
+        `record` watches an answer stream for SUGGESTION: lines and starts
+        retrieving each one in the background, at the lowest I/O priority. The
+        results are kept for a short time per session. If the user then asks
+        the suggestion, `take` returns the retrieval and /query/ goes straight
+        to generation. When a prefetch is still running, `take` waits for it
+        instead of starting over. Each session keeps its `per_session` most
+        recent suggestions. At most `max_running` prefetches run at once;
+        suggestions beyond that are skipped, since this work is speculative.
+        Results live in the worker process that streamed the answer.
+        """
+        self.retriever = retriever
+        self.per_session = per_session
+        self.max_running = max_running
+        # session -> {normalized question: (collection, task returning RetrievalResult | None)}
+        self.sessions = TTLCache(maxsize=max_sessions, ttl=ttl_seconds)
+        self._running = 0
+        self._tasks: set[asyncio.Task] = set()
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, session_id: str, collection_name: str, question: str):
+        """Starts retrieving a likely next question in the background."""
+        key = normalize_question(question)
+        suggestions = self.sessions.get(session_id)
+        if suggestions is None:
+            suggestions = OrderedDict()
+        elif key in suggestions and suggestions[key][0] == collection_name:
+            suggestions.move_to_end(key)
+            return
+        if self._running >= self.max_running:
+            self.skipped += 1
+            return
+        self._running += 1
+        self.started += 1
+        task = asyncio.create_task(self._retrieve(collection_name, question))
+        self._tasks.add(task)
+        # A done callback, not a finally: a task cancelled before it starts never runs its body.
+        task.add_done_callback(self._finished)
+        suggestions[key] = (collection_name, task)
+        while len(suggestions) > self.per_session:
+            suggestions.popitem(last=False)
+        # Re-inserting restarts the session's TTL.
+        self.sessions[session_id] = suggestions
+
+    async def _retrieve(self, collection_name: str, question: str) -> RetrievalResult | None:
+        try:
+            with metrics.stage("prefetch_retrieval"):
+                return await self.retriever.retrieve(collection_name, question, priority=PREFETCH)
+        except Exception as e:
+            print(f"Prefetch failed for '{question}': {e}")
+            return None
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._running -= 1
+
+    async def take(self, session_id: str, collection_name: str, question: str) -> RetrievalResult | None:
+        """Returns the prefetched retrieval for this question, or None if there isn't one."""
+        suggestions = self.sessions.get(session_id)
+        entry = suggestions.pop(normalize_question(question), None) if suggestions else None
+        if entry is None or entry[0] != collection_name:
+            self.misses += 1
+            return None
+        # Shielded, so a client disconnecting here doesn't cancel the shared task.
+        result = await asyncio.shield(entry[1])
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def record(self, stream: AsyncIterator[str], session_id: str, collection_name: str) -> AsyncGenerator[str, None]:
+        """Passes an answer stream through, prefetching each suggestion as soon as its line is complete."""
+        splitter = SuggestionSplitter()
+        async for piece in stream:
+            for kind, text in splitter.feed(piece):
+                if kind == "suggestion":
+                    self.prefetch(session_id, collection_name, text)
+            yield piece
+        for kind, text in splitter.flush():
+            if kind == "suggestion":
+                self.prefetch(session_id, collection_name, text)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "started": self.started,
+            "skipped": self.skipped,
+            "running": self._running,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "sessions": len(self.sessions),
+        }
+
+prefetcher = RetrievalPrefetcher(
+    retriever_instance,
+    max_sessions=int(os.getenv("PREFETCH_MAX_SESSIONS", "1024")),
+    per_session=int(os.getenv("PREFETCH_PER_SESSION", "6")),
+    ttl_seconds=int(os.getenv("PREFETCH_TTL_SECONDS", "300")),
+    max_running=int(os.getenv("PREFETCH_MAX_RUNNING", "4")),
+)
@@ -0,0 +1,161 @@
+# backend/core/providers.py
+
+import asyncio
+import importlib
+import threading
+import time
+from typing import Callable
+
+class ProviderNotReady(RuntimeError):
+    """Raised when the event loop touches a provider that hasn't been built yet."""
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+class LazyProvider:
+    def __init__(self, name: str, factory: Callable[[], object], required: bool = True):
+        """
+        Stands in for a subsystem that is expensive to build, such as an API
+        client or a vector store, and builds it on first use.
+
+        Attribute access is forwarded to the real object, so modules can
+        keep importing `embedder_instance` and friends at import time without
+        paying for them. The factory runs at most once, even under concurrent
+        first use; if it fails, the next use retries. `required` providers
+        must be up before the app reports ready.
+
+        Factories block, so they never run on the event loop: first use from
+        a coroutine raises ProviderNotReady. Request handlers await
+        `ProviderRegistry.ensure_ready` before they touch a provider.
+        """
+        # Underscored names keep the proxy's own state from shadowing the target's attributes.
+        self._provider_name = name
+        self._provider_factory = factory
+        self._provider_required = required
+        self._provider_instance = None
+        self._provider_error = None
+        self._provider_seconds = None
+        self._provider_lock = threading.Lock()
+
+    def _provider_get(self):
+        instance = self._provider_instance
+        if instance is not None:
+            return instance
+        with self._provider_lock:
+            if self._provider_instance is None:
+                started = time.perf_counter()
+                try:
+                    self._provider_instance = self._provider_factory()
+                    self._provider_error = None
+                except Exception as e:
+                    self._provider_error = str(e)
+                    raise
+                finally:
+                    self._provider_seconds = round(time.perf_counter() - started, 3)
+                print(f"Provider '{self._provider_name}' initialized in {self._provider_seconds}s.")
+            return self._provider_instance
+
+    def __getattr__(self, attribute: str):
+        # Only called for attributes the proxy itself doesn't have.
+        if attribute.startswith("_provider_"):
+            raise AttributeError(attribute)
+        instance = self._provider_instance
+        if instance is None:
+            if _on_event_loop():
+                raise ProviderNotReady(f"Provider '{self._provider_name}' is not initialized yet.")
+            instance = self._provider_get()
+        return getattr(instance, attribute)
+
+    def __repr__(self) -> str:
+        return f"<LazyProvider {self._provider_name}: {self._provider_instance!r}>"
+
+class ProviderRegistry:
+    def __init__(self):
+        """Tracks the lazy providers and warms them up in the background after startup."""
+        self._providers: dict[str, LazyProvider] = {}
+        # Modules whose import is slow but not needed to serve health checks.
+        self._modules: list[str] = []
+        self._warm_up_task = None
+        self.warmed_up = False
+
+    def register(self, name: str, factory: Callable[[], object], required: bool = True) -> LazyProvider:
+        provider = LazyProvider(name, factory, required)
+        self._providers[name] = provider
+        return provider
+
+    def preload(self, *modules: str):
+        """Names modules to import during warm-up rather than on the first request that needs them."""
+        self._modules.extend(modules)
+
+    def is_ready(self, name: str) -> bool:
+        return self._providers[name]._provider_instance is not None
+
+    async def warm_up(self, then: Callable[[], object] | None = None):
+        """
+        Initializes every provider and preloads modules on worker threads, so
+        the event loop keeps answering health checks meanwhile. `then` runs
+        (also off the loop) once everything is up, e.g. startup maintenance.
+        """
+        async def init(provider: LazyProvider):
+            try:
+                await asyncio.to_thread(provider._provider_get)
+            except Exception as e:
+                print(f"Provider '{provider._provider_name}' failed to initialize: {e}")
+
+        async def preload(module: str):
+            try:
+                await asyncio.to_thread(importlib.import_module, module)
+            except ImportError as e:
+                print(f"Could not preload {module}: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(init(provider) for provider in self._providers.values()),
+            *(preload(module) for module in self._modules),
+        )
+        if then is not None:
+            await asyncio.to_thread(then)
+        self.warmed_up = True
+        print(f"Warm-up finished in {time.perf_counter() - started:.2f}s.")
+
+    async def ensure_ready(self):
+        """
+        Waits for warm-up, then builds any provider that is still missing (one
+        whose factory failed, say) on a worker thread. Raises if one can't be built.
+        """
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            await asyncio.wait([self._warm_up_task])
+        missing = [provider for provider in self._providers.values() if provider._provider_instance is None]
+        if missing:
+            await asyncio.gather(*(asyncio.to_thread(provider._provider_get) for provider in missing))
+
+    def start_warm_up(self, then: Callable[[], object] | None = None):
+        # Keep a reference so the task isn't garbage collected mid-flight.
+        self._warm_up_task = asyncio.create_task(self.warm_up(then))
+
+    def status(self) -> dict:
+        """Readiness of each provider: 'ready', 'failed' or 'pending', with its initialization time."""
+        providers = {}
+        for name, provider in self._providers.items():
+            if provider._provider_instance is not None:
+                state = "ready"
+            elif provider._provider_error is not None:
+                state = "failed"
+            else:
+                state = "pending"
+            providers[name] = {
+                "status": state,
+                "required": provider._provider_required,
+                "seconds": provider._provider_seconds,
+                "error": provider._provider_error,
+            }
+        ready = self.warmed_up and all(
+            info["status"] == "ready" for info in providers.values() if info["required"]
+        )
+        return {"ready": ready, "warmed_up": self.warmed_up, "providers": providers}
+
+provider_registry = ProviderRegistry()
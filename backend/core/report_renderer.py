@@ -0,0 +1,15 @@
+# backend/core/report_renderer.py
+
+import io
+
+# Kept free of app imports: worker processes import this module to run render_pdf.
+
+def render_pdf(markdown_content: str) -> bytes:
+    """Renders Markdown to PDF bytes entirely in memory."""
+    from markdown_pdf import MarkdownPdf, Section
+
+    pdf = MarkdownPdf(toc_level=2)
+    pdf.add_section(Section(markdown_content, toc=True))
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
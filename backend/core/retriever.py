@@ -0,0 +1,325 @@
+# backend/core/retriever.py
+
+import math
+import os
+
+from backend.core.context_builder import estimate_tokens
+from backend.core.embedder import query_embedder
+from backend.core.executors import QUERY, io_pool
+from backend.core.lexical import lexical_index_registry, tokenize
+from backend.core.metrics import metrics, retrieved_chunks
+from backend.vector_store import vector_store_instance
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int = 60) -> list[dict]:
+    """
+    Merges ranked hit lists by summing 1 / (k + rank) for each chunk.
+    Chunks that rank well in several lists rise to the top.
+    """
+    fused = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)
+
+def document_key(hit: dict) -> str | None:
+    """The document a chunk came from; chunks stored before documents had IDs fall back to the filename."""
+    metadata = hit.get("metadata") or {}
+    return metadata.get("document_id") or metadata.get("source")
+
+def balance_by_document(hits: list[dict], n_results: int, max_share: float) -> list[dict]:
+    """
+    Takes the top `n_results` hits, but lets no single document fill more
+    than `max_share` of them while other documents have relevant chunks.
+    If the other documents run out, the remaining places go to the best
+    skipped hits.
+    """
+    if len({document_key(hit) for hit in hits}) <= 1:
+        return hits[:n_results]
+    cap = max(1, math.ceil(n_results * max_share))
+    chosen, skipped, counts = [], [], {}
+    for hit in hits:
+        if len(chosen) == n_results:
+            break
+        key = document_key(hit)
+        if counts.get(key, 0) < cap:
+            counts[key] = counts.get(key, 0) + 1
+            chosen.append(hit)
+        else:
+            skipped.append(hit)
+    return chosen + skipped[:n_results - len(chosen)]
+
+def fit_token_budget(hits: list[dict], token_budget: int, min_results: int = 1) -> list[dict]:
+    """Keeps hits in order while their texts fit in `token_budget`, but always at least `min_results`."""
+    kept, used = [], 0
+    for hit in hits:
+        cost = estimate_tokens(hit["text"])
+        if len(kept) >= min_results and used + cost > token_budget:
+            continue
+        kept.append(hit)
+        used += cost
+    return kept
+
+def select_mmr(
+    query_embedding: list[float],
+    embeddings: list[list[float]],
+    max_results: int,
+    mmr_lambda: float = 0.7,
+    min_similarity: float = 0.0,
+    relative_cutoff: float = 0.0,
+    duplicate_threshold: float = 1.0,
+    costs: list[int] | None = None,
+    token_budget: int | None = None,
+    groups: list | None = None,
+    max_per_group: int | None = None,
+    min_results: int = 1,
+) -> tuple[list[int], list[float]]:
+    """
+    Picks candidates by maximal marginal relevance, with an adaptive count.
+
+    Each step takes the candidate maximizing
+    `mmr_lambda * sim(query, c) - (1 - mmr_lambda) * max sim(c, chosen)`, so
+    later picks trade a little relevance for covering something new. The
+    candidate-to-candidate similarities are computed once as one matrix
+    product, and the running maximum is updated with one vector operation
+    per pick.
+
+    Candidates are only eligible if their cosine similarity to the query is
+    at least `min_similarity` and at least `relative_cutoff` times the best
+    one's; a candidate at least `duplicate_threshold` similar to one already
+    chosen is skipped. Selection stops at `max_results`, or when no eligible
+    candidate fits in what is left of `token_budget` (`costs` are the
+    candidates' sizes in tokens). No group (document) gets more than
+    `max_per_group` picks while candidates from other groups remain. The
+    `min_results` most relevant candidates ignore the cutoffs and the budget.
+
+    Returns:
+        The chosen candidate indices in pick order, and every candidate's
+        cosine similarity to the query.
+    """
+    import numpy as np
+
+    if not embeddings:
+        return [], []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    count = len(relevance)
+    best = float(relevance.max())
+    eligible = relevance >= max(min_similarity, best * relative_cutoff if best > 0 else min_similarity)
+    eligible[np.argsort(-relevance)[:min_results]] = True
+    costs = np.asarray(costs if costs is not None else np.zeros(count), dtype=np.int64)
+    remaining = token_budget if token_budget is not None else np.iinfo(np.int64).max
+    if groups is not None:
+        _, group_ids = np.unique(np.asarray([str(group) for group in groups]), return_inverse=True)
+        group_counts = np.zeros(group_ids.max() + 1, dtype=np.int64)
+
+    chosen: list[int] = []
+    redundancy = np.zeros(count, dtype=np.float32)
+    while len(chosen) < max_results:
+        available = eligible & (redundancy < duplicate_threshold)
+        if len(chosen) >= min_results:
+            available &= costs <= remaining
+        if not available.any():
+            break
+        if groups is not None and max_per_group is not None:
+            capped = available & (group_counts[group_ids] < max_per_group)
+            if capped.any():
+                available = capped
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy if chosen else relevance.copy()
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(pick)
+        eligible[pick] = False
+        remaining -= costs[pick]
+        redundancy = np.maximum(redundancy, similarity[pick])
+        if groups is not None:
+            group_counts[group_ids[pick]] += 1
+    return chosen, relevance.tolist()
+
+def document_filter(documents: list[str] | None) -> dict | None:
+    """A metadata filter restricting search to the given document IDs."""
+    if not documents:
+        return None
+    if len(documents) == 1:
+        return {"document_id": documents[0]}
+    return {"document_id": {"$in": list(documents)}}
+
+class RetrievalResult:
+    def __init__(self, hits: list[dict], mode: str, query_embedding: list[float] | None = None):
+        """
+        The outcome of one retrieval: the hits (dicts with 'id', 'text',
+        'metadata' and 'score', plus 'fused_score' in hybrid mode or
+        'lexical_score' on the fast path), the mode used ('lexical' for the
+        fast path, otherwise 'hybrid') and the question's embedding, if one
+        was computed.
+        """
+        self.hits = hits
+        self.mode = mode
+        self.query_embedding = query_embedding
+
+    @property
+    def chunk_ids(self) -> list[str]:
+        return [hit["id"] for hit in self.hits]
+
+    @property
+    def texts(self) -> list[str]:
+        return [hit["text"] for hit in self.hits]
+
+class HybridRetriever:
+    def __init__(
+        self,
+        embedder,
+        vector_store,
+        lexical_indexes,
+        n_results: int = 8,
+        candidates: int = 24,
+        rrf_k: int = 60,
+        mmr_lambda: float = 0.7,
+        min_similarity: float = 0.0,
+        relative_cutoff: float = 0.8,
+        duplicate_threshold: float = 0.95,
+        token_budget: int = 3000,
+        fast_path: bool = True,
+        fast_path_min_score: float = 4.0,
+        fast_path_ratio: float = 1.5,
+        fast_path_max_terms: int = 6,
+        document_max_share: float = 0.6,
+    ):
+        """
+        Combines BM25 and vector search with reciprocal-rank fusion.
+
+        Both searches over-fetch `candidates` chunks. From the fused pool, up
+        to `n_results` are picked by maximal marginal relevance (see
+        `select_mmr`) over their embeddings, so near-duplicate chunks don't
+        crowd out the rest. How many are kept adapts to the question: chunks
+        below `min_similarity`, or below `relative_cutoff` times the best
+        match, are dropped, and selection stops once the chunks would exceed
+        `token_budget` tokens of context. Each hit's 'score' is its cosine
+        similarity to the question; the fusion score is kept as 'fused_score'.
+
+        When the fast path is enabled and BM25 alone is decisive for a short,
+        keyword-style question (the top hit scores at least `fast_path_min_score`
+        and beats the runner-up by `fast_path_ratio`), the lexical hits are
+        returned without embedding the question at all. With no embedding
+        there is no cosine similarity, so their 'score' is None and the BM25
+        score is kept as 'lexical_score'.
+
+        In a session with several documents, no document gets more than
+        `document_max_share` of the results while others have relevant chunks.
+        """
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.lexical_indexes = lexical_indexes
+        self.n_results = n_results
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.mmr_lambda = mmr_lambda
+        self.min_similarity = min_similarity
+        self.relative_cutoff = relative_cutoff
+        self.duplicate_threshold = duplicate_threshold
+        self.token_budget = token_budget
+        self.fast_path = fast_path
+        self.fast_path_min_score = fast_path_min_score
+        self.fast_path_ratio = fast_path_ratio
+        self.fast_path_max_terms = fast_path_max_terms
+        self.document_max_share = document_max_share
+
+    def _is_decisive(self, question: str, lexical_hits: list[dict]) -> bool:
+        if not self.fast_path or not lexical_hits:
+            return False
+        if len(tokenize(question)) > self.fast_path_max_terms:
+            return False
+        top = lexical_hits[0]["score"]
+        if top < self.fast_path_min_score:
+            return False
+        return len(lexical_hits) == 1 or top >= lexical_hits[1]["score"] * self.fast_path_ratio
+
+    async def retrieve(
+        self, collection_name: str, question: str, priority: int = QUERY, documents: list[str] | None = None
+    ) -> RetrievalResult:
+        """
+        Finds the chunks most relevant to a question, optionally only within
+        the given document IDs. `priority` orders its calls on the I/O pool.
+        """
+        where = document_filter(documents)
+        with metrics.stage("lexical_search"):
+            lexical_hits = await io_pool.run(
+                self.lexical_indexes.search, collection_name, question, self.candidates, where, priority=priority
+            )
+        if self._is_decisive(question, lexical_hits):
+            print("Lexical fast path: answering retrieval without embedding the question.")
+            hits = balance_by_document(lexical_hits, self.n_results, self.document_max_share)
+            hits = fit_token_budget(hits, self.token_budget)
+            # BM25 scores aren't on the cosine scale 'score' promises, so they get their own key.
+            hits = [{**hit, "score": None, "lexical_score": hit["score"]} for hit in hits]
+            retrieved_chunks.observe(len(hits), mode="lexical")
+            return RetrievalResult(hits, "lexical")
+
+        with metrics.stage("query_embed"):
+            query_embedding = await self.embedder.embed_documents([question])
+        with metrics.stage("vector_search"):
+            vector_hits = await io_pool.run(
+                self.vector_store.search, collection_name, query_embedding[0], self.candidates, where, True,
+                priority=priority,
+            )
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], k=self.rrf_k)
+        missing = [hit["id"] for hit in fused if "embedding" not in hit]
+        if missing:
+            # Chunks only BM25 found: fetch their vectors so they can be compared too.
+            with metrics.stage("candidate_embeddings"):
+                found = await io_pool.run(
+                    self.vector_store.get_embeddings, collection_name, missing, priority=priority
+                )
+            for hit in fused:
+                if "embedding" not in hit and hit["id"] in found:
+                    hit["embedding"] = found[hit["id"]]
+            fused = [hit for hit in fused if "embedding" in hit]
+
+        with metrics.stage("mmr_select"):
+            chosen, relevance = select_mmr(
+                query_embedding[0],
+                [hit["embedding"] for hit in fused],
+                self.n_results,
+                mmr_lambda=self.mmr_lambda,
+                min_similarity=self.min_similarity,
+                relative_cutoff=self.relative_cutoff,
+                duplicate_threshold=self.duplicate_threshold,
+                costs=[estimate_tokens(hit["text"]) for hit in fused],
+                token_budget=self.token_budget,
+                groups=[document_key(hit) for hit in fused],
+                max_per_group=max(1, math.ceil(self.n_results * self.document_max_share)),
+            )
+        hits = [
+            {
+                "id": fused[i]["id"],
+                "text": fused[i]["text"],
+                "metadata": fused[i]["metadata"],
+                "score": relevance[i],
+                "fused_score": fused[i]["score"],
+            }
+            for i in chosen
+        ]
+        retrieved_chunks.observe(len(hits), mode="hybrid")
+        return RetrievalResult(hits, "hybrid", query_embedding[0])
+
+retriever_instance = HybridRetriever(
+    query_embedder,
+    vector_store_instance,
+    lexical_index_registry,
+    n_results=int(os.getenv("RETRIEVAL_MAX_RESULTS", "8")),
+    candidates=int(os.getenv("RETRIEVAL_CANDIDATES", "24")),
+    mmr_lambda=float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7")),
+    min_similarity=float(os.getenv("RETRIEVAL_MIN_SIMILARITY", "0.0")),
+    relative_cutoff=float(os.getenv("RETRIEVAL_RELATIVE_CUTOFF", "0.8")),
+    duplicate_threshold=float(os.getenv("RETRIEVAL_DUPLICATE_THRESHOLD", "0.95")),
+    token_budget=int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000")),
+    fast_path=os.getenv("LEXICAL_FAST_PATH", "1") == "1",
+    fast_path_min_score=float(os.getenv("LEXICAL_FAST_PATH_MIN_SCORE", "4.0")),
+    fast_path_ratio=float(os.getenv("LEXICAL_FAST_PATH_RATIO", "1.5")),
+    document_max_share=float(os.getenv("RETRIEVAL_DOCUMENT_MAX_SHARE", "0.6")),
+)
@@ -1,48 +1,426 @@
 # backend/core/scheduler.py
 
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime, timedelta
+from filelock import FileLock, Timeout
 
 # Import our vector store to call its delete method
-from backend.vector_store.chroma import vector_store_instance
+from backend.vector_store import vector_store_instance
+from backend.core.answer_cache import answer_cache
+from backend.core.conversation import conversation_store
+from backend.core.jobs import job_manager
+from backend.core.lexical import lexical_index_registry
 
 class SessionManager:
-    def __init__(self, expiry_minutes: int = 60):
-        # A dictionary to store session IDs and their creation timestamps
-        self.active_sessions = {}
-        self.expiry_delta = timedelta(minutes=expiry_minutes)
-        print(f"Session manager initialized. Sessions will expire after {expiry_minutes} minutes.")
-
-    def register_session(self, session_id: str):
-        """Adds a new session to the tracker."""
-        self.active_sessions[session_id] = datetime.now()
-        print(f"Session registered: {session_id}")
-
-    def cleanup_expired_sessions(self):
-        """Finds and deletes expired sessions and their corresponding collections."""
-        now = datetime.now()
-        expired_ids = []
-        
+    def __init__(
+        self,
+        path: str = "./sessions.db",
+        expiry_minutes: int = 60,
+        disk_budget_bytes: int | None = None,
+        memory_budget_bytes: int | None = 1024 * 2**20,
+        max_resident: int | None = 64,
+        eviction_policy: str = "lru",
+    ):
+        """
+        A durable registry of sessions and the collections they read from.
+
+        Sessions are views onto shared, refcounted collections: many sessions
+        that uploaded the same document all point at one collection. The
+        registry lives in SQLite, so collections are still accounted for after
+        a restart and `reconcile` can delete the ones nothing points at. Every
+        worker process opens the same database, so a session created in one
+        worker is visible to all of them.
+
+        Sessions expire `expiry_minutes` after their last query (a sliding
+        TTL), found through an index on the expiry time. When the stored
+        collections exceed `disk_budget_bytes`, whole collections are evicted,
+        least recently used first or, with `eviction_policy='largest'`, largest
+        first. `memory_budget_bytes` and `max_resident` bound the in-process
+        indexes by estimated bytes and by count: the least recently used
+        collections have their vector and lexical indexes unloaded together,
+        but stay on disk.
+        """
+        if eviction_policy not in ("lru", "largest"):
+            raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+        self.path = path
+        self.expiry_seconds = expiry_minutes * 60
+        self.disk_budget_bytes = disk_budget_bytes
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_resident = max_resident
+        self.eviction_policy = eviction_policy
+        # collection -> estimated bytes, for collections loaded in this process, oldest first.
+        self._resident: OrderedDict[str, int] = OrderedDict()
+        # Cleanup runs on the scheduler's worker thread, so guard the connection.
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; multi-statement updates open their own transactions.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            " name TEXT PRIMARY KEY,"
+            " fingerprint TEXT,"
+            " status TEXT NOT NULL DEFAULT 'ingesting',"
+            " size_bytes INTEGER NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " collection_name TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        # The documents of a batch collection, as listed to clients.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection_name TEXT NOT NULL,"
+            " document_id TEXT NOT NULL,"
+            " filename TEXT,"
+            " format TEXT,"
+            " PRIMARY KEY (collection_name, document_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_collection ON sessions (collection_name)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_fingerprint ON collections (fingerprint)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_last_access ON collections (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_size ON collections (size_bytes)")
+        print(f"Session manager initialized at {path}. Sessions expire {expiry_minutes} minutes after last use.")
+
+    @contextmanager
+    def _transaction(self):
+        """
+        A write transaction that takes SQLite's write lock up front, so a
+        read-then-write sequence can't interleave with another worker's.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def register_session(self, session_id: str, collection_name: str | None = None):
+        """Adds a new session to the registry, holding a reference on its collection."""
+        collection_name = collection_name or session_id
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO collections (name, last_access) VALUES (?, ?)", (collection_name, now))
+            conn.execute("UPDATE collections SET last_access = ? WHERE name = ?", (now, collection_name))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, collection_name, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (session_id, collection_name, now, now + self.expiry_seconds),
+            )
+        print(f"Session registered: {session_id} -> collection {collection_name}")
+
+    def claim_document(self, fingerprint: str, collection_name: str, session_id: str) -> tuple[str, bool]:
+        """
+        Records that `collection_name` will hold the document with this content
+        hash, unless some collection already does. Returns the collection to
+        use and whether this call claimed it, i.e. whether the caller should
+        ingest. Atomic across workers, so a document is only ingested once.
+
+        If a collection already holds the document, `session_id` is attached
+        to it in the same transaction, so it can't be released in between.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT name FROM collections WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if row:
+                now = time.time()
+                conn.execute("UPDATE collections SET last_access = ? WHERE name = ?", (now, row[0]))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, collection_name, created_at, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (session_id, row[0], now, now + self.expiry_seconds),
+                )
+                return row[0], False
+            conn.execute(
+                "INSERT OR REPLACE INTO collections (name, fingerprint, last_access) VALUES (?, ?, ?)",
+                (collection_name, fingerprint, time.time()),
+            )
+        return collection_name, True
+
+    def record_documents(self, collection_name: str, documents: list[dict]):
+        """Stores the listing of the documents a collection holds ('document_id', 'filename', 'format')."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (collection_name, document_id, filename, format) VALUES (?, ?, ?, ?)",
+                [(collection_name, d["document_id"], d["filename"], d["format"]) for d in documents],
+            )
+
+    def forget_document(self, collection_name: str, document_id: str):
+        """Drops a document from a collection's listing, e.g. after it failed to ingest."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM documents WHERE collection_name = ? AND document_id = ?", (collection_name, document_id)
+            )
+
+    def list_documents(self, collection_name: str) -> list[dict]:
+        """The documents a collection holds, in filename order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, filename, format FROM documents WHERE collection_name = ? ORDER BY filename",
+                (collection_name,),
+            ).fetchall()
+        return [{"document_id": document_id, "filename": filename, "format": fmt} for document_id, filename, fmt in rows]
+
+    def get_collection(self, session_id: str) -> str | None:
+        """Resolves a session to the (possibly shared) collection it reads from."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT collection_name FROM sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def touch(self, session_id: str):
+        """Slides a session's expiry forward and marks its collection as recently used."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("UPDATE sessions SET expires_at = ? WHERE session_id = ?", (now + self.expiry_seconds, session_id))
+            row = conn.execute(
+                "SELECT c.name, c.size_bytes FROM sessions s JOIN collections c ON c.name = s.collection_name"
+                " WHERE s.session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE collections SET last_access = ? WHERE name = ?", (now, row[0]))
+        if row:
+            self._mark_resident(row[0], row[1])
+
+    def stats(self) -> dict:
+        """Counts live sessions and collections (with their stored bytes) by status."""
+        with self._lock:
+            (active,) = self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM collections GROUP BY status"
+            ).fetchall()
+        return {
+            "active_sessions": active,
+            "collections": {status: count for status, count, _ in rows},
+            "collection_bytes": {status: size for status, _, size in rows},
+            "resident_collections": len(self._resident),
+            "resident_bytes": sum(self._resident.values()),
+        }
+
+    def mark_ready(self, collection_name: str, size_bytes: int):
+        """Records that a collection finished ingesting, with its storage footprint."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE collections SET status = 'ready', size_bytes = ?, last_access = ? WHERE name = ?",
+                (size_bytes, time.time(), collection_name),
+            )
+        self._mark_resident(collection_name, size_bytes)
+        self.enforce_storage_budget(protect=collection_name)
+
+    def remove_collection(self, collection_name: str):
+        """
+        Forgets a collection that has already been deleted, e.g. after a failed
+        ingestion, along with every session pointing at it.
+        """
+        with self._transaction() as conn:
+            session_ids = self._forget(conn, collection_name)
+        conversation_store.drop(session_ids)
+
+    def _forget(self, conn: sqlite3.Connection, collection_name: str) -> list[str]:
+        """Deletes a collection's rows inside a transaction; returns the sessions that pointed at it."""
+        session_ids = [
+            session_id for (session_id,) in
+            conn.execute("SELECT session_id FROM sessions WHERE collection_name = ?", (collection_name,))
+        ]
+        conn.execute("DELETE FROM sessions WHERE collection_name = ?", (collection_name,))
+        conn.execute("DELETE FROM documents WHERE collection_name = ?", (collection_name,))
+        conn.execute("DELETE FROM collections WHERE name = ?", (collection_name,))
+        self._resident.pop(collection_name, None)
+        return session_ids
+
+    @staticmethod
+    def _delete_data(collection_name: str):
+        try:
+            vector_store_instance.delete_collection(collection_name=collection_name)
+        except Exception as e:
+            print(f"Error deleting collection {collection_name}: {e}")
+        lexical_index_registry.drop(collection_name)
+        answer_cache.drop_document(collection_name)
+
+    def discard_collection(self, collection_name: str):
+        """Deletes a collection's data everywhere and forgets it and its sessions."""
+        self._delete_data(collection_name)
+        self.remove_collection(collection_name)
+
+    def _release(self, session_id: str) -> str | None:
+        """
+        Drops a session and, if that was the last reference, deletes its
+        collection. Returns the name of the deleted collection, if any.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT collection_name FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            collection_name = row[0]
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            (refs,) = conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE collection_name = ?", (collection_name,)
+            ).fetchone()
+            if not refs:
+                # Still holding the write lock the count was taken under, so no
+                # session can attach to the collection before it is gone.
+                self._delete_data(collection_name)
+                self._forget(conn, collection_name)
+        conversation_store.drop([session_id])
+        return None if refs else collection_name
+
+    def _mark_resident(self, collection_name: str, size_bytes: int):
+        """Tracks a collection as loaded in this process and unloads the coldest ones over budget."""
+        if not self.memory_budget_bytes and not self.max_resident:
+            return
+        with self._lock:
+            self._resident[collection_name] = size_bytes
+            self._resident.move_to_end(collection_name)
+            unload = []
+            while len(self._resident) > 1 and (
+                (self.memory_budget_bytes and sum(self._resident.values()) > self.memory_budget_bytes)
+                or (self.max_resident and len(self._resident) > self.max_resident)
+            ):
+                name, _ = self._resident.popitem(last=False)
+                unload.append(name)
+        for name in unload:
+            # Both indexes are rebuilt from disk on the next query that needs them.
+            lexical_index_registry.drop(name)
+            vector_store_instance.release(name)
+            print(f"Unloaded collection {name} to stay within the memory budget.")
+
+    def enforce_storage_budget(self, protect: str | None = None):
+        """Evicts whole collections, and their sessions, until the disk budget is met."""
+        if not self.disk_budget_bytes:
+            return
+        order = "last_access ASC" if self.eviction_policy == "lru" else "size_bytes DESC"
+        while True:
+            with self._lock:
+                (total,) = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM collections").fetchone()
+                if total <= self.disk_budget_bytes:
+                    return
+                row = self._conn.execute(
+                    f"SELECT name, size_bytes FROM collections WHERE status = 'ready' AND name != ?"
+                    f" ORDER BY {order} LIMIT 1",
+                    (protect or "",),
+                ).fetchone()
+            if row is None:
+                return
+            print(f"Storage budget exceeded ({total} bytes); evicting collection {row[0]} ({row[1]} bytes).")
+            self.discard_collection(row[0])
+
+    def reconcile(self):
+        """
+        Brings the registry and the vector store back in line after a restart:
+        deletes stored collections the registry doesn't know about, forgets
+        registered ones that no longer exist, and drops ingestions that were
+        interrupted before they finished. Ingestions still running in another
+        worker are left alone.
+        """
+        stored = set(vector_store_instance.list_collections())
+        with self._lock:
+            rows = self._conn.execute("SELECT name, status FROM collections").fetchall()
+        known = {name for name, _ in rows}
+
+        for name in sorted(stored - known):
+            print(f"Deleting orphaned collection {name}.")
+            self.discard_collection(name)
+        for name, status in rows:
+            if name not in stored:
+                print(f"Forgetting collection {name}; it is no longer in the vector store.")
+                self.remove_collection(name)
+            elif status != "ready" and not job_manager.is_partial(name):
+                print(f"Deleting collection {name}; its ingestion was interrupted.")
+                self.discard_collection(name)
+
+        self.cleanup_expired_sessions()
+        self.enforce_storage_budget()
+
+    def cleanup_expired_sessions(self, batch_size: int = 500):
+        """Releases expired sessions and deletes collections that are no longer referenced."""
         print("Running cleanup job...")
-        for session_id, creation_time in self.active_sessions.items():
-            if now - creation_time > self.expiry_delta:
-                expired_ids.append(session_id)
-        
-        if not expired_ids:
+        released = 0
+        while True:
+            # Only the expired prefix of the expiry index is read, never the whole table.
+            with self._lock:
+                expired_ids = [
+                    session_id for (session_id,) in self._conn.execute(
+                        "SELECT session_id FROM sessions WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                        (time.time(), batch_size),
+                    )
+                ]
+            if not expired_ids:
+                break
+            for session_id in expired_ids:
+                released += 1
+                collection_name = self._release(session_id)
+                if collection_name is None:
+                    print(f"Session {session_id} released; its collection is still shared.")
+                else:
+                    print(f"Deleted collection {collection_name} for expired session: {session_id}")
+
+        if not released:
             print("No expired sessions found.")
-            return
 
-        for session_id in expired_ids:
-            print(f"Session {session_id} has expired. Deleting...")
+class LeaderLock:
+    def __init__(self, path: str = "./scheduler.lock"):
+        """
+        Elects one worker process to run maintenance jobs.
+
+        The first worker to take the file lock keeps it for its lifetime; the
+        operating system releases it if that worker dies, and the next worker
+        to check takes over.
+
+        The lock is shared by every thread in the process: the scheduler runs
+        jobs on worker threads, and with filelock's default thread-local lock
+        those threads would see the event loop's lock as someone else's.
+        """
+        self._lock = FileLock(path, thread_local=False)
+
+    def is_leader(self) -> bool:
+        if not self._lock.is_locked:
             try:
-                # Tell ChromaDB to delete the entire collection
-                vector_store_instance.delete_collection(collection_name=session_id)
-                # Remove from our tracking dictionary
-                del self.active_sessions[session_id]
-                print(f"Successfully deleted collection and session: {session_id}")
-            except Exception as e:
-                print(f"Error deleting session {session_id}: {e}")
+                self._lock.acquire(timeout=0)
+                print(f"Worker {os.getpid()} is now the maintenance leader.")
+            except Timeout:
+                return False
+        return True
+
+    def leader_only(self, job):
+        """Wraps a scheduled job so it only runs in the leader worker."""
+        @functools.wraps(job)
+        def wrapper(*args, **kwargs):
+            if self.is_leader():
+                return job(*args, **kwargs)
+        return wrapper
+
+def _megabytes(name: str, default: str = "0") -> int | None:
+    value = int(os.getenv(name, default))
+    return value * 2**20 or None
 
 # Create global instances
-session_manager = SessionManager()
-scheduler = AsyncIOScheduler()
\ No newline at end of file
+session_manager = SessionManager(
+    path=os.getenv("SESSION_DB_PATH", "./sessions.db"),
+    expiry_minutes=int(os.getenv("SESSION_TTL_MINUTES", "60")),
+    disk_budget_bytes=_megabytes("SESSION_DISK_BUDGET_MB"),
+    # Both bounds are on by default, since nothing else unloads a collection; 0 turns one off.
+    memory_budget_bytes=_megabytes("SESSION_MEMORY_BUDGET_MB", "1024"),
+    max_resident=int(os.getenv("SESSION_MAX_RESIDENT", "64")) or None,
+    eviction_policy=os.getenv("SESSION_EVICTION_POLICY", "lru"),
+)
+leader_lock = LeaderLock(os.getenv("SCHEDULER_LOCK_PATH", "./scheduler.lock"))
+scheduler = AsyncIOScheduler()
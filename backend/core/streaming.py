@@ -0,0 +1,127 @@
+# backend/core/streaming.py
+
+import json
+import time
+import zlib
+from typing import AsyncGenerator, AsyncIterator
+
+SUGGESTION_MARKER = "SUGGESTION:"
+
+class SuggestionSplitter:
+    def __init__(self, marker: str = SUGGESTION_MARKER):
+        """
+        Separates follow-up suggestions from answer text in a token stream.
+
+        Text is released as soon as it can no longer be the start of a
+        suggestion line, so the answer streams with almost no delay; only the
+        first few characters of each line are held back until they decide it.
+        """
+        self.marker = marker
+        self._buffer = ""
+        self._at_line_start = True
+
+    def feed(self, piece: str) -> list[tuple[str, str]]:
+        """Returns ('token', text) and ('suggestion', text) events completed by this piece."""
+        self._buffer += piece
+        events = []
+        while self._buffer:
+            newline = self._buffer.find("\n")
+            if self._at_line_start:
+                head = self._buffer.lstrip(" \t")
+                if head.startswith(self.marker):
+                    if newline == -1:
+                        break
+                    events.append(("suggestion", self._buffer[:newline].strip()[len(self.marker):].strip()))
+                    self._buffer = self._buffer[newline + 1:]
+                    continue
+                if newline == -1 and self.marker.startswith(head):
+                    break  # still undecided
+            if newline == -1:
+                events.append(("token", self._buffer))
+                self._buffer = ""
+                self._at_line_start = False
+            else:
+                events.append(("token", self._buffer[:newline + 1]))
+                self._buffer = self._buffer[newline + 1:]
+                self._at_line_start = True
+        return [event for event in events if event[1]]
+
+    def flush(self) -> list[tuple[str, str]]:
+        """Returns whatever was held back once the stream has ended."""
+        rest, self._buffer = self._buffer, ""
+        head = rest.strip()
+        if self._at_line_start and head.startswith(self.marker):
+            suggestion = head[len(self.marker):].strip()
+            return [("suggestion", suggestion)] if suggestion else []
+        return [("token", rest)] if rest else []
+
+def format_event(event: dict, use_sse: bool) -> str:
+    """Serializes one event as an SSE message or an NDJSON line."""
+    payload = json.dumps(event, ensure_ascii=False)
+    return f"event: {event['type']}\ndata: {payload}\n\n" if use_sse else f"{payload}\n"
+
+def source_event(hits: list[dict], **details) -> dict:
+    """Describes the retrieved chunks: IDs, scores, location in the document and text."""
+    sources = []
+    for hit in hits:
+        metadata = hit.get("metadata") or {}
+        sources.append({
+            "id": hit["id"],
+            "score": hit.get("score"),
+            "source": metadata.get("source"),
+            "document_id": metadata.get("document_id"),
+            "page": metadata.get("page", metadata.get("paragraph")),
+            "start": metadata.get("start"),
+            "end": metadata.get("end"),
+            "text": hit["text"],
+        })
+    return {"type": "sources", "sources": sources, **details}
+
+async def answer_events(
+    answer_stream: AsyncIterator[str],
+    sources: dict,
+    usage: dict | None,
+    started_at: float,
+    retrieval_seconds: float,
+    use_sse: bool,
+) -> AsyncGenerator[str, None]:
+    """
+    Turns a plain answer stream into typed events: the sources first, then
+    token deltas and suggestions as they arrive, and finally usage and timing.
+    """
+    yield format_event(sources, use_sse)
+    splitter = SuggestionSplitter()
+    first_token_at = None
+    async for piece in answer_stream:
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        for kind, text in splitter.feed(piece):
+            yield format_event({"type": kind, "text": text}, use_sse)
+    for kind, text in splitter.flush():
+        yield format_event({"type": kind, "text": text}, use_sse)
+
+    finished_at = time.perf_counter()
+    timing = {
+        "retrieval_ms": round(retrieval_seconds * 1000, 1),
+        "first_token_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at else None,
+        "total_ms": round((finished_at - started_at) * 1000, 1),
+    }
+    yield format_event({"type": "usage", "usage": usage, "timing": timing}, use_sse)
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """True if the Accept-Encoding header allows gzip (and doesn't rule it out with q=0)."""
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+async def gzip_stream(stream: AsyncIterator[str]) -> AsyncGenerator[bytes, None]:
+    """
+    Gzips a text stream, sync-flushing after every piece so each event
+    reaches the client immediately instead of waiting for a full block.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for piece in stream:
+        yield compressor.compress(piece.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -1,23 +1,41 @@
 # backend/main.py
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import Callable, List, Optional
+import asyncio
+import functools
+import hashlib
 import json
 import base64
 import os
+import tempfile
+import time
 import uuid
-from markdown_pdf import MarkdownPdf, Section
-from fastapi import BackgroundTasks
+import zipfile
 
-from .parsers import pdf_parser, docx_parser, txt_parser
-from .core.chunker import chunk_text
+from .parsers import txt_parser
+from .core.answer_cache import answer_cache, conversation_fingerprint
+from .core.chunker import chunk_document
+from .core.context_builder import context_builder, estimate_tokens
+from .core.conversation import conversation_store
 from .core.embedder import embedder_instance
-from .core.vector_store.chroma import vector_store_instance
+from .core import executors
+from .core.executors import INGEST, QUERY, AdmissionRejected, ingestion_admission, io_pool
+from .core.exporter import export_service
+from .core.ingestion import ingestion_pipeline
+from .core.jobs import job_manager
+from .core.lexical import lexical_index_registry
+from .core.prefetch import prefetcher
+from .core.providers import provider_registry
+from .core.metrics import admission_rejections, chunks_ingested, documents_ingested, llm_tokens, metrics
+from .core.retriever import retriever_instance
+from .vector_store import vector_store_instance
 from .core.llm import llm_instance
-from .core.scheduler import scheduler, session_manager
+from .core.scheduler import leader_lock, scheduler, session_manager
+from .core.streaming import accepts_gzip, answer_events, gzip_stream, source_event
 
 app = FastAPI(
     title="DocuMentor AI API",
@@ -38,13 +56,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Source-Chunks"],
+    expose_headers=["X-Source-Chunks", "X-Index-Partial", "X-Retrieval-Mode", "X-Answer-Cache", "X-Retrieval-Prefetch", "X-Prompt-Usage", "Content-Encoding"],
 )
 # --- END OF CORS FIX ---
 
+provider_registry.preload("numpy", "backend.parsers.pdf_parser", "backend.parsers.docx_parser")
+
 @app.on_event("startup")
 async def startup_event():
-    scheduler.add_job(session_manager.cleanup_expired_sessions, 'interval', minutes=10)
+    # Clients, stores and slow imports are set up in the background, so the
+    # worker answers /healthz at once; /readyz reports when it can take traffic.
+    # With several workers, only the one holding the leader lock does maintenance:
+    # collections left behind by a previous run are deleted once the store is up.
+    provider_registry.start_warm_up(then=session_manager.reconcile if leader_lock.is_leader() else None)
+    scheduler.add_job(leader_lock.leader_only(session_manager.cleanup_expired_sessions), 'interval', minutes=10)
+    scheduler.add_job(leader_lock.leader_only(job_manager.prune_finished_jobs), 'interval', minutes=10)
     scheduler.start()
     print("Scheduler started and cleanup job scheduled.")
 
@@ -52,6 +78,8 @@ async def startup_event():
 async def shutdown_event():
     scheduler.shutdown()
     print("Scheduler shut down.")
+    export_service.shutdown()
+    executors.shutdown()
 
 class ChatMessage(BaseModel):
     sender: str
@@ -60,110 +88,693 @@ class ChatMessage(BaseModel):
 class QueryRequest(BaseModel):
     session_id: str
     question: str
-    chat_history: List[ChatMessage] = []
+    # Optional: the server keeps the conversation. Clients that still send it override the stored one.
+    chat_history: Optional[List[ChatMessage]] = None
+    # Optional: restricts retrieval to these document IDs in a multi-document session.
+    documents: Optional[List[str]] = None
 
 class ExportRequest(BaseModel):
-    chat_history: List[ChatMessage] = []
+    session_id: Optional[str] = None
+    chat_history: Optional[List[ChatMessage]] = None
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     return {"status": "ok"}
 
-@app.post("/process/", tags=["Document Processing"])
-async def process_document(file: UploadFile = File(...)):
+@app.get("/healthz", tags=["Health Check"])
+def liveness():
+    """Liveness: the process is up and its event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Health Check"])
+def readiness():
+    """Readiness: warm-up has finished and every required provider is initialized."""
+    status = provider_registry.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+async def providers_ready():
+    """
+    Holds a request that needs the providers until warm-up has built them,
+    so none is built on the event loop; 503 if one can't be built.
+    """
     try:
-        session_id = vector_store_instance.create_collection()
-        session_manager.register_session(session_id)
+        await provider_registry.ensure_ready()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create a new session: {e}")
-    
-    content_type = file.content_type
-    filename = file.filename
-    extracted_text = ""
-    
-    if content_type == 'application/pdf': extracted_text = pdf_parser.parse_pdf(file)
-    elif content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or filename.endswith('.docx'): extracted_text = docx_parser.parse_docx(file)
-    elif content_type == 'text/plain' or filename.endswith('.txt'): extracted_text = txt_parser.parse_txt(file)
-    else: vector_store_instance.delete_collection(session_id); raise HTTPException(status_code=400, detail=f"Unsupported file type.")
-    
-    if "Error:" in extracted_text: vector_store_instance.delete_collection(session_id); raise HTTPException(status_code=500, detail=extracted_text)
-    if not extracted_text.strip(): vector_store_instance.delete_collection(session_id); raise HTTPException(status_code=400, detail="Document is empty.")
-
-    text_chunks = chunk_text(extracted_text)
-    batch_size = 100
-    total_chunks = len(text_chunks)
-    print(f"Starting to process {total_chunks} chunks in batches of {batch_size}...")
-    for i in range(0, total_chunks, batch_size):
-        batch_chunks = text_chunks[i:i + batch_size]
+        raise HTTPException(status_code=503, detail=f"The service is not ready: {e}", headers={"Retry-After": "5"})
+
+def _format_for(content_type: str | None, filename: str) -> str | None:
+    if content_type == 'application/pdf' or filename.endswith('.pdf'): return "pdf"
+    if content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or filename.endswith('.docx'): return "docx"
+    if content_type == 'text/plain' or filename.endswith('.txt'): return "txt"
+    return None
+
+def _detect_format(file: UploadFile) -> str | None:
+    """Returns 'pdf', 'docx' or 'txt' for a supported upload, otherwise None."""
+    return _format_for(file.content_type, file.filename or "")
+
+def _spool_stream(stream, filename: str, max_bytes: int | None = None) -> tuple[str, str]:
+    """
+    Copies a file object to a temp file, hashing it on the way.
+    Returns the temp file path and the SHA-256 fingerprint of the content.
+    """
+    suffix = os.path.splitext(filename)[1]
+    digest = hashlib.sha256()
+    copied = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as spooled:
         try:
-            chunk_embeddings = await embedder_instance.embed_documents(batch_chunks)
-            metadatas = [{"source": filename} for _ in batch_chunks]
-            vector_store_instance.add_documents(
-                collection_name=session_id, chunks=batch_chunks, embeddings=chunk_embeddings, metadatas=metadatas
-            )
-            print(f"Processed batch {i // batch_size + 1}/{(total_chunks + batch_size - 1) // batch_size}")
+            while block := stream.read(1024 * 1024):
+                copied += len(block)
+                if max_bytes is not None and copied > max_bytes:
+                    raise ValueError(f"The upload exceeds the {max_bytes // 2**20} MiB batch limit.")
+                digest.update(block)
+                spooled.write(block)
+        except BaseException:
+            spooled.close()
+            os.remove(spooled.name)
+            raise
+        return spooled.name, digest.hexdigest()
+
+def _spool_upload(file: UploadFile) -> tuple[str, str]:
+    """Copies an upload to a temp file, since FastAPI closes it once the request returns."""
+    return _spool_stream(file.file, file.filename or "")
+
+async def _ingest_file(
+    collection_name: str,
+    upload_path: str,
+    file_format: str,
+    filename: str,
+    document_id: str,
+    on_page: Callable[[int, int], None],
+    on_batch: Callable[[int], None],
+) -> int:
+    """Parses, chunks and indexes one spooled file into a collection. Returns the number of chunks stored."""
+    # Imported here (and preloaded during warm-up) because pypdf and lxml are slow to import.
+    from .parsers import docx_parser, pdf_parser
+
+    def counted(count):
+        chunks_ingested.inc(count, format=file_format)
+        on_batch(count)
+
+    # Parsing, chunking and embedding overlap, so each stage's time is summed separately.
+    parse_seconds = 0.0
+
+    def parsed(seconds):
+        nonlocal parse_seconds
+        parse_seconds = seconds
+        metrics.observe_stage("parse", seconds)
+
+    try:
+        with metrics.stage("ingest", format=file_format):
+            # Every parser streams its segments, so embedding starts before the whole file is parsed.
+            if file_format == "pdf":
+                # Page ranges are extracted in the CPU pool and yielded in order.
+                parts = pdf_parser.iter_pdf_pages(upload_path, on_page=on_page)
+                segment_key = "page"
+            else:
+                # DOCX and TXT are read paragraph by paragraph, so memory stays flat on huge files;
+                # large DOCX files are parsed in the CPU pool and stream back in batches.
+                parser = docx_parser.iter_docx_segments if file_format == "docx" else txt_parser.iter_txt_segments
+
+                def iter_paragraphs():
+                    yield from parser(upload_path)
+                    on_page(1, 1)
+
+                parts = iter_paragraphs()
+                segment_key = "paragraph"
+            segments = lambda: metrics.timed_iter(parts, parsed)
+
+            def iter_chunks():
+                # Lazy, so parsing and chunking run inside the pipeline's producer thread.
+                chunks = metrics.timed_iter(
+                    chunk_document(segments()), lambda seconds: metrics.observe_stage("chunk", seconds - parse_seconds)
+                )
+                for chunk in chunks:
+                    yield chunk.text, {
+                        "source": filename,
+                        "document_id": document_id,
+                        segment_key: chunk.segment,
+                        "start": chunk.start,
+                        "end": chunk.end,
+                        "content_hash": chunk.content_hash,
+                    }
+
+            total_chunks = await ingestion_pipeline.run(collection_name, iter_chunks(), on_batch=counted)
+            if total_chunks == 0: raise ValueError(f"{filename} is empty.")
+        documents_ingested.inc(format=file_format, status="completed")
+        return total_chunks
+    except Exception:
+        documents_ingested.inc(format=file_format, status="failed")
+        raise
+
+async def _mark_ready(collection_name: str):
+    size_bytes = await io_pool.run(vector_store_instance.collection_size, collection_name, priority=INGEST)
+    await io_pool.run(session_manager.mark_ready, collection_name, size_bytes, priority=INGEST)
+
+async def _ingest_document(job, upload_path: str, file_format: str, filename: str, document_id: str):
+    """Parses, chunks and indexes a spooled upload, updating the job as it goes."""
+    collection_name = job.collection_name
+
+    def on_page(pages_parsed, pages_total):
+        job.pages_parsed, job.pages_total = pages_parsed, pages_total
+
+    def on_batch(count):
+        job.chunks_embedded += count
+
+    try:
+        job.chunks_total = await _ingest_file(
+            collection_name, upload_path, file_format, filename, document_id, on_page, on_batch
+        )
+        print(f"Finished processing {job.chunks_total} chunks into collection {collection_name}.")
+        await _mark_ready(collection_name)
+    except Exception:
+        # Every session attached to this document loses its index along with it.
+        await io_pool.run(session_manager.discard_collection, collection_name, priority=INGEST)
+        raise
+    finally:
+        os.remove(upload_path)
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_MB", "500")) * 2**20
+# Files ingested at once; parsing inside each one also fans out over the CPU pool.
+BATCH_PARALLEL_FILES = int(os.getenv("BATCH_PARALLEL_FILES", str(max(2, executors.CPU_WORKERS))))
+
+def _discard_document(collection_name: str, document_id: str):
+    """Removes one document's chunks from a shared collection and drops it from the listing."""
+    where = {"document_id": document_id}
+    vector_store_instance.delete_documents(collection_name, where)
+    lexical_index_registry.remove(collection_name, where)
+    # Answers given while the batch was ingesting may cite the removed chunks.
+    answer_cache.drop_document(collection_name)
+    session_manager.forget_document(collection_name, document_id)
+
+async def _ingest_batch(job, documents: list[dict]):
+    """
+    Ingests several spooled files into one collection, a few at a time.
+    Files that fail are skipped: whatever part of them was already stored is
+    deleted again, they are dropped from the session's document listing and
+    listed in the job's error. The batch only fails if none of them could be
+    ingested.
+    """
+    collection_name = job.collection_name
+    pages: dict[str, tuple[int, int]] = {}
+    failures = []
+    semaphore = asyncio.Semaphore(BATCH_PARALLEL_FILES)
+
+    async def ingest(document: dict) -> int:
+        stored = 0
+
+        def on_page(pages_parsed, pages_total):
+            pages[document["document_id"]] = (pages_parsed, pages_total)
+            job.pages_parsed = sum(parsed for parsed, _ in pages.values())
+            job.pages_total = sum(total for _, total in pages.values())
+
+        def on_batch(count):
+            nonlocal stored
+            stored += count
+            job.chunks_embedded += count
+
+        try:
+            async with semaphore:
+                return await _ingest_file(
+                    collection_name, document["path"], document["format"], document["filename"],
+                    document["document_id"], on_page, on_batch,
+                )
         except Exception as e:
-            vector_store_instance.delete_collection(session_id)
-            raise HTTPException(status_code=500, detail=f"Failed to process batch {i}: {e}")
+            print(f"Skipping {document['filename']} in batch {collection_name}: {e}")
+            failures.append(f"{document['filename']}: {e}")
+            job.chunks_embedded -= stored
+            await io_pool.run(_discard_document, collection_name, document["document_id"], priority=INGEST)
+            return 0
+        finally:
+            os.remove(document["path"])
+
+    try:
+        job.chunks_total = sum(await asyncio.gather(*(ingest(document) for document in documents)))
+        if job.chunks_total == 0:
+            raise ValueError("None of the documents could be ingested. " + "; ".join(failures))
+        if failures:
+            job.error = "Skipped: " + "; ".join(failures)
+        print(f"Finished processing {len(documents) - len(failures)} documents ({job.chunks_total} chunks) "
+              f"into collection {collection_name}.")
+        await _mark_ready(collection_name)
+    except Exception:
+        await io_pool.run(session_manager.discard_collection, collection_name, priority=INGEST)
+        raise
 
+def _reserve_ingestion():
+    """Claims an ingestion slot, turning the request away with 429 if this worker is saturated."""
+    try:
+        return ingestion_admission.reserve()
+    except AdmissionRejected as e:
+        admission_rejections.inc(kind="ingestion")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _attach_existing(session_id: str, collection_name: str, label: str, **details) -> JSONResponse:
+    """Reports a new session attached (by `claim_document`) to an already indexed collection."""
+    job = await io_pool.run(job_manager.job_for_collection, collection_name, priority=INGEST)
+    print(f"{label} already indexed; attached session {session_id}.")
     return JSONResponse(
-        status_code=200, content={"message": "Document processed successfully in batches.", "session_id": session_id}
+        status_code=200,
+        content={
+            "message": f"{label} already indexed; attached to the shared index.",
+            "session_id": session_id,
+            "job_id": job.job_id if job else None,
+            "progress_url": f"/process/{job.job_id}/progress" if job else None,
+            "deduplicated": True,
+            **details,
+        },
     )
 
-@app.post("/query/", tags=["Question Answering"])
-async def query_document(request: QueryRequest):
-    session_id = request.session_id
-    question = request.question
-    chat_history = [msg.dict() for msg in request.chat_history]
+async def _open_collection(session_id: str, collection_name: str):
+    # A same-named collection the registry doesn't know about is a leftover from an earlier run.
+    await io_pool.run(vector_store_instance.create_collection, collection_name, overwrite=True, priority=INGEST)
+    await io_pool.run(session_manager.register_session, session_id, collection_name, priority=INGEST)
+
+@app.post("/process/", tags=["Document Processing"], status_code=202, dependencies=[Depends(providers_ready)])
+async def process_document(file: UploadFile = File(...)):
+    file_format = _detect_format(file)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type.")
+    # Ingestions beyond what this worker can run or queue are turned away before any work is done.
+    slot = _reserve_ingestion()
 
     try:
-        query_embedding = await embedder_instance.embed_documents([question])
-        context_chunks = vector_store_instance.query(
-            collection_name=session_id,
-            query_embedding=query_embedding[0]
+        upload_path, fingerprint = await io_pool.run(_spool_upload, file, priority=INGEST)
+    except BaseException:
+        slot.release()
+        raise
+    session_id = str(uuid.uuid4())
+
+    # Identical uploads share one collection; the new session just takes a reference.
+    # Claiming is atomic across workers, so concurrent uploads ingest the document once.
+    collection_name, claimed = await io_pool.run(
+        session_manager.claim_document, fingerprint, f"doc-{fingerprint[:48]}", session_id, priority=INGEST
+    )
+    if not claimed:
+        slot.release()
+        os.remove(upload_path)
+        return await _attach_existing(
+            session_id, collection_name, f"Document {fingerprint[:12]}", document_id=fingerprint[:16]
         )
+
+    try:
+        await _open_collection(session_id, collection_name)
     except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Session not found or query error: {e}")
+        slot.release()
+        os.remove(upload_path)
+        await io_pool.run(session_manager.remove_collection, collection_name, priority=INGEST)
+        raise HTTPException(status_code=500, detail=f"Failed to create a new session: {e}")
 
-    sources_json = json.dumps(context_chunks)
-    sources_b64 = base64.b64encode(sources_json.encode('utf-8')).decode('utf-8')
-    custom_headers = { "X-Source-Chunks": sources_b64 }
+    job = await io_pool.run(job_manager.create_job, session_id, collection_name, file.filename, priority=INGEST)
+    # The job reports 'queued' until an ingestion slot frees up.
+    job_manager.start(
+        job,
+        _ingest_document(job, upload_path, file_format, file.filename, fingerprint[:16]),
+        slot=slot,
+        cleanup=functools.partial(os.remove, upload_path),
+    )
 
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "Document accepted for processing.",
+            "session_id": session_id,
+            "job_id": job.job_id,
+            "progress_url": f"/process/{job.job_id}/progress",
+            "document_id": fingerprint[:16],
+            "deduplicated": False,
+        },
+    )
+
+def _spool_batch(files: list[UploadFile]) -> tuple[list[dict], list[dict]]:
+    """
+    Spools every supported file in the request, unpacking zip archives.
+    Returns the documents (path, fingerprint, filename, format) and the
+    skipped entries with the reason. Identical files are kept once.
+    """
+    documents, skipped = [], []
+    budget = BATCH_MAX_BYTES
+
+    def add(stream, filename: str, file_format: str | None):
+        nonlocal budget
+        if file_format is None:
+            skipped.append({"filename": filename, "reason": "unsupported file type"})
+            return
+        if len(documents) >= BATCH_MAX_FILES:
+            raise ValueError(f"A batch holds at most {BATCH_MAX_FILES} documents.")
+        path, fingerprint = _spool_stream(stream, filename, max_bytes=budget)
+        budget -= os.path.getsize(path)
+        if any(document["fingerprint"] == fingerprint for document in documents):
+            os.remove(path)
+            skipped.append({"filename": filename, "reason": "duplicate of another file in the batch"})
+            return
+        documents.append({"path": path, "fingerprint": fingerprint, "filename": filename, "format": file_format})
+
+    try:
+        for file in files:
+            filename = file.filename or ""
+            if file.content_type in ("application/zip", "application/x-zip-compressed") or filename.endswith(".zip"):
+                try:
+                    archive = zipfile.ZipFile(file.file)
+                except zipfile.BadZipFile:
+                    skipped.append({"filename": filename, "reason": "not a valid zip archive"})
+                    continue
+                with archive:
+                    for member in archive.infolist():
+                        name = os.path.basename(member.filename)
+                        # Folders and the metadata macOS and editors leave behind aren't documents.
+                        if member.is_dir() or not name or name.startswith(".") or member.filename.startswith("__MACOSX/"):
+                            continue
+                        with archive.open(member) as stream:
+                            add(stream, name, _format_for(None, name.lower()))
+            else:
+                add(file.file, filename, _detect_format(file))
+    except BaseException:
+        for document in documents:
+            os.remove(document["path"])
+        raise
+    return documents, skipped
+
+@app.post("/process/batch", tags=["Document Processing"], status_code=202, dependencies=[Depends(providers_ready)])
+async def process_batch(files: List[UploadFile] = File(...)):
+    """
+    Ingests many documents, or zip archives of them, into one session.
+
+    Files are parsed and embedded several at a time, each chunk tagged with
+    its document's ID. Queries can then search every document at once (with
+    results balanced across them) or only some, via `documents`.
+    """
+    slot = _reserve_ingestion()
     try:
-        answer_generator = llm_instance.generate_answer_stream(
-            question=question,
-            context_chunks=context_chunks,
-            chat_history=chat_history
+        documents, skipped = await io_pool.run(_spool_batch, files, priority=INGEST)
+    except ValueError as e:
+        slot.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        slot.release()
+        raise
+    if not documents:
+        slot.release()
+        raise HTTPException(status_code=400, detail="The batch contains no supported documents.")
+    for document in documents:
+        document["document_id"] = document["fingerprint"][:16]
+    listing = [
+        {"document_id": document["document_id"], "filename": document["filename"], "format": document["format"]}
+        for document in documents
+    ]
+
+    session_id = str(uuid.uuid4())
+    # The same set of files, under the same names, shares one collection.
+    batch_digest = hashlib.sha256()
+    for fingerprint, filename in sorted((document["fingerprint"], document["filename"]) for document in documents):
+        batch_digest.update(f"{fingerprint}:{filename}\n".encode("utf-8"))
+    fingerprint = batch_digest.hexdigest()
+    collection_name, claimed = await io_pool.run(
+        session_manager.claim_document, fingerprint, f"batch-{fingerprint[:48]}", session_id, priority=INGEST
+    )
+
+    def discard_files():
+        for document in documents:
+            os.remove(document["path"])
+
+    if not claimed:
+        slot.release()
+        discard_files()
+        # The stored listing, without any files that failed when the batch was first ingested.
+        stored = await io_pool.run(session_manager.list_documents, collection_name, priority=INGEST)
+        return await _attach_existing(
+            session_id, collection_name, f"Batch {fingerprint[:12]}", documents=stored, skipped=skipped
         )
-        return StreamingResponse(answer_generator, media_type="text/plain", headers=custom_headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating final answer with LLM: {e}")
 
-@app.post("/export/pdf", tags=["Exporting"])
-async def export_conversation_to_pdf(request: ExportRequest, background_tasks: BackgroundTasks):
-    chat_history = [msg.dict() for msg in request.chat_history]
-    if not chat_history or len(chat_history) <= 1:
-        raise HTTPException(status_code=400, detail="Cannot export an empty conversation.")
     try:
-        markdown_content = await llm_instance.summarize_conversation(chat_history)
-        if "Error:" in markdown_content:
-            raise HTTPException(status_code=500, detail=markdown_content)
+        await _open_collection(session_id, collection_name)
+        await io_pool.run(session_manager.record_documents, collection_name, listing, priority=INGEST)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate summary: {e}")
-    
-    reports_dir = "generated_reports"
-    os.makedirs(reports_dir, exist_ok=True)
-    pdf_filename = f"{uuid.uuid4()}.pdf"
-    pdf_filepath = os.path.join(reports_dir, pdf_filename)
+        slot.release()
+        discard_files()
+        await io_pool.run(session_manager.remove_collection, collection_name, priority=INGEST)
+        raise HTTPException(status_code=500, detail=f"Failed to create a new session: {e}")
+
+    job = await io_pool.run(
+        job_manager.create_job, session_id, collection_name, f"{len(documents)} documents", priority=INGEST
+    )
+    job_manager.start(job, _ingest_batch(job, documents), slot=slot, cleanup=discard_files)
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"{len(documents)} documents accepted for processing.",
+            "session_id": session_id,
+            "job_id": job.job_id,
+            "progress_url": f"/process/{job.job_id}/progress",
+            "documents": listing,
+            "skipped": skipped,
+            "deduplicated": False,
+        },
+    )
+
+@app.get("/process/{job_id}", tags=["Document Processing"])
+async def get_processing_status(job_id: str):
+    job = await io_pool.run(job_manager.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+@app.get("/process/{job_id}/progress", tags=["Document Processing"])
+async def stream_processing_progress(job_id: str, format: str = "ndjson"):
+    """Streams job snapshots as NDJSON (default) or server-sent events until the job finishes."""
+    job = await io_pool.run(job_manager.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    use_sse = format == "sse"
+
+    async def progress_events(job):
+        last_sent = None
+        while True:
+            snapshot = job.to_dict()
+            # The ETA drifts on every poll; only emit when real progress was made.
+            progress = {key: value for key, value in snapshot.items() if key != "eta_seconds"}
+            if progress != last_sent:
+                last_sent = progress
+                payload = json.dumps(snapshot)
+                yield f"data: {payload}\n\n" if use_sse else f"{payload}\n"
+            if job.is_finished:
+                return
+            await asyncio.sleep(0.5)
+            # The job may be running in another worker; re-read its latest snapshot.
+            job = await io_pool.run(job_manager.get_job, job_id) or job
+
+    media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+    return StreamingResponse(progress_events(job), media_type=media_type)
+
+def _stream_response(stream, media_type: str, headers: dict, http_request: Request) -> StreamingResponse:
+    """Streams a response, gzipped when the client accepts it."""
+    if accepts_gzip(http_request.headers.get("accept-encoding")):
+        headers = {**headers, "Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        stream = gzip_stream(stream)
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
+
+@app.post("/query/", tags=["Question Answering"], dependencies=[Depends(providers_ready)])
+async def query_document(request: QueryRequest, http_request: Request, format: str = "text"):
+    """
+    Answers a question about the session's documents. In a batch session,
+    `documents` limits the search to those document IDs.
+
+    `format=text` (the default) streams the plain answer, with sources in the
+    X-Source-Chunks header. `format=ndjson` and `format=sse` stream typed
+    events instead: 'sources', then 'token' and 'suggestion' as the answer is
+    generated, and finally 'usage' with token counts and timings.
+    """
+    if format not in ("text", "ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"Unsupported response format: {format}")
+    started_at = time.perf_counter()
+    session_id = request.session_id
+    question = request.question
+
+    # Registry and index calls can block on SQLite or the store; queries get priority on the I/O pool.
+    collection_name = await io_pool.run(session_manager.get_collection, session_id)
+    if collection_name is None:
+        raise HTTPException(status_code=404, detail="Session not found or has expired.")
+    if request.chat_history is not None:
+        chat_history, summary = [msg.dict() for msg in request.chat_history], ""
+    else:
+        conversation = await io_pool.run(conversation_store.get_state, session_id)
+        chat_history, summary = conversation.recent, conversation.summary
+    # Sessions stay alive as long as they are being used.
+    await io_pool.run(session_manager.touch, session_id)
+    index_partial = await io_pool.run(job_manager.is_partial, collection_name)
+    # A document another worker is still ingesting has to be re-read from the store.
+    complete = not index_partial or job_manager.is_local(collection_name)
+    await io_pool.run(lexical_index_registry.refresh, collection_name, complete=complete, priority=QUERY)
 
     try:
-        pdf = MarkdownPdf(toc_level=2)
-        pdf.add_section(Section(markdown_content, toc=True))
-        pdf.save(pdf_filepath)
-        background_tasks.add_task(os.remove, pdf_filepath)
-        return FileResponse(
-            path=pdf_filepath, filename="DocuMentor_Summary.pdf", media_type='application/pdf'
+        with metrics.stage("retrieval"):
+            # Follow-ups picked from the previous answer's suggestions were usually retrieved while it streamed.
+            speculative = not index_partial and not request.documents
+            retrieval = await prefetcher.take(session_id, collection_name, question) if speculative else None
+            prefetched = retrieval is not None
+            if retrieval is None:
+                retrieval = await retriever_instance.retrieve(collection_name, question, documents=request.documents)
+        context_chunks = retrieval.texts
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Session not found or query error: {e}")
+    retrieval_seconds = time.perf_counter() - started_at
+
+    # Shared documents see the same questions over and over; replay those answers.
+    # Follow-ups depend on what came before, so answers are only shared within the same conversation state.
+    conversation = conversation_fingerprint(chat_history, summary)
+    cached_answer = answer_cache.get(
+        collection_name, question, retrieval.chunk_ids, retrieval.query_embedding, conversation
+    )
+    if cached_answer:
+        context_chunks = cached_answer.sources
+        answer_generator, usage = answer_cache.replay(cached_answer), None
+    else:
+        # Fit retrieved chunks and history into the prompt budget before generating.
+        with metrics.stage("context_build"):
+            prompt_context = context_builder.build(question, context_chunks, chat_history, summary)
+        usage = prompt_context.usage
+        llm_tokens.inc(usage["total_tokens"], kind="prompt")
+        try:
+            answer_generator = llm_instance.generate_answer_stream(
+                question=question,
+                prompt_context=prompt_context
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error generating final answer with LLM: {e}")
+        answer_generator = metrics.timed_stream(
+            answer_generator, "llm_first_token", "llm_generate",
+            on_piece=lambda piece: llm_tokens.inc(estimate_tokens(piece), kind="output"),
+        )
+        # Partial indexes change under us, so only complete ones are cached.
+        if not index_partial:
+            answer_generator = answer_cache.record(
+                answer_generator, collection_name, question, retrieval.chunk_ids, context_chunks,
+                retrieval.query_embedding, conversation,
+            )
+    if speculative:
+        answer_generator = prefetcher.record(answer_generator, session_id, collection_name)
+    # Remember the turn once it has been streamed, for the next question and for exports.
+    answer_generator = conversation_store.record(answer_generator, session_id, question, llm_instance.update_summary)
+
+    if format != "text":
+        # Everything travels in the body, where it streams and compresses like the answer.
+        sources = source_event(
+            retrieval.hits,
+            retrieval_mode=retrieval.mode,
+            index_partial=index_partial,
+            answer_cache="hit" if cached_answer else "miss",
+            prefetch="hit" if prefetched else "miss",
         )
+        use_sse = format == "sse"
+        events = answer_events(answer_generator, sources, usage, started_at, retrieval_seconds, use_sse)
+        media_type = "text/event-stream" if use_sse else "application/x-ndjson"
+        return _stream_response(events, media_type, {"Cache-Control": "no-cache"}, http_request)
+
+    sources_json = json.dumps(context_chunks)
+    sources_b64 = base64.b64encode(sources_json.encode('utf-8')).decode('utf-8')
+    custom_headers = {
+        "X-Source-Chunks": sources_b64,
+        # Answers may be incomplete while the document is still being ingested.
+        "X-Index-Partial": "true" if index_partial else "false",
+        "X-Retrieval-Mode": retrieval.mode,
+        "X-Answer-Cache": "hit" if cached_answer else "miss",
+        "X-Retrieval-Prefetch": "hit" if prefetched else "miss",
+    }
+    if usage is not None:
+        custom_headers["X-Prompt-Usage"] = json.dumps(usage)
+    return _stream_response(answer_generator, "text/plain", custom_headers, http_request)
+
+@app.get("/cache/stats", tags=["Health Check"])
+def cache_stats():
+    return {
+        "embedding_cache": embedder_instance.cache.stats() if embedder_instance.cache else None,
+        "answer_cache": answer_cache.stats(),
+        "prefetch": prefetcher.stats(),
+    }
+
+# Gauges and cache counters are read from existing state on each scrape, so request paths pay nothing for them.
+def _cache_lookups():
+    samples = {}
+    # Don't build the embedder just to report that its cache is empty.
+    if provider_registry.is_ready("embedder") and embedder_instance.cache is not None:
+        samples[("embedding", "hit")] = embedder_instance.cache.hits
+        samples[("embedding", "miss")] = embedder_instance.cache.misses
+    samples[("answer", "hit")] = answer_cache.exact_hits
+    samples[("answer", "semantic_hit")] = answer_cache.semantic_hits
+    samples[("answer", "miss")] = answer_cache.misses
+    samples[("prefetch", "hit")] = prefetcher.hits
+    samples[("prefetch", "miss")] = prefetcher.misses
+    return samples
+
+metrics.counter("cache_lookups_total", "Cache lookups, by cache and result.", ("cache", "result"), callback=_cache_lookups)
+metrics.gauge("active_sessions", "Sessions that have not expired.", callback=lambda: session_manager.stats()["active_sessions"])
+metrics.gauge("collections", "Stored collections, by status.", ("status",),
+              callback=lambda: {(status,): count for status, count in session_manager.stats()["collections"].items()})
+metrics.gauge("collection_bytes", "Estimated size of stored collections, by status.", ("status",),
+              callback=lambda: {(status,): size for status, size in session_manager.stats()["collection_bytes"].items()})
+metrics.gauge("ingestions_admitted", "Ingestions running or queued in this process.",
+              callback=lambda: ingestion_admission.stats()["reserved"])
+metrics.gauge("io_pool_queued", "Blocking calls waiting for an I/O thread.", callback=lambda: io_pool.stats()["queued"])
+metrics.gauge("resident_collection_bytes", "Estimated size of the collections loaded in this process.",
+              callback=lambda: session_manager.stats()["resident_bytes"])
+
+@app.get("/metrics", tags=["Health Check"])
+def prometheus_metrics():
+    """Pipeline latencies, counters and gauges in the Prometheus text format."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+EXPORT_JOB_THRESHOLD = int(os.getenv("EXPORT_JOB_THRESHOLD", "40"))
+PDF_HEADERS = {"Content-Disposition": 'attachment; filename="DocuMentor_Summary.pdf"'}
+
+@app.post("/export/pdf", tags=["Exporting"], dependencies=[Depends(providers_ready)])
+async def export_conversation_to_pdf(request: ExportRequest, mode: str = "sync"):
+    """
+    Exports a conversation as a PDF report. `mode=sync` returns the PDF,
+    `mode=job` starts a background export and returns its job ID right away,
+    and `mode=auto` picks a job for conversations longer than EXPORT_JOB_THRESHOLD messages.
+    """
+    if mode not in ("sync", "job", "auto"):
+        raise HTTPException(status_code=400, detail="mode must be 'sync', 'job' or 'auto'.")
+    if request.chat_history is not None:
+        chat_history = [msg.dict() for msg in request.chat_history]
+    elif request.session_id and await io_pool.run(session_manager.get_collection, request.session_id):
+        # The report covers the whole transcript, not just the window prompts see.
+        chat_history = await io_pool.run(conversation_store.messages, request.session_id)
+    else:
+        raise HTTPException(status_code=404, detail="Session not found or has expired.")
+    if len(chat_history) <= 1:
+        raise HTTPException(status_code=400, detail="Cannot export an empty conversation.")
+
+    if mode == "job" or (mode == "auto" and len(chat_history) > EXPORT_JOB_THRESHOLD):
+        job_id = await export_service.start_job(chat_history)
+        return JSONResponse(status_code=202, content={
+            "job_id": job_id,
+            "status_url": f"/export/jobs/{job_id}",
+            "download_url": f"/export/jobs/{job_id}/pdf",
+        })
+    try:
+        pdf = await export_service.export(chat_history)
     except Exception as e:
-        print(f"!!! PDF GENERATION FAILED !!!: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to convert Markdown to PDF: {str(e)}")
\ No newline at end of file
+        print(f"!!! PDF EXPORT FAILED !!!: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to export the conversation: {e}")
+    return Response(content=pdf, media_type="application/pdf", headers=PDF_HEADERS)
+
+@app.get("/export/jobs/{job_id}", tags=["Exporting"])
+async def get_export_job(job_id: str):
+    status = await asyncio.to_thread(export_service.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Export job not found.")
+    return status
+
+@app.get("/export/jobs/{job_id}/pdf", tags=["Exporting"])
+async def download_export(job_id: str):
+    pdf = await asyncio.to_thread(export_service.cached_pdf, job_id)
+    if pdf is not None:
+        return Response(content=pdf, media_type="application/pdf", headers=PDF_HEADERS)
+    status = await asyncio.to_thread(export_service.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Export job not found.")
+    raise HTTPException(status_code=409, detail=f"Export is {status['status']}, not ready.")
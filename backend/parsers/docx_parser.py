@@ -1,37 +1,167 @@
 # backend/parsers/docx_parser.py
 
-import io
-import docx
-from fastapi import UploadFile
+import os
+import re
+import zipfile
+from queue import Empty, Full
+from typing import IO, Iterator
+from lxml import etree
 
-def parse_docx(file: UploadFile) -> str:
+from backend.core.executors import CPU_WORKERS, cpu_executor, cpu_manager
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_P, _TR, _TC, _TBL = f"{_W}p", f"{_W}tr", f"{_W}tc", f"{_W}tbl"
+_T, _TAB, _BR, _CR = f"{_W}t", f"{_W}tab", f"{_W}br", f"{_W}cr"
+
+# The main text first, then the parts python-docx's `paragraphs` never read.
+_EXTRA_PARTS = re.compile(r"^word/(footnotes|endnotes|header\d*|footer\d*)\.xml$")
+PARAGRAPHS_PER_BATCH = int(os.getenv("DOCX_PARAGRAPHS_PER_BATCH", "256"))
+# Smaller files are parsed in the calling thread; a worker isn't worth starting for them.
+POOL_MIN_BYTES = int(os.getenv("DOCX_POOL_MIN_BYTES", str(1024 * 1024)))
+
+def _paragraph_text(paragraph) -> str:
+    pieces = []
+    for node in paragraph.iter(_T, _TAB, _BR, _CR):
+        if node.tag == _T:
+            pieces.append(node.text or "")
+        elif node.tag == _TAB:
+            pieces.append("\t")
+        else:
+            pieces.append("\n")
+    return "".join(pieces).strip()
+
+def _in_table(element) -> bool:
+    parent = element.getparent()
+    while parent is not None:
+        if parent.tag == _TC:
+            return True
+        parent = parent.getparent()
+    return False
+
+def _release(element):
+    """Frees a processed element and the already processed siblings before it."""
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+def _iter_part(stream: IO[bytes]) -> Iterator[str]:
+    """Yields the paragraphs and table rows of one WordprocessingML part, in document order."""
+    # Entity expansion and network access stay off: the XML comes from an untrusted upload.
+    events = etree.iterparse(stream, events=("end",), tag=(_P, _TR, _TBL), resolve_entities=False, no_network=True)
+    for _, element in events:
+        if element.tag == _P:
+            # Paragraphs in table cells are read with their row.
+            if _in_table(element):
+                continue
+            text = _paragraph_text(element)
+            _release(element)
+        elif element.tag == _TR:
+            # A nested table's rows are read as part of the cell that holds them.
+            if _in_table(element):
+                continue
+            cells = []
+            for cell in element.iterchildren(_TC):
+                cells.append(" ".join(filter(None, (_paragraph_text(p) for p in cell.iter(_P)))))
+            text = " | ".join(cells) if any(cells) else ""
+            _release(element)
+        else:
+            if not _in_table(element):
+                _release(element)
+            continue
+        if text:
+            yield text
+
+def iter_docx_paragraphs(source: str | IO[bytes]) -> Iterator[str]:
     """
-    Extracts text content from an uploaded DOCX file.
+    Streams the text of a DOCX file without loading it or building an object model.
+
+    `word/document.xml` is read straight out of the zip with lxml's iterparse,
+    and each paragraph or table row is yielded (cells joined with " | ") as
+    soon as it ends, then dropped. Footnotes, endnotes, headers and footers
+    follow the main text. Memory stays around the size of one paragraph
+    however large the file is.
 
     Args:
-        file: The uploaded DOCX file object from FastAPI.
+        source: A path or a seekable binary file object.
 
-    Returns:
-        A string containing all the extracted text from the DOCX.
+    Yields:
+        Non-empty paragraph and table row texts.
     """
     try:
-        # Read the file content into an in-memory buffer
-        file_content = file.file.read()
-        file_stream = io.BytesIO(file_content)
-
-        # Open the DOCX document
-        document = docx.Document(file_stream)
-        
-        # Extract text from each paragraph
-        all_text = []
-        for para in document.paragraphs:
-            if para.text:
-                all_text.append(para.text)
-        
-        # Join all paragraphs' text into a single string
-        return "\n".join(all_text)
-
-    except Exception as e:
-        # Handle potential errors, e.g., corrupted file, not a DOCX
-        print(f"Error parsing DOCX: {e}")
-        return f"Error: Could not parse the DOCX file. Reason: {e}"
\ No newline at end of file
+        with zipfile.ZipFile(source) as archive:
+            names = archive.namelist()
+            parts = ["word/document.xml"] + sorted(name for name in names if _EXTRA_PARTS.match(name))
+            for part in parts:
+                with archive.open(part) as stream:
+                    yield from _iter_part(stream)
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+        raise ValueError(f"Could not parse the DOCX file. Reason: {e}") from e
+
+def _put(queue, stop, item) -> bool:
+    """Puts an item on a bounded queue unless the reader has gone away."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=1.0)
+            return True
+        except Full:
+            continue
+    return False
+
+def _parse_into(path: str, queue, stop, batch_size: int):
+    """Parses a DOCX and puts lists of paragraphs on `queue`, then None. Runs inside a worker process."""
+    try:
+        batch = []
+        for text in iter_docx_paragraphs(path):
+            batch.append(text)
+            if len(batch) >= batch_size:
+                if not _put(queue, stop, batch):
+                    return
+                batch = []
+        if batch:
+            _put(queue, stop, batch)
+    finally:
+        # An error reaches the reader through the future.
+        _put(queue, stop, None)
+
+def iter_docx_segments(path: str) -> Iterator[tuple[int, str]]:
+    """
+    (paragraph number, text) pairs for the chunker, numbered from 1.
+
+    Large files are parsed in the CPU process pool, so the iterparse loop
+    doesn't hold this process's GIL, and the paragraphs stream back in
+    batches of PARAGRAPHS_PER_BATCH. At most CPU_WORKERS * 2 batches are in
+    flight, so memory stays flat on huge files.
+    """
+    if CPU_WORKERS <= 1 or os.path.getsize(path) < POOL_MIN_BYTES:
+        yield from enumerate(iter_docx_paragraphs(path), start=1)
+        return
+
+    manager = cpu_manager()
+    queue, stop = manager.Queue(maxsize=CPU_WORKERS * 2), manager.Event()
+    future = cpu_executor().submit(_parse_into, path, queue, stop, PARAGRAPHS_PER_BATCH)
+    number = 0
+    try:
+        while True:
+            try:
+                batch = queue.get(timeout=1.0)
+            except Empty:
+                if not future.done():
+                    continue
+                # The worker has returned, so anything it put is already on the queue.
+                future.result()
+                try:
+                    batch = queue.get_nowait()
+                except Empty:
+                    raise ValueError("Could not parse the DOCX file. Reason: the parser stopped unexpectedly.")
+            if batch is None:
+                break
+            for text in batch:
+                number += 1
+                yield number, text
+        future.result()
+    finally:
+        # Lets a worker blocked on a full queue give up when the reader stops early.
+        stop.set()
+        future.cancel()
@@ -1,25 +1,87 @@
 # backend/parsers/txt_parser.py
 
-from fastapi import UploadFile
+import codecs
+import re
+from typing import IO, Iterator
 
-def parse_txt(file: UploadFile) -> str:
-    """
-    Reads and decodes text from an uploaded TXT file.
+BLOCK_SIZE = 1024 * 1024
+# Enough text for charset detection to be reliable, without reading the whole file.
+SAMPLE_SIZE = 64 * 1024
+# A "paragraph" longer than this is cut at a line break (or anywhere, failing that).
+MAX_PARAGRAPH = 256 * 1024
 
-    Args:
-        file: The uploaded TXT file object from FastAPI.
+_BLANK_LINE = re.compile(r"\n[ \t]*\n\s*")
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
 
-    Returns:
-        A string containing the content of the text file.
+def detect_encoding(sample: bytes, complete: bool) -> str:
+    """
+    Picks the encoding of a text file from its first bytes: a BOM if there
+    is one, then UTF-8 if the sample is valid UTF-8, then charset-normalizer's
+    best guess. `complete` says whether the sample is the whole file (if not,
+    it may end in the middle of a character).
     """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
     try:
-        # Read the file content as bytes
-        file_content = file.file.read()
-        
-        # Decode the bytes into a string (UTF-8 is a safe default)
-        return file_content.decode('utf-8')
-
-    except Exception as e:
-        # Handle potential errors, e.g., decoding errors
-        print(f"Error parsing TXT: {e}")
-        return f"Error: Could not parse the TXT file. Reason: {e}"
\ No newline at end of file
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    from charset_normalizer import from_bytes
+    matches = from_bytes(sample)
+    best = matches.best()
+    if best is None:
+        return "utf-8"
+    # Single-byte Western text often fits several code pages equally well; cp1252 is by far the most common.
+    for match in matches:
+        if match.encoding == "cp1252" and match.chaos <= best.chaos:
+            return "cp1252"
+    return best.encoding
+
+def iter_text(stream: IO[bytes], block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Decodes a binary stream block by block, in the detected encoding. Undecodable bytes become U+FFFD."""
+    sample = stream.read(SAMPLE_SIZE)
+    block = stream.read(block_size)
+    encoding = detect_encoding(sample, complete=not block)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    yield decoder.decode(sample, final=not block)
+    while block:
+        following = stream.read(block_size)
+        yield decoder.decode(block, final=not following)
+        block = following
+
+def iter_txt_paragraphs(stream: IO[bytes]) -> Iterator[str]:
+    """
+    Streams the paragraphs (separated by blank lines) of a text file.
+
+    Only one block and the paragraph in progress are held in memory. Line
+    endings are normalized to "\\n".
+    """
+    pending = carry = ""
+    for text in iter_text(stream):
+        text = carry + text
+        # A "\r" at the end of a block may be the first half of a "\r\n".
+        carry = "\r" if text.endswith("\r") else ""
+        pending += text[:len(text) - len(carry)].replace("\r\n", "\n").replace("\r", "\n")
+        paragraphs = _BLANK_LINE.split(pending)
+        pending = paragraphs.pop()
+        yield from (paragraph.strip() for paragraph in paragraphs if paragraph.strip())
+        while len(pending) > MAX_PARAGRAPH:
+            cut = pending.rfind("\n", 0, MAX_PARAGRAPH) + 1 or MAX_PARAGRAPH
+            if pending[:cut].strip():
+                yield pending[:cut].strip()
+            pending = pending[cut:]
+    if pending.strip():
+        yield pending.strip()
+
+def iter_txt_segments(path: str) -> Iterator[tuple[int, str]]:
+    """(paragraph number, text) pairs for the chunker, numbered from 1."""
+    with open(path, "rb") as stream:
+        yield from enumerate(iter_txt_paragraphs(stream), start=1)
@@ -0,0 +1,32 @@
+# backend/vector_store/__init__.py
+
+import os
+
+from backend.core.providers import provider_registry
+
+from .base import VectorStore
+
+def create_vector_store(backend: str | None = None) -> VectorStore:
+    """
+    Builds the vector store selected by VECTOR_STORE_BACKEND ('chroma' or 'numpy').
+    Backends are imported on demand so unused ones cost nothing at startup.
+    """
+    backend = backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    if backend == "numpy":
+        from .numpy_store import NumpyStore
+        return NumpyStore(
+            path=os.getenv("NUMPY_STORE_PATH", "./vector_index"),
+            dtype=os.getenv("NUMPY_STORE_DTYPE", "float32"),
+            multiprocess=os.getenv("NUMPY_STORE_MULTIPROCESS", "0") == "1",
+        )
+    if backend == "chroma":
+        from .chroma import ChromaStore
+        return ChromaStore(
+            path=os.getenv("CHROMA_PATH", "./chroma_db"),
+            memory_limit_bytes=int(os.getenv("CHROMA_MEMORY_LIMIT_MB", "0")) * 2**20 or None,
+            host=os.getenv("CHROMA_HOST") or None,
+            port=int(os.getenv("CHROMA_PORT", "8000")),
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+vector_store_instance = provider_registry.register("vector_store", create_vector_store)
@@ -0,0 +1,71 @@
+# backend/vector_store/base.py
+
+from typing import Protocol
+
+class VectorStore(Protocol):
+    """
+    The interface every vector store backend implements.
+
+    Collections are addressed by name. Search hits are dicts with the keys
+    'id', 'text', 'metadata' and 'score' (cosine similarity, higher is better).
+    `collection_size` is the approximate storage footprint in bytes, and
+    `release` drops any in-memory state for a collection without deleting it.
+    `where` narrows a search to chunks whose metadata matches a Chroma-style
+    filter, e.g. {"document_id": {"$in": ["a", "b"]}}. With `include_embeddings`,
+    each hit also carries its stored vector under 'embedding'.
+    `delete_documents` removes every chunk matching such a filter.
+    """
+
+    def create_collection(self, name: str | None = None, overwrite: bool = False) -> str: ...
+
+    def delete_collection(self, collection_name: str): ...
+
+    def list_collections(self) -> list[str]: ...
+
+    def collection_size(self, collection_name: str) -> int: ...
+
+    def release(self, collection_name: str): ...
+
+    def add_documents(self, collection_name: str, chunks: list[str], embeddings: list[list[float]], metadatas: list[dict], ids: list[str] | None = None) -> list[str]: ...
+
+    def delete_documents(self, collection_name: str, where: dict): ...
+
+    def get_documents(self, collection_name: str) -> list[dict]: ...
+
+    def get_embeddings(self, collection_name: str, ids: list[str]) -> dict[str, list[float]]: ...
+
+    def search(self, collection_name: str, query_embedding: list[float], n_results: int = 5, where: dict | None = None, include_embeddings: bool = False) -> list[dict]: ...
+
+def matches_where(metadata: dict, where: dict | None) -> bool:
+    """
+    Evaluates a Chroma-style metadata filter in Python, for the backends
+    that filter themselves. Supports field equality, $eq, $ne, $in and $nin,
+    combined with $and and $or.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    ok = value == operand
+                elif operator == "$ne":
+                    ok = value != operand
+                elif operator == "$in":
+                    ok = value in operand
+                elif operator == "$nin":
+                    ok = value not in operand
+                else:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not ok:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
@@ -1,39 +1,123 @@
 # backend/vector_store/chroma.py
 
 import chromadb
+from chromadb.config import Settings
 import uuid
 
 class ChromaStore:
-    def __init__(self, path: str = "./chroma_db"):
+    def __init__(self, path: str = "./chroma_db", memory_limit_bytes: int | None = None, host: str | None = None, port: int = 8000):
+        """
+        A ChromaDB store. With `memory_limit_bytes`, Chroma keeps loaded
+        collection segments in an LRU cache bounded to that size.
+
+        The embedded client is only safe in a single process. When several
+        workers share the data, run a Chroma server and pass its `host`: every
+        worker then talks to it over HTTP instead of opening `path` directly.
+        """
         print("Initializing ChromaDB Client...")
-        self.client = chromadb.PersistentClient(path=path)
+        if host:
+            self.client = chromadb.HttpClient(host=host, port=port)
+            print(f"ChromaDB Client connected to {host}:{port}.")
+            return
+        settings = Settings()
+        if memory_limit_bytes:
+            settings = Settings(chroma_segment_cache_policy="LRU", chroma_memory_limit_bytes=memory_limit_bytes)
+        self.client = chromadb.PersistentClient(path=path, settings=settings)
         print("ChromaDB Client initialized.")
 
-    def create_collection(self) -> str:
-        """Creates a new unique collection and returns its name (session ID)."""
-        session_id = str(uuid.uuid4())
-        self.client.get_or_create_collection(name=session_id)
-        print(f"Created new collection with name: {session_id}")
-        return session_id
+    def create_collection(self, name: str | None = None, overwrite: bool = False) -> str:
+        """
+        Creates a collection (a new unique one if no name is given) and returns its name.
+        With `overwrite`, any existing collection of the same name is dropped first.
+        """
+        name = name or str(uuid.uuid4())
+        if overwrite:
+            try:
+                self.client.delete_collection(name=name)
+                print(f"Dropped stale collection: {name}")
+            except Exception:
+                pass
+        # Cosine distance, so search scores are comparable across backends.
+        self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+        print(f"Created new collection with name: {name}")
+        return name
 
     def delete_collection(self, collection_name: str):
         """Deletes a collection by its name."""
         self.client.delete_collection(name=collection_name)
         print(f"Deleted collection: {collection_name}")
 
-    def add_documents(self, collection_name: str, chunks: list[str], embeddings: list[list[float]], metadatas: list[dict]):
-        """Adds documents to a specific named collection."""
+    def list_collections(self) -> list[str]:
+        """Returns the names of every collection in the database."""
+        # Newer chromadb returns names, older versions return Collection objects.
+        return [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+
+    def collection_size(self, collection_name: str) -> int:
+        """Estimates a collection's storage footprint from a sample of its rows."""
+        collection = self.client.get_collection(name=collection_name)
+        count = collection.count()
+        if count == 0:
+            return 0
+        sample = collection.peek(limit=min(count, 20))
+        sample_bytes = sum(len(text or "") for text in sample['documents'])
+        sample_bytes += sum(4 * len(vector) for vector in sample['embeddings'])
+        return sample_bytes * count // len(sample['ids'])
+
+    def release(self, collection_name: str):
+        """Chroma manages its own segment cache, so there is nothing to drop here."""
+
+    def add_documents(self, collection_name: str, chunks: list[str], embeddings: list[list[float]], metadatas: list[dict], ids: list[str] | None = None) -> list[str]:
+        """Adds documents to a specific named collection and returns their IDs."""
         if not chunks:
-            return
+            return []
         collection = self.client.get_collection(name=collection_name)
-        ids = [str(uuid.uuid4()) for _ in chunks]
+        ids = ids or [str(uuid.uuid4()) for _ in chunks]
         collection.add(embeddings=embeddings, documents=chunks, metadatas=metadatas, ids=ids)
         print(f"Added {len(chunks)} documents to collection '{collection_name}'.")
+        return ids
+
+    def delete_documents(self, collection_name: str, where: dict):
+        """Deletes every chunk in a collection whose metadata matches `where`."""
+        if not where:
+            raise ValueError("Refusing to delete without a filter; use delete_collection instead.")
+        collection = self.client.get_collection(name=collection_name)
+        collection.delete(where=where)
+        print(f"Deleted chunks matching {where} from collection '{collection_name}'.")
 
-    def query(self, collection_name: str, query_embedding: list[float], n_results: int = 5) -> list[str]:
-        """Queries a specific named collection."""
+    def get_documents(self, collection_name: str) -> list[dict]:
+        """Returns every stored chunk (without embeddings) in a collection."""
         collection = self.client.get_collection(name=collection_name)
-        results = collection.query(query_embeddings=[query_embedding], n_results=n_results)
-        return results['documents'][0]
+        results = collection.get(include=["documents", "metadatas"])
+        return [
+            {"id": chunk_id, "text": text, "metadata": metadata or {}}
+            for chunk_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        ]
 
-vector_store_instance = ChromaStore()
\ No newline at end of file
+    def get_embeddings(self, collection_name: str, ids: list[str]) -> dict[str, list[float]]:
+        """Returns the stored vectors of the given chunks, by ID. Unknown IDs are left out."""
+        if not ids:
+            return {}
+        collection = self.client.get_collection(name=collection_name)
+        results = collection.get(ids=list(ids), include=["embeddings"])
+        return dict(zip(results['ids'], results['embeddings']))
+
+    def search(self, collection_name: str, query_embedding: list[float], n_results: int = 5, where: dict | None = None, include_embeddings: bool = False) -> list[dict]:
+        """
+        Queries a specific named collection and returns hits with their similarity scores.
+        `where` is passed to Chroma as a metadata filter.
+        """
+        collection = self.client.get_collection(name=collection_name)
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        results = collection.query(
+            query_embeddings=[query_embedding], n_results=n_results, where=where or None, include=include,
+        )
+        hits = [
+            {"id": chunk_id, "text": text, "metadata": metadata or {}, "score": 1.0 - distance}
+            for chunk_id, text, metadata, distance in zip(
+                results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0]
+            )
+        ]
+        if include_embeddings:
+            for hit, embedding in zip(hits, results['embeddings'][0]):
+                hit["embedding"] = embedding
+        return hits
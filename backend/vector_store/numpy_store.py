@@ -0,0 +1,369 @@
+# backend/vector_store/numpy_store.py
+
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import nullcontext
+from itertools import islice
+import numpy as np
+from filelock import FileLock
+
+from .base import matches_where
+
+_VALID_NAME = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+class _Collection:
+    """One collection's vectors and records, loaded lazily from disk."""
+
+    def __init__(self, vectors: np.ndarray | None, scales: np.ndarray | None, records: list[dict], signature=None):
+        self.signature = signature
+        self.vectors = vectors
+        self.scales = scales
+        self.ids = [record["id"] for record in records]
+        self.texts = [record["text"] for record in records]
+        self.metadatas = [record["metadata"] for record in records]
+        # id -> row, built on the first lookup by ID.
+        self.positions: dict[str, int] | None = None
+
+class NumpyStore:
+    def __init__(self, path: str = "./vector_index", dtype: str = "float32", multiprocess: bool = False):
+        """
+        An in-process vector store backed by one contiguous matrix per collection.
+
+        Vectors are L2-normalized on insert, so a dot product is the cosine
+        similarity, and stored as float32, float16 or int8 (with a per-row
+        scale). Matrices are persisted as .npy files and memory-mapped on first
+        access, so restarts only page in what queries actually touch. New
+        batches are appended to those files in place, so ingesting a document
+        writes each vector once rather than the whole matrix per batch.
+
+        With `multiprocess`, several worker processes can share `path`: writes
+        are serialized by a file lock, and a collection another process has
+        changed is reloaded from disk before it is read.
+        """
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        print("Initializing NumPy vector store...")
+        self.path = path
+        self.dtype = dtype
+        self._collections: dict[str, _Collection] = {}
+        self.multiprocess = multiprocess
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(path, ".write.lock")) if multiprocess else None
+        print(f"NumPy vector store initialized at {path} ({dtype}).")
+
+    def _dir(self, collection_name: str) -> str:
+        if not _VALID_NAME.match(collection_name):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        return os.path.join(self.path, collection_name)
+
+    def _writing(self):
+        """Serializes writers across processes in multiprocess mode."""
+        return self._file_lock if self._file_lock is not None else nullcontext()
+
+    @staticmethod
+    def _signature(directory: str):
+        # Vectors grow in place or are replaced by rename, so inode, mtime and size identify a version.
+        try:
+            stat = os.stat(os.path.join(directory, "vectors.npy"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self, collection_name: str) -> _Collection:
+        collection = self._collections.get(collection_name)
+        directory = self._dir(collection_name)
+        if collection is not None:
+            if not self.multiprocess:
+                return collection
+            if os.path.isdir(directory) and collection.signature == self._signature(directory):
+                return collection
+            self._collections.pop(collection_name, None)
+        if not os.path.isdir(directory):
+            raise ValueError(f"Collection {collection_name} does not exist.")
+
+        signature = self._signature(directory)
+        vectors_path = os.path.join(directory, "vectors.npy")
+        scales_path = os.path.join(directory, "scales.npy")
+        vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        records = []
+        # Only records with stored vectors count; any beyond that are from a crash or
+        # a write still in progress, and the last one may be incomplete.
+        stored = 0 if vectors is None else vectors.shape[0]
+        records_path = os.path.join(directory, "records.jsonl")
+        if os.path.exists(records_path):
+            with open(records_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in islice(f, stored)]
+        if scales is not None:
+            # Scales are written just before vectors, so they may be ahead by one write.
+            scales = scales[:stored]
+        collection = _Collection(vectors, scales, records, signature)
+        self._collections[collection_name] = collection
+        return collection
+
+    def _quantize(self, embeddings: list[list[float]]) -> tuple[np.ndarray, np.ndarray | None]:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return matrix.astype(self.dtype), None
+
+    @staticmethod
+    def _save_array(path: str, array: np.ndarray):
+        # Write-then-rename so a concurrent reader never maps a half-written file.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _append_array(path: str, rows: np.ndarray, at: int):
+        """
+        Writes `rows` into the .npy file at `path` from row `at` on and grows its
+        shape to match. Only the new rows and the header are written; rows past
+        `at` left over from an interrupted write are overwritten.
+        """
+        if not os.path.exists(path):
+            NumpyStore._save_array(path, rows)
+            return
+        with open(path, "r+b") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                header_length = f.tell()
+                header = io.BytesIO()
+                np.lib.format.write_array_header_1_0(header, {
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                    "fortran_order": False,
+                    "shape": (at + rows.shape[0], *rows.shape[1:]),
+                })
+                # NumPy pads headers so the first axis can grow without moving the data.
+                if (
+                    dtype == rows.dtype and not fortran_order and shape[1:] == rows.shape[1:]
+                    and at <= shape[0] and header.tell() == header_length
+                ):
+                    # Rows first, header last: until the header is rewritten, readers see the old shape.
+                    f.seek(header_length + at * rows[:1].nbytes)
+                    f.write(np.ascontiguousarray(rows).tobytes())
+                    f.flush()
+                    f.seek(0)
+                    f.write(header.getvalue())
+                    return
+        # Not a file this store can grow in place (e.g. written with another dtype).
+        NumpyStore._save_array(path, np.concatenate([np.load(path, mmap_mode="r")[:at], rows]))
+
+    @staticmethod
+    def _save_rows(path: str, array: np.ndarray, rows: list[int]):
+        """Writes the given rows of `array` to a new .npy file at `path`, a block at a time."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(array.dtype),
+                "fortran_order": False,
+                "shape": (len(rows), *array.shape[1:]),
+            })
+            for start in range(0, len(rows), 4096):
+                f.write(np.ascontiguousarray(array[rows[start:start + 4096]]).tobytes())
+        os.replace(tmp_path, path)
+
+    def create_collection(self, name: str | None = None, overwrite: bool = False) -> str:
+        """
+        Creates a collection (a new unique one if no name is given) and returns its name.
+        With `overwrite`, any existing collection of the same name is dropped first.
+        """
+        name = name or str(uuid.uuid4())
+        directory = self._dir(name)
+        with self._lock, self._writing():
+            if overwrite and os.path.isdir(directory):
+                shutil.rmtree(directory)
+                self._collections.pop(name, None)
+                print(f"Dropped stale collection: {name}")
+            os.makedirs(directory, exist_ok=True)
+        print(f"Created new collection with name: {name}")
+        return name
+
+    def delete_collection(self, collection_name: str):
+        """Deletes a collection by its name."""
+        directory = self._dir(collection_name)
+        with self._lock, self._writing():
+            self._collections.pop(collection_name, None)
+            if not os.path.isdir(directory):
+                raise ValueError(f"Collection {collection_name} does not exist.")
+            shutil.rmtree(directory)
+        print(f"Deleted collection: {collection_name}")
+
+    def list_collections(self) -> list[str]:
+        """Returns the names of every collection on disk."""
+        return sorted(
+            name for name in os.listdir(self.path)
+            if _VALID_NAME.match(name) and os.path.isdir(os.path.join(self.path, name))
+        )
+
+    def collection_size(self, collection_name: str) -> int:
+        """Returns the bytes a collection occupies on disk."""
+        directory = self._dir(collection_name)
+        if not os.path.isdir(directory):
+            raise ValueError(f"Collection {collection_name} does not exist.")
+        return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def release(self, collection_name: str):
+        """Unmaps a collection; it is loaded again on next access."""
+        with self._lock:
+            self._collections.pop(collection_name, None)
+
+    def add_documents(self, collection_name: str, chunks: list[str], embeddings: list[list[float]], metadatas: list[dict], ids: list[str] | None = None) -> list[str]:
+        """Adds documents to a specific named collection and returns their IDs."""
+        if not chunks:
+            return []
+        directory = self._dir(collection_name)
+        vectors, scales = self._quantize(embeddings)
+        ids = ids or [str(uuid.uuid4()) for _ in chunks]
+        records = [
+            {"id": chunk_id, "text": text, "metadata": metadata}
+            for chunk_id, text, metadata in zip(ids, chunks, metadatas)
+        ]
+        vectors_path = os.path.join(directory, "vectors.npy")
+        scales_path = os.path.join(directory, "scales.npy")
+        with self._lock, self._writing():
+            collection = self._load(collection_name)
+            stored = 0 if collection.vectors is None else collection.vectors.shape[0]
+            # Records go first: on load, records beyond the stored vector count are ignored.
+            with open(os.path.join(directory, "records.jsonl"), "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            if scales is not None:
+                self._append_array(scales_path, scales, stored)
+            self._append_array(vectors_path, vectors, stored)
+
+            # Mapping the grown files again is cheap; the rows are paged in as searches touch them.
+            collection.vectors = np.load(vectors_path, mmap_mode="r")
+            if scales is not None:
+                collection.scales = np.load(scales_path, mmap_mode="r")[:collection.vectors.shape[0]]
+            collection.signature = self._signature(directory)
+            collection.ids.extend(record["id"] for record in records)
+            collection.texts.extend(chunks)
+            collection.metadatas.extend(metadatas)
+            if collection.positions is not None:
+                start = len(collection.ids) - len(records)
+                collection.positions.update((record["id"], start + offset) for offset, record in enumerate(records))
+        print(f"Added {len(chunks)} documents to collection '{collection_name}'.")
+        return ids
+
+    def delete_documents(self, collection_name: str, where: dict):
+        """
+        Deletes every chunk in a collection whose metadata matches `where`,
+        rewriting the remaining rows into new files a block at a time. Meant
+        for cleaning up after a failed ingestion, not for frequent use.
+        """
+        if not where:
+            raise ValueError("Refusing to delete without a filter; use delete_collection instead.")
+        directory = self._dir(collection_name)
+        with self._lock, self._writing():
+            collection = self._load(collection_name)
+            count = 0 if collection.vectors is None else collection.vectors.shape[0]
+            keep = [i for i in range(count) if not matches_where(collection.metadatas[i], where)]
+            if len(keep) == count:
+                return
+            records = [
+                {"id": collection.ids[i], "text": collection.texts[i], "metadata": collection.metadatas[i]}
+                for i in keep
+            ]
+            records_path = os.path.join(directory, "records.jsonl")
+            with open(f"{records_path}.tmp", "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(f"{records_path}.tmp", records_path)
+            vectors_path = os.path.join(directory, "vectors.npy")
+            scales_path = os.path.join(directory, "scales.npy")
+            if collection.scales is not None:
+                self._save_rows(scales_path, collection.scales, keep)
+            self._save_rows(vectors_path, collection.vectors, keep)
+            vectors = np.load(vectors_path, mmap_mode="r")
+            scales = None if collection.scales is None else np.load(scales_path, mmap_mode="r")
+            self._collections[collection_name] = _Collection(vectors, scales, records, self._signature(directory))
+        print(f"Deleted {count - len(keep)} chunks matching {where} from collection '{collection_name}'.")
+
+    def get_documents(self, collection_name: str) -> list[dict]:
+        """Returns every stored chunk (without embeddings) in a collection."""
+        with self._lock:
+            collection = self._load(collection_name)
+            return [
+                {"id": chunk_id, "text": text, "metadata": metadata}
+                for chunk_id, text, metadata in zip(collection.ids, collection.texts, collection.metadatas)
+            ]
+
+    def _vector(self, vectors: np.ndarray, index: int) -> list[float]:
+        # Rows are unit length (int8 rows up to their scale, which doesn't change the direction).
+        row = np.asarray(vectors[index], dtype=np.float32)
+        return (row / (np.linalg.norm(row) or 1.0)).tolist()
+
+    def get_embeddings(self, collection_name: str, ids: list[str]) -> dict[str, list[float]]:
+        """Returns the stored (normalized) vectors of the given chunks, by ID. Unknown IDs are left out."""
+        with self._lock:
+            collection = self._load(collection_name)
+            if collection.positions is None:
+                collection.positions = {chunk_id: index for index, chunk_id in enumerate(collection.ids)}
+            positions, vectors = collection.positions, collection.vectors
+            found = {chunk_id: positions[chunk_id] for chunk_id in ids if chunk_id in positions}
+        return {chunk_id: self._vector(vectors, index) for chunk_id, index in found.items()}
+
+    def search(self, collection_name: str, query_embedding: list[float], n_results: int = 5, where: dict | None = None, include_embeddings: bool = False) -> list[dict]:
+        """
+        Exact top-k search by cosine similarity over the whole collection.
+        With `where`, chunks whose metadata doesn't match are ruled out before ranking.
+        """
+        with self._lock:
+            collection = self._load(collection_name)
+            vectors, scales = collection.vectors, collection.scales
+            count = 0 if vectors is None else vectors.shape[0]
+        if count == 0:
+            return []
+        allowed = None
+        if where:
+            allowed = np.fromiter(
+                (matches_where(metadata, where) for metadata in collection.metadatas[:count]), dtype=bool, count=count
+            )
+            if not allowed.any():
+                return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        # Compact dtypes are widened block by block: BLAS only runs on float32, and
+        # converting in blocks keeps the temporary small.
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, 4096):
+            block = np.asarray(vectors[start:start + 4096], dtype=np.float32)
+            scores[start:start + 4096] = block @ query
+        if scales is not None:
+            scores *= scales
+        matching = count
+        if allowed is not None:
+            scores[~allowed] = -np.inf
+            matching = int(allowed.sum())
+
+        k = min(n_results, matching)
+        # argpartition finds the top k in O(n); only those k get sorted.
+        top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+        top = top[np.argsort(-scores[top])]
+        hits = [
+            {
+                "id": collection.ids[i],
+                "text": collection.texts[i],
+                "metadata": collection.metadatas[i],
+                "score": float(scores[i]),
+            }
+            for i in top
+        ]
+        if include_embeddings:
+            for hit, i in zip(hits, top):
+                hit["embedding"] = self._vector(vectors, i)
+        return hits
@@ -0,0 +1,273 @@
+"""
+End-to-end benchmark of the API with the offline fake providers.
+
+Drives the FastAPI app in-process (httpx + ASGITransport) with no API key
+or network. It measures:
+  * ingestion throughput (chunks/sec) for each document size and format;
+  * query latency (p50/p95/p99) and time to first token under concurrent clients;
+  * peak RSS.
+
+Results are written as JSON. Pass --compare with an earlier report to see
+the regressions. Run from the repository root:
+    python -m benchmarks.bench_api --sizes 10,100 --queries 200 --concurrency 16
+    python -m benchmarks.bench_api --output new.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_chunker import make_pages
+
+def configure_environment(workdir: str, args):
+    """Points the app at the fake providers and throwaway storage. Must run before importing it."""
+    os.environ.setdefault("EMBEDDER_BACKEND", "fake")
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    os.environ.setdefault("FAKE_EMBEDDING_LATENCY_MS", str(args.embed_latency_ms))
+    os.environ.setdefault("FAKE_LLM_FIRST_TOKEN_MS", str(args.first_token_ms))
+    os.environ.setdefault("FAKE_LLM_TOKEN_MS", str(args.token_ms))
+    # Every query is distinct, so near-duplicate answer matching would only skew the numbers.
+    os.environ.setdefault("ANSWER_CACHE_SEMANTIC_THRESHOLD", "")
+    for name, filename in (
+        ("SESSION_DB_PATH", "sessions.db"),
+        ("SCHEDULER_LOCK_PATH", "scheduler.lock"),
+        ("EMBEDDING_CACHE_PATH", "embedding_cache.db"),
+        ("CHROMA_PATH", "chroma_db"),
+        ("NUMPY_STORE_PATH", "vector_index"),
+    ):
+        os.environ[name] = os.path.join(workdir, filename)
+
+def build_document(file_format: str, pages: list[str]) -> tuple[bytes, str] | None:
+    """Renders generated pages as a PDF, DOCX or TXT upload. Returns None if the writer isn't installed."""
+    if file_format == "txt":
+        return "\n\n".join(pages).encode("utf-8"), "text/plain"
+    if file_format == "docx":
+        try:
+            import docx
+        except ImportError:
+            return None
+        document = docx.Document()
+        for page in pages:
+            for paragraph in page.split("\n\n"):
+                document.add_paragraph(paragraph)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getvalue(), "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    if file_format == "pdf":
+        try:
+            import pymupdf
+        except ImportError:
+            return None
+        document = pymupdf.open()
+        for page in pages:
+            document.new_page().insert_textbox(pymupdf.Rect(36, 36, 576, 806), page, fontsize=7)
+        return document.tobytes(), "application/pdf"
+    raise ValueError(f"Unknown format: {file_format}")
+
+def percentiles(values: list[float]) -> dict:
+    """Nearest-rank p50/p95/p99 plus the mean, in milliseconds."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+    def rank(p):
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 1)
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "mean": round(sum(ordered) / len(ordered), 1)}
+
+def peak_rss_bytes() -> dict:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+async def ingest(client, file_format: str, pages: int, seed: int) -> dict | None:
+    built = build_document(file_format, make_pages(pages, seed=seed))
+    if built is None:
+        print(f"{file_format:<5} {pages:>6} pages  skipped (writer not installed)")
+        return None
+    content, content_type = built
+    started = time.perf_counter()
+    response = await client.post("/process/", files={"file": (f"bench-{seed}.{file_format}", content, content_type)})
+    response.raise_for_status()
+    body = response.json()
+    while True:
+        job = (await client.get(f"/process/{body['job_id']}")).json()
+        if job["status"] in ("completed", "failed"):
+            break
+        await asyncio.sleep(0.02)
+    seconds = time.perf_counter() - started
+    chunks = job["chunks_total"] or 0
+    result = {
+        "format": file_format,
+        "pages": pages,
+        "bytes": len(content),
+        "status": job["status"],
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 1) if seconds else None,
+        "session_id": body["session_id"],
+    }
+    print(f"{file_format:<5} {pages:>6} pages  {chunks:>7} chunks  {seconds:>8.2f} s  "
+          f"{result['chunks_per_second'] or 0:>9.1f} chunks/s  {job['status']}")
+    return result
+
+async def run_queries(client, session_id: str, total: int, concurrency: int) -> dict:
+    """
+    Sends `total` distinct questions from `concurrency` concurrent clients.
+    ASGITransport hands back a response only once it is complete. So time to
+    first token comes from the server's own timing in the final usage event,
+    and latency is measured by the client.
+    """
+    latencies, first_tokens, errors = [], [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/query/?format=ndjson",
+                json={"session_id": session_id, "question": f"What does section {i} say about retrieval {i}?"},
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            errors += 1
+            return
+        latencies.append(elapsed)
+        for line in response.text.splitlines():
+            event = json.loads(line)
+            if event["type"] == "usage" and event["timing"]["first_token_ms"] is not None:
+                first_tokens.append(event["timing"]["first_token_ms"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - started
+    result = {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": round(total / wall, 1) if wall else None,
+        "first_token_ms": percentiles(first_tokens),
+        "latency_ms": percentiles(latencies),
+    }
+    print(f"queries: {total} x{concurrency}  {result['requests_per_second']} req/s  "
+          f"ttft p50 {result['first_token_ms']['p50']} ms  latency p50/p95/p99 "
+          f"{result['latency_ms']['p50']}/{result['latency_ms']['p95']}/{result['latency_ms']['p99']} ms  "
+          f"errors {errors}")
+    return result
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: dict, baseline: dict):
+    """Prints the headline metrics next to a baseline report."""
+    def row(label, new, old, higher_is_better):
+        if new is None or old is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  <-- regression" if worse and abs(change) >= 10 else ""
+        print(f"{label:<32} {old:>12.1f} {new:>12.1f} {change:>+8.1f}%{flag}")
+
+    print(f"\n{'metric':<32} {'baseline':>12} {'current':>12} {'change':>9}")
+    old_ingestion = {(r["format"], r["pages"]): r for r in baseline.get("ingestion", [])}
+    for result in report["ingestion"]:
+        old = old_ingestion.get((result["format"], result["pages"]))
+        if old:
+            row(f"{result['format']} {result['pages']}p chunks/s", result["chunks_per_second"],
+                old["chunks_per_second"], True)
+    new_query, old_query = report.get("query"), baseline.get("query")
+    if new_query and old_query:
+        row("queries req/s", new_query["requests_per_second"], old_query["requests_per_second"], True)
+        for metric in ("first_token_ms", "latency_ms"):
+            for p in ("p50", "p95", "p99"):
+                row(f"{metric} {p}", new_query[metric][p], old_query[metric][p], False)
+    row("peak RSS MiB", report["peak_rss_bytes"]["self"] / 2**20,
+        baseline["peak_rss_bytes"]["self"] / 2**20, False)
+
+async def run(args) -> dict:
+    import httpx
+    from backend.main import app
+
+    report = {"ingestion": [], "query": None}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            seed = 0
+            for file_format in args.formats:
+                for pages in args.sizes:
+                    seed += 1
+                    result = await ingest(client, file_format, pages, seed)
+                    if result:
+                        report["ingestion"].append(result)
+
+            ready = [r for r in report["ingestion"] if r["status"] == "completed"]
+            if args.queries and ready:
+                # Query the largest document, where retrieval does the most work.
+                target = max(ready, key=lambda r: r["chunks"])
+                report["query"] = await run_queries(client, target["session_id"], args.queries, args.concurrency)
+    for result in report["ingestion"]:
+        del result["session_id"]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,500", help="comma-separated page counts")
+    parser.add_argument("--formats", default="txt,docx,pdf", help="comma-separated formats")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0, help="fake embedding latency per batch")
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="fake LLM time to first token")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="fake LLM delay between tokens")
+    parser.add_argument("--output", default="bench_api.json")
+    parser.add_argument("--compare", help="an earlier report to compare against")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.formats = args.formats.split(",")
+
+    with tempfile.TemporaryDirectory(prefix="bench-api-") as workdir:
+        configure_environment(workdir, args)
+        started = time.perf_counter()
+        report = asyncio.run(run(args))
+
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "total_seconds": round(time.perf_counter() - started, 2),
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "env": {name: os.environ.get(name) for name in (
+            "EMBEDDER_BACKEND", "LLM_BACKEND", "VECTOR_STORE_BACKEND", "PDF_PARSER_BACKEND",
+            "CHUNK_SIZE", "CHUNK_OVERLAP", "INGEST_BATCH_SIZE", "INGEST_CONCURRENCY",
+        )},
+    }
+    print(f"peak RSS {report['peak_rss_bytes']['self'] / 2**20:.1f} MiB "
+          f"(children {report['peak_rss_bytes']['children'] / 2**20:.1f} MiB)")
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+if __name__ == "__main__":
+    main()
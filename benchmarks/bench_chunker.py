@@ -0,0 +1,72 @@
+# benchmarks/bench_chunker.py
+"""
+Micro-benchmark: streaming chunker vs. langchain's RecursiveCharacterTextSplitter.
+
+Run from the repository root:
+    python -m benchmarks.bench_chunker --pages 2000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from backend.core.chunker import iter_chunks
+
+WORDS = ("retrieval augmented generation document chunk embedding vector index query "
+         "answer context token page paragraph section figure table result method").split()
+
+def make_pages(pages: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(pages):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() + "."
+                         for _ in range(rng.randint(2, 6))]
+            paragraphs.append(" ".join(sentences))
+        result.append("\n\n".join(paragraphs))
+    return result
+
+def measure(label: str, run) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {count:>8} chunks  {elapsed * 1000:>9.1f} ms  peak {peak / 2**20:>7.1f} MiB")
+    return {"chunks": count, "seconds": elapsed, "peak_bytes": peak}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    print(f"{args.pages} pages, {sum(map(len, pages)) / 2**20:.1f} MiB of text")
+
+    def streaming():
+        # Pages are consumed one at a time, as they arrive from the PDF parser.
+        segments = ((number, page) for number, page in enumerate(pages, start=1))
+        return sum(1 for _ in iter_chunks(segments, args.chunk_size, args.chunk_overlap))
+
+    measure("streaming", streaming)
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        print("langchain is not installed; skipping RecursiveCharacterTextSplitter.")
+        return
+
+    def recursive():
+        # The splitter needs the whole document as one string.
+        splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        return len(splitter.split_text("\n\n".join(pages)))
+
+    measure("recursive", recursive)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Cold-start benchmark: how long until a fresh worker can answer health checks.
+
+Each run starts a new interpreter and measures two things:
+  * import: the time to import backend.main (median of --runs);
+  * server: the time from launching uvicorn until /healthz, and then
+    /readyz, answer 200.
+By default the fake providers are used, so /readyz can succeed without an
+API key. Pass --real-providers to measure the Gemini clients instead.
+--budget-seconds makes the run fail if the median import exceeds it, so it
+can guard startup time in CI. Run from the repository root:
+    python -m benchmarks.bench_startup --runs 5 --importtime
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - started)"
+)
+
+def child_environment(workdir: str, real_providers: bool) -> dict:
+    env = dict(os.environ)
+    if not real_providers:
+        env.setdefault("EMBEDDER_BACKEND", "fake")
+        env.setdefault("LLM_BACKEND", "fake")
+    env.update(
+        SESSION_DB_PATH=os.path.join(workdir, "sessions.db"),
+        SCHEDULER_LOCK_PATH=os.path.join(workdir, "scheduler.lock"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.db"),
+        CHROMA_PATH=os.path.join(workdir, "chroma_db"),
+        NUMPY_STORE_PATH=os.path.join(workdir, "vector_index"),
+    )
+    return env
+
+def measure_import(env: dict) -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(env: dict, top: int) -> list[dict]:
+    """The modules with the largest cumulative import time, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"], env=env, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package", after one header line.
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append({"module": module, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(url: str, deadline: float) -> float | None:
+    """Polls until the URL answers 200; returns the time it did, or None at the deadline."""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return None
+
+def measure_server(env: dict, timeout: float) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        healthy = wait_for(f"http://127.0.0.1:{port}/healthz", deadline)
+        ready = wait_for(f"http://127.0.0.1:{port}/readyz", deadline) if healthy else None
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {
+        "healthz_seconds": round(healthy - started, 3) if healthy else None,
+        "readyz_seconds": round(ready - started, 3) if ready else None,
+    }
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+        "runs": [round(value, 3) for value in values],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--real-providers", action="store_true", help="use the configured providers, not the fakes")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server")
+    parser.add_argument("--budget-seconds", type=float, help="fail if the median import takes longer")
+    parser.add_argument("--output", default="bench_startup.json")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        env = child_environment(workdir, args.real_providers)
+
+        imports = [measure_import(env) for _ in range(args.runs)]
+        report["import_seconds"] = summarize(imports)
+        print(f"import backend.main: median {report['import_seconds']['median']:.3f}s "
+              f"(min {report['import_seconds']['min']:.3f}s, max {report['import_seconds']['max']:.3f}s)")
+
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            print("uvicorn is not installed; skipping the server measurements.")
+        else:
+            servers = [measure_server(env, args.timeout) for _ in range(args.runs)]
+            for key in ("healthz_seconds", "readyz_seconds"):
+                values = [server[key] for server in servers if server[key] is not None]
+                report[key] = summarize(values) if values else None
+                if values:
+                    print(f"{key.split('_')[0]:<8} median {report[key]['median']:.3f}s after launch")
+                else:
+                    print(f"{key.split('_')[0]:<8} never answered 200 within {args.timeout}s")
+
+        if args.importtime:
+            report["slowest_imports"] = slowest_imports(env, args.top)
+            print(f"\n{'cumulative ms':>14} {'self ms':>9}  module")
+            for row in report["slowest_imports"]:
+                print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "real_providers": args.real_providers,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.budget_seconds is not None and report["import_seconds"]["median"] > args.budget_seconds:
+        print(f"Median import time exceeds the {args.budget_seconds}s budget.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# tests/conftest.py
+
+import os
+import tempfile
+
+# The backend builds its global stores at import time; point them at a
+# scratch directory and the offline fake providers before any test imports it.
+_workdir = tempfile.mkdtemp(prefix="documentor-tests-")
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(_workdir, "sessions.db"))
+os.environ.setdefault("SCHEDULER_LOCK_PATH", os.path.join(_workdir, "scheduler.lock"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_workdir, "embedding_cache.db"))
+os.environ.setdefault("NUMPY_STORE_PATH", os.path.join(_workdir, "vector_index"))
+os.environ.setdefault("CHROMA_PATH", os.path.join(_workdir, "chroma_db"))
+os.environ.setdefault("VECTOR_STORE_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDER_BACKEND", "fake")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("METRICS_ENABLED", "0")
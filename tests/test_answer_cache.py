@@ -0,0 +1,58 @@
+# tests/test_answer_cache.py
+
+import asyncio
+
+from backend.core.answer_cache import AnswerCache, CachedAnswer, conversation_fingerprint, normalize_question
+
+HISTORY = [{"sender": "user", "text": "List the termination clauses."}, {"sender": "ai", "text": "1. Notice 2. Breach"}]
+
+def test_normalize_question():
+    assert normalize_question("  What is the  Notice period?? ") == "what is the notice period"
+
+def test_conversation_fingerprint():
+    assert conversation_fingerprint(None) == conversation_fingerprint([], "") == ""
+    assert conversation_fingerprint(HISTORY) == conversation_fingerprint([dict(message) for message in HISTORY])
+    assert conversation_fingerprint(HISTORY) != conversation_fingerprint(HISTORY[:1])
+    assert conversation_fingerprint(HISTORY) != conversation_fingerprint(HISTORY, "Earlier: payment terms.")
+    assert conversation_fingerprint([], "a summary") != ""
+
+def test_exact_key_covers_question_chunks_and_conversation():
+    cache = AnswerCache(semantic_threshold=None)
+    answer = CachedAnswer("Thirty days.", ["chunk text"])
+    cache.put("doc", "What is the notice period?", ["b", "a"], answer)
+    assert cache.get("doc", "what is the notice period", ["a", "b"]) is answer
+    assert cache.get("doc", "What is the notice period?", ["a"]) is None
+    assert cache.get("other", "What is the notice period?", ["a", "b"]) is None
+
+    followup = conversation_fingerprint(HISTORY)
+    cache.put("doc", "What about the second one?", ["a"], CachedAnswer("Breach means...", []), conversation=followup)
+    assert cache.get("doc", "What about the second one?", ["a"], conversation=followup).answer == "Breach means..."
+    # The same words in another conversation refer to something else.
+    assert cache.get("doc", "What about the second one?", ["a"]) is None
+    assert cache.get("doc", "What about the second one?", ["a"], conversation=conversation_fingerprint(HISTORY[:1])) is None
+
+def test_semantic_hits_stay_within_the_conversation():
+    cache = AnswerCache(semantic_threshold=0.9)
+    followup = conversation_fingerprint(HISTORY)
+    cache.put("doc", "What about the second one?", ["a"], CachedAnswer("Breach", []), [1.0, 0.0], followup)
+    assert cache.get("doc", "And the second one?", ["a"], [0.99, 0.05], followup).answer == "Breach"
+    assert cache.get("doc", "And the second one?", ["a"], [0.99, 0.05]) is None
+    assert cache.get("doc", "And the second one?", ["a"], [0.0, 1.0], followup) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_record_skips_failed_generations():
+    cache = AnswerCache(semantic_threshold=None)
+
+    async def stream(*pieces):
+        for piece in pieces:
+            yield piece
+
+    async def drain(generator):
+        return "".join([piece async for piece in generator])
+
+    assert asyncio.run(drain(cache.record(stream("Thirty ", "days."), "doc", "q", ["a"], ["src"]))) == "Thirty days."
+    assert cache.get("doc", "q", ["a"]).sources == ["src"]
+    asyncio.run(drain(cache.record(stream("An error occurred while generating"), "doc", "q2", ["a"], [])))
+    assert cache.get("doc", "q2", ["a"]) is None
+    cache.drop_document("doc")
+    assert cache.get("doc", "q", ["a"]) is None
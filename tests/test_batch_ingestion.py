@@ -0,0 +1,52 @@
+# tests/test_batch_ingestion.py
+
+import asyncio
+import uuid
+
+import backend.main as main
+from backend.core.jobs import IngestionJob
+from backend.core.ingestion import ingestion_pipeline
+from backend.core.lexical import lexical_index_registry
+from backend.core.providers import provider_registry
+from backend.core.scheduler import session_manager
+from backend.vector_store import vector_store_instance
+
+def test_failed_file_is_removed_from_a_batch(tmp_path, monkeypatch):
+    collection_name = f"batch-{uuid.uuid4().hex}"
+    vector_store_instance.create_collection(collection_name)
+    session_manager.register_session(str(uuid.uuid4()), collection_name)
+    documents = []
+    for document_id in ("good", "bad"):
+        path = tmp_path / f"{document_id}.txt"
+        path.write_text("placeholder")
+        documents.append({"path": str(path), "format": "txt", "filename": path.name, "document_id": document_id})
+    session_manager.record_documents(collection_name, documents)
+
+    async def fake_ingest_file(collection, path, file_format, filename, document_id, on_page, on_batch):
+        def chunks():
+            for i in range(250):
+                # The bad file fails after its first batches were stored.
+                if document_id == "bad" and i == 220:
+                    raise ValueError("page 300 is corrupt")
+                yield f"{document_id} chunk {i}", {"document_id": document_id, "source": filename}
+
+        return await ingestion_pipeline.run(collection, chunks(), on_batch=on_batch)
+
+    monkeypatch.setattr(main, "_ingest_file", fake_ingest_file)
+    job = IngestionJob("session", collection_name, "2 documents")
+
+    async def ingest():
+        # As the upload endpoint's dependency does.
+        await provider_registry.ensure_ready()
+        await main._ingest_batch(job, documents)
+
+    asyncio.run(ingest())
+
+    stored = vector_store_instance.get_documents(collection_name)
+    assert len(stored) == 250
+    assert {document["metadata"]["document_id"] for document in stored} == {"good"}
+    assert lexical_index_registry.search(collection_name, "bad chunk", 10, {"document_id": "bad"}) == []
+    assert [document["document_id"] for document in session_manager.list_documents(collection_name)] == ["good"]
+    assert job.error.startswith("Skipped: bad.txt")
+    assert job.chunks_total == job.chunks_embedded == 250
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,65 @@
+# tests/test_chunker.py
+
+import pytest
+
+from backend.core import chunker
+from backend.core.chunker import iter_chunks
+
+def _segments() -> list[tuple[int, str]]:
+    words = [f"word{i}" for i in range(900)]
+    return [
+        (1, " ".join(words[:300]) + ". The end of page one."),
+        (2, ""),  # A blank page is skipped without shifting the offsets.
+        (3, "\n".join(" ".join(words[i:i + 12]) for i in range(300, 900, 12))),
+    ]
+
+def _document(segments) -> str:
+    return chunker._SEGMENT_JOINER.join(text for _, text in segments if text)
+
+@pytest.mark.parametrize("feed_size", [64 * 1024, 97])
+def test_offsets_point_into_the_document(monkeypatch, feed_size):
+    # A small feed size exercises segments arriving in slices.
+    monkeypatch.setattr(chunker, "_FEED_SIZE", feed_size)
+    segments = _segments()
+    document = _document(segments)
+    chunks = list(iter_chunks(segments, chunk_size=500, chunk_overlap=100))
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        assert document[chunk.start:chunk.end] == chunk.text
+        assert len(chunk.text) <= 500
+    # Chunks overlap rather than leave gaps, and reach the end of the document.
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start <= previous.end
+    assert chunks[-1].end == len(document.rstrip())
+
+def test_segment_is_the_one_the_chunk_starts_in():
+    segments = _segments()
+    page_three = len(segments[0][1]) + len(chunker._SEGMENT_JOINER)
+    for chunk in iter_chunks(segments, chunk_size=500, chunk_overlap=100):
+        assert chunk.segment == (1 if chunk.start < page_three else 3)
+
+def test_splits_prefer_separators():
+    text = "First sentence here. Second sentence here. Third one."
+    chunks = list(iter_chunks([(None, text)], chunk_size=30, chunk_overlap=5))
+    assert chunks[0].text == "First sentence here."
+
+def test_token_unit_respects_the_counter():
+    segments = _segments()
+    count_words = lambda text: len(text.split())
+    chunks = list(iter_chunks(segments, chunk_size=50, chunk_overlap=10, unit="tokens", token_counter=count_words))
+    assert all(count_words(chunk.text) <= 50 for chunk in chunks)
+    document = _document(segments)
+    assert all(document[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+
+def test_identical_text_hashes_alike():
+    chunks = list(iter_chunks([(1, "same text")], chunk_size=100, chunk_overlap=0))
+    again = list(iter_chunks([(7, "  same text  ")], chunk_size=100, chunk_overlap=0))
+    assert chunks[0].content_hash == again[0].content_hash
+    assert (again[0].start, again[0].segment) == (2, 7)
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        list(iter_chunks([(1, "text")], chunk_size=100, chunk_overlap=100))
+    with pytest.raises(ValueError):
+        list(iter_chunks([(1, "text")], unit="pages"))
@@ -0,0 +1,90 @@
+# tests/test_coalescer.py
+
+import asyncio
+
+import pytest
+
+from backend.core.embedder import EmbeddingCoalescer
+from backend.core.fake_provider import FakeEmbedder
+
+class _RecordingEmbedder(FakeEmbedder):
+    def __init__(self, latency_seconds: float = 0.0, fail: bool = False):
+        super().__init__(dimensions=16, latency_seconds=latency_seconds)
+        self.batches = []
+        self.fail = fail
+
+    async def _embed(self, texts, task_type):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ConnectionError("API unreachable")
+        return await super()._embed(texts, task_type)
+
+def test_concurrent_callers_share_one_batch():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.05)
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.embed_documents(["alpha"], "RETRIEVAL_QUERY"),
+            coalescer.embed_documents(["beta", "alpha"], "RETRIEVAL_QUERY"),
+        )
+
+    first, second = asyncio.run(scenario())
+    assert embedder.batches == [["alpha", "beta"]]
+    assert first == [embedder.embed_one("alpha")]
+    assert second == [embedder.embed_one("beta"), embedder.embed_one("alpha")]
+
+def test_batches_are_capped():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.05, max_batch=2)
+    texts = ["one", "two", "three", "four", "five"]
+    vectors = asyncio.run(coalescer.embed_documents(texts))
+    assert [len(batch) for batch in embedder.batches] == [2, 2, 1]
+    assert vectors == [embedder.embed_one(text) for text in texts]
+
+def test_a_text_in_flight_is_not_sent_again():
+    embedder = _RecordingEmbedder(latency_seconds=0.05)
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.01)
+
+    async def scenario():
+        first = asyncio.create_task(coalescer.embed_documents(["alpha"]))
+        await asyncio.sleep(0.02)  # The first batch is now in flight.
+        second = await coalescer.embed_documents(["alpha", "gamma"])
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert embedder.batches == [["alpha"], ["gamma"]]
+    assert second[0] == first[0]
+
+def test_errors_reach_every_caller():
+    coalescer = EmbeddingCoalescer(_RecordingEmbedder(fail=True), window_seconds=0.05)
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.embed_documents(["alpha"]), coalescer.embed_documents(["beta"]), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+def test_a_caller_giving_up_does_not_cancel_the_others():
+    embedder = _RecordingEmbedder(latency_seconds=0.05)
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0.01)
+
+    async def scenario():
+        impatient = asyncio.create_task(coalescer.embed_documents(["alpha"]))
+        patient = asyncio.create_task(coalescer.embed_documents(["alpha"]))
+        await asyncio.sleep(0.02)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(scenario()) == [_RecordingEmbedder().embed_one("alpha")]
+
+def test_zero_window_calls_the_embedder_directly():
+    embedder = _RecordingEmbedder()
+    coalescer = EmbeddingCoalescer(embedder, window_seconds=0)
+    asyncio.run(coalescer.embed_documents(["alpha", "alpha"]))
+    # No coalescing, so no deduplication either.
+    assert embedder.batches == [["alpha", "alpha"]]
@@ -0,0 +1,107 @@
+# tests/test_context_builder.py
+
+import asyncio
+import json
+import random
+import string
+import uuid
+
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.core.context_builder import ContextBuilder, estimate_tokens, merge_overlapping_chunks
+from backend.core.ingestion import ingestion_pipeline
+from backend.core.providers import provider_registry
+from backend.core.scheduler import session_manager
+from backend.vector_store import vector_store_instance
+
+# Words that don't repeat, so the only overlaps are the ones a test sets up.
+_random = random.Random(7)
+TEXT = " ".join("".join(_random.choices(string.ascii_lowercase, k=_random.randint(2, 9))) for _ in range(400))
+
+def test_adjacent_and_overlapping_chunks_are_stitched():
+    first, second, third = TEXT[:400], TEXT[300:700], TEXT[650:1000]
+    # Retrieved out of order, as relevance ranks them.
+    assert merge_overlapping_chunks([third, first, second]) == [TEXT[:1000].strip()]
+
+def test_contained_and_unrelated_chunks():
+    unrelated = "An unrelated paragraph about something else entirely."
+    spans = merge_overlapping_chunks([TEXT[100:300], unrelated, TEXT[:500], TEXT[150:200]])
+    # The larger span absorbs the smaller ones and keeps the best rank among them.
+    assert spans == [TEXT[:500].strip(), unrelated]
+
+def test_short_overlaps_are_not_merged():
+    # Sharing less than `min_overlap` characters is likely a coincidence.
+    assert merge_overlapping_chunks(["the end of the report", "report findings"]) == [
+        "the end of the report", "report findings"
+    ]
+
+def test_default_budgets():
+    builder = ContextBuilder()
+    assert (builder.context_budget, builder.history_budget) == (6000, 1500)
+
+def test_context_is_truncated_at_the_budget_and_spans_are_dropped():
+    builder = ContextBuilder(context_budget=300, history_budget=100)
+    spans = ["a" * 800, "b" * 400, "c" * 400]  # 200 tokens, then 100, then 100.
+    prompt = builder.build("Why?", spans, [])
+    # The second span is cut to the 100 tokens left; nothing useful fits after it.
+    assert prompt.context_str == "a" * 800 + "\n---\n" + "b" * 400
+    assert prompt.usage["context_tokens"] == 300
+    assert (prompt.usage["spans_used"], prompt.usage["spans_dropped"]) == (2, 1)
+
+    prompt = builder.build("Why?", ["a" * 1000, "b" * 1000], [])
+    # 50 tokens left after the first span: too little to be worth cutting the second one down to.
+    assert prompt.context_str == "a" * 1000
+    assert prompt.usage["spans_dropped"] == 1
+
+def test_history_keeps_the_latest_turns_within_the_budget():
+    builder = ContextBuilder(context_budget=100, history_budget=30)
+    history = [{"sender": "user" if i % 2 else "ai", "text": f"message {i} " + "x" * 30} for i in range(6)]
+    prompt = builder.build("Why?", [], history)
+    lines = prompt.history_str.split("\n")
+    assert lines[0] == "[4 earlier messages omitted]"
+    assert lines[1:] == ["Assistant: message 4 " + "x" * 30, "User: message 5 " + "x" * 30]
+    assert prompt.usage["messages_omitted"] == 4
+    assert prompt.usage["history_tokens"] <= 30
+
+def test_summary_comes_out_of_the_history_budget():
+    builder = ContextBuilder(context_budget=100, history_budget=40)
+    history = [{"sender": "user", "text": "x" * 60}, {"sender": "ai", "text": "y" * 20}]
+    prompt = builder.build("Why?", [], history, summary="s" * 200)
+    summary_line = prompt.history_str.split("\n")[0]
+    # Capped at half the budget.
+    assert summary_line == "Summary of the earlier conversation: " + "s" * 80
+    assert prompt.usage["summary_tokens"] == estimate_tokens(summary_line)
+    assert prompt.usage["history_tokens"] <= 40
+    assert prompt.usage["messages_omitted"] == 1
+
+def test_usage_totals_add_up():
+    prompt = ContextBuilder().build("What changed?", [TEXT[:400], TEXT[300:700]], [{"sender": "user", "text": "Hi"}])
+    usage = prompt.usage
+    assert usage["total_tokens"] == usage["context_tokens"] + usage["history_tokens"] + usage["question_tokens"]
+    assert (usage["chunks_in"], usage["spans_used"], usage["spans_dropped"]) == (2, 1, 0)
+    assert prompt.history_str == "User: Hi"
+    assert ContextBuilder().build("Why?", [], []).history_str == "No previous conversation history."
+
+def test_usage_is_reported_in_the_response_header():
+    collection_name = f"usage-{uuid.uuid4().hex}"
+    session_id = str(uuid.uuid4())
+    vector_store_instance.create_collection(collection_name)
+    session_manager.register_session(session_id, collection_name)
+
+    async def ingest():
+        await provider_registry.ensure_ready()
+        chunks = ((TEXT[i:i + 400], {"document_id": "report"}) for i in range(0, 2000, 300))
+        await ingestion_pipeline.run(collection_name, chunks)
+
+    asyncio.run(ingest())
+    response = TestClient(main.app).post("/query/", json={
+        "session_id": session_id,
+        "question": "What does the report say?",
+        "chat_history": [{"sender": "user", "text": "Hello"}, {"sender": "ai", "text": "Hi there."}],
+    })
+    assert response.status_code == 200
+    usage = json.loads(response.headers["X-Prompt-Usage"])
+    assert usage["chunks_in"] >= usage["spans_used"] > 0
+    assert usage["history_tokens"] == estimate_tokens("User: Hello") + estimate_tokens("Assistant: Hi there.")
+    assert usage["total_tokens"] == usage["context_tokens"] + usage["history_tokens"] + usage["question_tokens"]
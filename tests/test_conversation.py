@@ -0,0 +1,86 @@
+# tests/test_conversation.py
+
+import asyncio
+
+from backend.core.conversation import ConversationStore
+
+def _store(tmp_path) -> ConversationStore:
+    return ConversationStore(path=str(tmp_path / "sessions.db"), recent_messages=4, fold_batch=2)
+
+def _turns(start: int, count: int) -> list[dict]:
+    return [{"sender": "user" if i % 2 else "ai", "text": f"message {i}"} for i in range(start, start + count)]
+
+class _Summarizer:
+    def __init__(self, result: str | None = None):
+        self.calls = []
+        self.result = result
+
+    async def __call__(self, summary: str, messages: list[dict]) -> str:
+        self.calls.append((summary, [m["text"] for m in messages]))
+        if self.result is not None:
+            return self.result
+        return summary + "|" + ",".join(m["text"] for m in messages)
+
+def _texts(state) -> list[str]:
+    return [m["text"] for m in state.recent]
+
+def test_messages_within_the_window_are_not_folded(tmp_path):
+    store = _store(tmp_path)
+    store.append("s", _turns(1, 4))
+    summarizer = _Summarizer()
+    assert not asyncio.run(store.fold("s", summarizer))
+    assert summarizer.calls == []
+    state = store.get_state("s")
+    assert (state.summary, _texts(state), state.total_messages) == ("", [f"message {i}" for i in range(1, 5)], 4)
+
+def test_aged_out_messages_stay_verbatim_until_folded(tmp_path):
+    store = _store(tmp_path)
+    store.append("s", _turns(1, 5))
+    # One message left the window: not enough to fold, but it mustn't disappear either.
+    assert not asyncio.run(store.fold("s", _Summarizer()))
+    assert _texts(store.get_state("s")) == [f"message {i}" for i in range(1, 6)]
+
+def test_fold_moves_aged_out_messages_into_the_summary(tmp_path):
+    store = _store(tmp_path)
+    store.append("s", _turns(1, 7))
+    summarizer = _Summarizer()
+    assert asyncio.run(store.fold("s", summarizer))
+    assert summarizer.calls == [("", ["message 1", "message 2", "message 3"])]
+    state = store.get_state("s")
+    assert state.summary == "|message 1,message 2,message 3"
+    assert _texts(state) == [f"message {i}" for i in range(4, 8)]
+    assert state.total_messages == 7
+    # The next fold starts from the running summary and only sends what's new.
+    store.append("s", _turns(8, 2))
+    asyncio.run(store.fold("s", summarizer))
+    assert summarizer.calls[-1] == (state.summary, ["message 4", "message 5"])
+    assert _texts(store.get_state("s")) == [f"message {i}" for i in range(6, 10)]
+
+def test_failed_fold_keeps_every_message(tmp_path):
+    store = _store(tmp_path)
+    store.append("s", _turns(1, 7))
+    assert not asyncio.run(store.fold("s", _Summarizer(result="")))
+    state = store.get_state("s")
+    assert state.summary == ""
+    assert _texts(state) == [f"message {i}" for i in range(1, 8)]
+    # A later fold picks up everything that is still pending.
+    summarizer = _Summarizer()
+    assert asyncio.run(store.fold("s", summarizer))
+    assert summarizer.calls[0][1] == ["message 1", "message 2", "message 3"]
+
+def test_record_stores_the_answer_without_suggestions(tmp_path):
+    store = _store(tmp_path)
+
+    async def answer():
+        for piece in ("It is 42.\n", "SUGGESTION: Why?"):
+            yield piece
+
+    async def scenario():
+        pieces = [piece async for piece in store.record(answer(), "s", "What is it?", _Summarizer())]
+        await asyncio.gather(*store._tasks)
+        return pieces
+
+    assert asyncio.run(scenario()) == ["It is 42.\n", "SUGGESTION: Why?"]
+    assert store.messages("s") == [{"sender": "user", "text": "What is it?"}, {"sender": "ai", "text": "It is 42."}]
+    store.drop(["s"])
+    assert store.get_state("s").total_messages == 0
@@ -0,0 +1,71 @@
+# tests/test_embedding_cache.py
+
+import asyncio
+import threading
+
+from backend.core.embedder import Embedder
+from backend.core.embedding_cache import EmbeddingCache
+
+def test_round_trip_and_counters(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    key = EmbeddingCache.make_key("hello", "model", "RETRIEVAL_DOCUMENT")
+    assert key != EmbeddingCache.make_key("hello", "model", "RETRIEVAL_QUERY")
+    assert cache.get_many([key]) == {}
+    cache.put_many({key: [0.5, -0.25]})
+    assert cache.get_many([key, key]) == {key: [0.5, -0.25]}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.put_many({"a": [1.0]})
+    cache.put_many({"b": [2.0]})
+    # Reading "a" makes "b" the coldest, even though the recency write is buffered.
+    cache.get_many(["a"])
+    cache.put_many({"c": [3.0]})
+    assert cache.get_many(["a", "b", "c"]).keys() == {"a", "c"}
+    assert cache.stats()["entries"] == 2
+
+def test_reinserting_a_key_does_not_inflate_the_count(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+    cache.put_many({"a": [1.0], "b": [2.0]})
+    cache.put_many({"a": [1.0]})
+    assert cache.stats()["entries"] == 2
+    # A second handle on the file (another worker) starts from the stored count.
+    assert EmbeddingCache(str(tmp_path / "cache.db")).stats()["entries"] == 2
+
+class _CountingEmbedder(Embedder):
+    def __init__(self, cache):
+        super().__init__("counting", cache)
+        self.sent = []
+
+    async def _embed(self, texts, task_type):
+        self.sent.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+def test_embedder_only_sends_misses_and_keeps_sqlite_off_the_loop(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    loop_threads = []
+    original = cache.get_many
+
+    def get_many(keys):
+        loop_threads.append(threading.current_thread() is threading.main_thread())
+        return original(keys)
+
+    monkeypatch.setattr(cache, "get_many", get_many)
+    embedder = _CountingEmbedder(cache)
+    assert asyncio.run(embedder.embed_documents(["aa", "b", "aa"])) == [[2.0], [1.0], [2.0]]
+    assert asyncio.run(embedder.embed_documents(["b", "ccc"])) == [[1.0], [3.0]]
+    assert embedder.sent == [["aa", "b"], ["ccc"]]
+    assert loop_threads == [False, False]
+
+def test_embedder_backends_must_implement_embed():
+    class Incomplete(Embedder):
+        pass
+
+    try:
+        Incomplete("model")
+    except TypeError as e:
+        assert "_embed" in str(e)
+    else:
+        raise AssertionError("expected a TypeError")
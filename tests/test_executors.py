@@ -0,0 +1,84 @@
+# tests/test_executors.py
+
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.core.executors import (
+    INGEST, PREFETCH, QUERY, AdmissionController, AdmissionRejected, PriorityThreadPool,
+)
+
+def _blocker(pool: PriorityThreadPool, priority: int):
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    future = pool.submit(block, priority=priority)
+    assert started.wait(5)
+    return release, future
+
+def test_queued_calls_run_in_priority_order():
+    pool = PriorityThreadPool("test", max_workers=1)
+    release, _ = _blocker(pool, QUERY)
+    order = []
+    futures = [
+        pool.submit(order.append, name, priority=priority)
+        for name, priority in (("ingest 1", INGEST), ("prefetch", PREFETCH), ("query", QUERY), ("ingest 2", INGEST))
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+    # Queries first, then the rest by priority and arrival.
+    assert order == ["query", "ingest 1", "ingest 2", "prefetch"]
+    pool.shutdown()
+
+def test_low_priority_work_leaves_threads_for_queries():
+    pool = PriorityThreadPool("test", max_workers=2, low_priority_limit=1)
+    release, first = _blocker(pool, INGEST)
+    second = pool.submit(time.time, priority=INGEST)
+    # The second thread is kept for queries, so this runs while the ingest call blocks.
+    assert pool.submit(lambda: "answered", priority=QUERY).result(5) == "answered"
+    assert not second.done()
+    release.set()
+    first.result(5)
+    second.result(5)
+    assert pool.stats()["low_priority_running"] == 0
+    pool.shutdown()
+
+def test_errors_reach_the_caller():
+    pool = PriorityThreadPool("test", max_workers=1)
+    future = pool.submit(lambda: 1 / 0)
+    try:
+        future.result(5)
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError("expected a ZeroDivisionError")
+    pool.shutdown()
+
+def test_admission_rejects_beyond_active_and_queued():
+    controller = AdmissionController("test", max_active=1, max_queued=1)
+    slots = [controller.reserve(), controller.reserve()]
+    try:
+        controller.reserve()
+    except AdmissionRejected as e:
+        # No history yet: one item waiting behind one running, at the 10 s default.
+        assert e.retry_after == 20
+    else:
+        raise AssertionError("expected AdmissionRejected")
+    slots[0].release()
+    slots[0].release()  # Releasing twice gives back only one place.
+    controller.reserve()
+    assert controller.stats()["reserved"] == 2
+
+def test_saturated_worker_answers_429_with_retry_after(monkeypatch):
+    controller = AdmissionController("test", max_active=1, max_queued=0)
+    controller.reserve()
+    monkeypatch.setattr(main, "ingestion_admission", controller)
+    response = TestClient(main.app).post("/process/", files={"file": ("a.txt", b"some text", "text/plain")})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
@@ -0,0 +1,60 @@
+# tests/test_exporter.py
+
+import asyncio
+import uuid
+
+import backend.main as main
+from backend.core.conversation import conversation_store
+from backend.core.exporter import ExportService
+from backend.core.scheduler import session_manager
+
+def _history(turns: int) -> list[dict]:
+    history = []
+    for i in range(turns):
+        history.append({"sender": "user", "text": f"question {i}"})
+        history.append({"sender": "ai", "text": f"answer {i}"})
+    return history
+
+def test_session_export_covers_the_whole_transcript(monkeypatch):
+    session_id = str(uuid.uuid4())
+    session_manager.register_session(session_id, f"export-{uuid.uuid4().hex}")
+    history = _history(25)
+    conversation_store.append(session_id, history)
+    started = []
+
+    async def fake_start_job(chat_history, summary=""):
+        started.append(chat_history)
+        return "job"
+
+    monkeypatch.setattr(main.export_service, "start_job", fake_start_job)
+    response = asyncio.run(main.export_conversation_to_pdf(main.ExportRequest(session_id=session_id), mode="auto"))
+
+    # 50 messages is over EXPORT_JOB_THRESHOLD, which only the full transcript can reach.
+    assert response.status_code == 202
+    assert [(m["sender"], m["text"]) for m in started[0]] == [(m["sender"], m["text"]) for m in history]
+
+def test_start_job_records_the_job_and_starts_it_once(tmp_path):
+    service = ExportService(llm=None, path=str(tmp_path / "exports.db"))
+    release = asyncio.Event()
+    exports = []
+
+    async def fake_export(chat_history, summary=""):
+        exports.append(chat_history)
+        await release.wait()
+        return b"%PDF"
+
+    service.export = fake_export
+    history = _history(3)
+
+    async def scenario():
+        first, second = await asyncio.gather(service.start_job(history), service.start_job(history))
+        assert first == second == service.conversation_key(history)
+        assert service.status(first)["status"] == "pending"
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*service._tasks)
+        return first
+
+    key = asyncio.run(scenario())
+    assert len(exports) == 1
+    assert key not in service._jobs
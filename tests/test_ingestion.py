@@ -0,0 +1,65 @@
+# tests/test_ingestion.py
+
+import asyncio
+
+import pytest
+
+from backend.core.fake_provider import FakeEmbedder
+from backend.core.ingestion import IngestionPipeline, is_rate_limit_error
+from backend.vector_store.numpy_store import NumpyStore
+
+class _FlakyEmbedder(FakeEmbedder):
+    """Fails its first `failures` calls with `error`, then embeds as usual."""
+
+    def __init__(self, failures: int, error: Exception):
+        super().__init__(dimensions=16)
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def _embed(self, texts, task_type):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return await super()._embed(texts, task_type)
+
+def _pipeline(tmp_path, embedder) -> tuple[IngestionPipeline, NumpyStore]:
+    store = NumpyStore(str(tmp_path))
+    store.create_collection("docs")
+    # One embedding worker, so the calls are counted in order.
+    pipeline = IngestionPipeline(embedder, store, batch_size=4, concurrency=1, max_retries=3, base_delay=0.001)
+    return pipeline, store
+
+def _chunks(count: int):
+    return ((f"chunk number {i}", {"document_id": "doc"}) for i in range(count))
+
+def test_transient_rate_limits_are_retried(tmp_path):
+    embedder = _FlakyEmbedder(failures=2, error=ConnectionError("429 Too Many Requests"))
+    pipeline, store = _pipeline(tmp_path, embedder)
+    assert asyncio.run(pipeline.run("docs", _chunks(10))) == 10
+    # Two failed attempts, then the three batches.
+    assert embedder.calls == 5
+    assert [document["text"] for document in store.get_documents("docs")] == [f"chunk number {i}" for i in range(10)]
+
+def test_error_surfaces_once_retries_are_exhausted(tmp_path):
+    embedder = _FlakyEmbedder(failures=100, error=ConnectionError("quota exceeded"))
+    pipeline, store = _pipeline(tmp_path, embedder)
+    with pytest.raises(ConnectionError, match="quota exceeded"):
+        asyncio.run(pipeline.run("docs", _chunks(10)))
+    assert embedder.calls == 1 + pipeline.max_retries
+    assert store.get_documents("docs") == []
+
+def test_other_errors_are_not_retried(tmp_path):
+    embedder = _FlakyEmbedder(failures=1, error=ValueError("invalid input"))
+    pipeline, _ = _pipeline(tmp_path, embedder)
+    with pytest.raises(ValueError):
+        asyncio.run(pipeline.run("docs", _chunks(10)))
+    assert embedder.calls == 1
+
+def test_rate_limit_detection():
+    assert is_rate_limit_error(ConnectionError("HTTP 429"))
+    assert is_rate_limit_error(RuntimeError("Rate limit reached"))
+    error = RuntimeError("unavailable")
+    error.code = 503
+    assert is_rate_limit_error(error)
+    assert not is_rate_limit_error(ValueError("bad request"))
@@ -0,0 +1,131 @@
+# tests/test_jobs.py
+
+import asyncio
+import inspect
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend.core.jobs import JobManager
+
+def _manager(tmp_path, **kwargs) -> JobManager:
+    return JobManager(path=str(tmp_path / "sessions.db"), **kwargs)
+
+def test_heartbeat_shares_progress_with_other_workers(tmp_path):
+    manager = _manager(tmp_path, heartbeat_seconds=0.01)
+    other_worker = _manager(tmp_path)
+
+    async def scenario():
+        job = manager.create_job("session", "docs", "a.pdf")
+        observed = []
+
+        async def work():
+            job.pages_total = 10
+            for page in range(1, 11):
+                job.pages_parsed = page
+                await asyncio.sleep(0.01)
+                observed.append(other_worker.get_job(job.job_id).pages_parsed)
+
+        manager.start(job, work())
+        await asyncio.gather(*manager._tasks)
+        return job, observed
+
+    job, observed = asyncio.run(scenario())
+    # The other worker saw progress while the job ran, not just the final state.
+    assert 0 < max(observed[:-1]) < 10
+    stored = other_worker.get_job(job.job_id)
+    assert (stored.status, stored.pages_parsed, stored.pages_total) == ("completed", 10, 10)
+    assert stored.finished_at is not None
+    assert job.job_id not in manager.jobs
+
+def test_failures_are_recorded(tmp_path):
+    manager = _manager(tmp_path)
+
+    async def work():
+        raise ValueError("page 3 is corrupt")
+
+    async def scenario():
+        job = manager.create_job("session", "docs", "a.pdf")
+        manager.start(job, work())
+        await asyncio.gather(*manager._tasks)
+        return job
+
+    job = asyncio.run(scenario())
+    stored = _manager(tmp_path).get_job(job.job_id)
+    assert (stored.status, stored.error) == ("failed", "page 3 is corrupt")
+
+def test_cancelled_while_queued_closes_the_work_and_cleans_up(tmp_path):
+    manager = _manager(tmp_path)
+    upload = tmp_path / "upload.pdf"
+    upload.write_bytes(b"%PDF")
+
+    async def work():
+        raise AssertionError("never runs")
+
+    async def scenario():
+        job = manager.create_job("session", "docs", "a.pdf")
+        slot = asyncio.Lock()
+        await slot.acquire()  # Every ingestion slot is taken.
+        coroutine = work()
+        manager.start(job, coroutine, slot=slot, cleanup=upload.unlink)
+        await asyncio.sleep(0.01)
+        assert job.status == "queued"
+        for task in manager._tasks:
+            task.cancel()
+        await asyncio.gather(*manager._tasks, return_exceptions=True)
+        return job, coroutine
+
+    job, coroutine = asyncio.run(scenario())
+    assert inspect.getcoroutinestate(coroutine) == inspect.CORO_CLOSED
+    assert not upload.exists()
+    assert _manager(tmp_path).get_job(job.job_id).status == "failed"
+
+def test_restart_keeps_snapshots_and_fails_abandoned_jobs(tmp_path):
+    before = _manager(tmp_path)
+    job = before.create_job("session", "docs", "a.pdf")
+    job.status, job.chunks_embedded = "running", 40
+    before._save(job)
+
+    # A restarted worker doesn't run the job, but still knows about it.
+    after = _manager(tmp_path)
+    restored = after.get_job(job.job_id)
+    assert (restored.status, restored.chunks_embedded) == ("running", 40)
+    assert after.job_for_collection("docs").job_id == job.job_id
+    assert not after.is_local("docs")
+    assert after.is_partial("docs")
+
+    # Once its heartbeat is stale, the job no longer counts as in progress.
+    after.stale_seconds = 0.01
+    time.sleep(0.02)
+    assert not after.is_partial("docs")
+    after.prune_finished_jobs()
+    restored = after.get_job(job.job_id)
+    assert restored.status == "failed" and "stopped" in restored.error
+
+def test_progress_endpoint_streams_until_the_job_finishes():
+    job = main.job_manager.create_job("session", "docs-progress", "a.pdf")
+    job.status, job.started_at, job.pages_total = "running", time.time(), 4
+
+    def finish():
+        job.pages_parsed, job.chunks_total, job.chunks_embedded = 4, 8, 8
+        job.status = "completed"
+
+    timer = threading.Timer(0.2, finish)
+    timer.start()
+    try:
+        response = TestClient(main.app).get(f"/process/{job.job_id}/progress")
+    finally:
+        timer.cancel()
+        main.job_manager.jobs.pop(job.job_id, None)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["status"] for event in events] == ["running", "completed"]
+    assert events[-1]["chunks_embedded"] == 8 and events[-1]["eta_seconds"] == 0.0
+
+def test_progress_endpoint_unknown_job():
+    response = TestClient(main.app).get("/process/no-such-job/progress")
+    assert response.status_code == 404
@@ -0,0 +1,32 @@
+# tests/test_lexical.py
+
+from backend.core.lexical import BM25Index, tokenize
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add(
+        ["1", "2", "3"],
+        ["clause 4.2.1 covers indemnity", "payment terms are net 30", "indemnity caps apply"],
+        [{"document_id": "a"}, {"document_id": "b"}, {"document_id": "b"}],
+    )
+    return index
+
+def test_tokenize_keeps_dotted_numbers():
+    assert tokenize("See Clause 4.2.1, then 5.") == ["see", "clause", "4.2.1", "then", "5"]
+
+def test_search_ranks_and_filters():
+    index = _index()
+    assert {hit["id"] for hit in index.search("indemnity", 5)} == {"1", "3"}
+    assert index.search("payment indemnity", 1)[0]["id"] == "2"
+    assert [hit["id"] for hit in index.search("indemnity", 5, where={"document_id": "a"})] == ["1"]
+    assert index.search("nothing matches", 5) == []
+
+def test_remove_reindexes_the_survivors():
+    index = _index()
+    assert index.remove({"document_id": "b"}) == 2
+    assert len(index) == 1
+    assert [hit["id"] for hit in index.search("indemnity payment", 5)] == ["1"]
+    # Removed IDs can be added again.
+    index.add(["2"], ["payment terms are net 30"], [{"document_id": "b"}])
+    assert [hit["id"] for hit in index.search("payment", 5)] == ["2"]
+    assert index.remove({"document_id": "c"}) == 0
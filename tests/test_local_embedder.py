@@ -0,0 +1,76 @@
+# tests/test_local_embedder.py
+
+import asyncio
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+from backend.core.local_embedder import LocalEmbedder, plan_batches
+
+def test_batches_group_similar_lengths_within_the_budget():
+    lengths = [50, 3, 40, 4, 5, 45]
+    batches = plan_batches(lengths, max_batch_tokens=100, max_batch_size=8)
+    assert sorted(index for batch in batches for index in batch) == list(range(len(lengths)))
+    # Shortest first, and every batch pads to its longest member within the budget.
+    assert batches[0] == [1, 3, 4]
+    for batch in batches:
+        assert max(lengths[i] for i in batch) * len(batch) <= 100
+
+def test_batch_size_cap_and_oversized_texts():
+    assert plan_batches([1] * 5, max_batch_tokens=1000, max_batch_size=2) == [[0, 1], [2, 3], [4]]
+    # A text over the budget still gets embedded, on its own.
+    assert plan_batches([10, 500], max_batch_tokens=100, max_batch_size=8) == [[0], [1]]
+    assert plan_batches([], max_batch_tokens=100, max_batch_size=8) == []
+
+class _Model:
+    """Stands in for SentenceTransformer; fails if two threads use it at once."""
+
+    max_seq_length = 256
+
+    def __init__(self, model_name, backend, device, model_kwargs):
+        self.backend = backend
+        self.batches = []
+        self._busy = threading.Lock()
+
+    def tokenizer(self, texts, truncation, max_length, add_special_tokens):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("Already borrowed")
+        try:
+            time.sleep(0.01)
+            self.batches.append(list(texts))
+            return np.asarray([[float(len(text.split())), 1.0] for text in texts])
+        finally:
+            self._busy.release()
+
+def _embedder(monkeypatch, **kwargs) -> tuple[LocalEmbedder, list]:
+    threads = []
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=_Model))
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(set_num_threads=threads.append))
+    return LocalEmbedder(num_threads=3, **kwargs), threads
+
+def test_results_come_back_in_input_order(monkeypatch):
+    embedder, threads = _embedder(monkeypatch, max_batch_tokens=8)
+    texts = ["a b c d", "a", "a b", "a b c", "a b c d e f"]
+    vectors = asyncio.run(embedder.embed_documents(texts))
+    assert [vector[0] for vector in vectors] == [4.0, 1.0, 2.0, 3.0, 6.0]
+    assert len(embedder.model.batches) > 1
+    # The inference threads go to the runtime, not to concurrent calls on the model.
+    assert threads == [3]
+    assert embedder.model.backend == "torch"
+
+def test_concurrent_callers_never_share_the_model_at_once(monkeypatch):
+    embedder, _ = _embedder(monkeypatch, max_batch_tokens=4)
+
+    async def scenario():
+        return await asyncio.gather(*(
+            embedder.embed_documents([f"caller {i} text", "short"]) for i in range(4)
+        ))
+
+    results = asyncio.run(scenario())
+    assert all(result[0][0] == 3.0 and result[1][0] == 1.0 for result in results)
@@ -0,0 +1,88 @@
+# tests/test_parsers.py
+
+import codecs
+import io
+import zipfile
+
+from lxml import etree
+
+from backend.parsers import docx_parser, txt_parser
+
+_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+def _paragraph(text: str) -> str:
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+def _write_docx(path, body: str, footnotes: str | None = None):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {_NS}><w:body>{body}</w:body></w:document>")
+        if footnotes is not None:
+            archive.writestr("word/footnotes.xml", f"<w:footnotes {_NS}>{footnotes}</w:footnotes>")
+
+def test_docx_paragraphs_tables_and_footnotes(tmp_path):
+    path = tmp_path / "doc.docx"
+    table = (
+        "<w:tbl><w:tr>"
+        f"<w:tc>{_paragraph('a')}</w:tc><w:tc>{_paragraph('b')}{_paragraph('c')}</w:tc>"
+        "</w:tr></w:tbl>"
+    )
+    _write_docx(path, _paragraph("intro") + "<w:p/>" + table + _paragraph("outro"), _paragraph("a footnote"))
+    assert list(docx_parser.iter_docx_segments(str(path))) == [
+        (1, "intro"), (2, "a | b c"), (3, "outro"), (4, "a footnote"),
+    ]
+
+def test_release_drops_processed_siblings():
+    root = etree.fromstring("<body><p>1</p><p>2</p><p>3</p><p>4</p></body>")
+    docx_parser._release(root[2])
+    # Only the cleared element is left; the one after it hasn't been parsed yet in a real stream.
+    assert [child.text for child in root] == [None, "4"]
+
+def test_invalid_docx_raises_value_error(tmp_path):
+    path = tmp_path / "broken.docx"
+    path.write_bytes(b"not a zip")
+    try:
+        list(docx_parser.iter_docx_segments(str(path)))
+    except ValueError as e:
+        assert "Could not parse the DOCX file" in str(e)
+    else:
+        raise AssertionError("expected a ValueError")
+
+def test_large_docx_streams_from_the_process_pool(tmp_path, monkeypatch):
+    path = tmp_path / "large.docx"
+    _write_docx(path, "".join(_paragraph(f"paragraph {i}") for i in range(1000)))
+    monkeypatch.setattr(docx_parser, "CPU_WORKERS", 2)
+    monkeypatch.setattr(docx_parser, "POOL_MIN_BYTES", 0)
+    monkeypatch.setattr(docx_parser, "PARAGRAPHS_PER_BATCH", 64)
+    segments = list(docx_parser.iter_docx_segments(str(path)))
+    assert segments == [(i + 1, f"paragraph {i}") for i in range(1000)]
+
+    # Stopping early leaves no worker blocked on the queue.
+    stream = docx_parser.iter_docx_segments(str(path))
+    assert next(stream) == (1, "paragraph 0")
+    stream.close()
+
+def test_text_is_decoded_across_block_boundaries():
+    text = "Grüße, 世界! " * 1000
+    data = text.encode("utf-8")
+    stream = io.BytesIO(data)
+    # Tiny blocks split multi-byte characters; the incremental decoder has to stitch them.
+    assert "".join(txt_parser.iter_text(stream, block_size=7)) == text
+
+def test_text_encoding_detection():
+    assert txt_parser.detect_encoding(codecs.BOM_UTF16_LE + "hi".encode("utf-16-le"), complete=True) == "utf-16"
+    assert txt_parser.detect_encoding("naïve".encode("utf-8"), complete=True) == "utf-8"
+    # A sample cut inside a multi-byte character is still UTF-8.
+    assert txt_parser.detect_encoding("é".encode("utf-8")[:1], complete=False) == "utf-8"
+
+def test_txt_paragraphs_normalize_line_endings_across_blocks(monkeypatch):
+    monkeypatch.setattr(txt_parser, "SAMPLE_SIZE", 4)
+    data = b"first line\r\nstill first\r\n\r\nsecond\r\r\rthird\n\n\n"
+    paragraphs = list(txt_parser.iter_txt_paragraphs(io.BytesIO(data)))
+    assert paragraphs == ["first line\nstill first", "second", "third"]
+
+def test_txt_overlong_paragraph_is_cut_at_a_line_break(monkeypatch):
+    monkeypatch.setattr(txt_parser, "MAX_PARAGRAPH", 20)
+    data = ("x" * 12 + "\n") * 4
+    paragraphs = list(txt_parser.iter_txt_paragraphs(io.BytesIO(data.encode())))
+    assert paragraphs and all(len(paragraph) <= 20 for paragraph in paragraphs)
+    assert "".join(paragraphs).replace("\n", "") == "x" * 48
@@ -0,0 +1,77 @@
+# tests/test_prefetch.py
+
+import asyncio
+
+from backend.core.prefetch import RetrievalPrefetcher
+
+class _Retriever:
+    def __init__(self):
+        self.questions = []
+        self.release = asyncio.Event()
+
+    async def retrieve(self, collection_name, question, priority):
+        self.questions.append(question)
+        await self.release.wait()
+        return f"chunks for {question}"
+
+def test_take_returns_the_prefetched_retrieval():
+    async def scenario():
+        retriever = _Retriever()
+        prefetcher = RetrievalPrefetcher(retriever)
+        prefetcher.prefetch("session", "collection", "What about pricing?")
+        retriever.release.set()
+        # Normalized, so punctuation and case don't matter.
+        assert await prefetcher.take("session", "collection", "what about pricing") == "chunks for What about pricing?"
+        assert await prefetcher.take("session", "collection", "what about pricing") is None
+        assert await prefetcher.take("session", "other collection", "anything") is None
+        return prefetcher.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["hits"], stats["misses"], stats["running"]) == (1, 2, 0)
+
+def test_prefetches_beyond_the_cap_are_skipped():
+    async def scenario():
+        retriever = _Retriever()
+        prefetcher = RetrievalPrefetcher(retriever, max_running=2)
+        for question in ("one", "two", "three"):
+            prefetcher.prefetch("session", "collection", question)
+        assert prefetcher.stats()["skipped"] == 1
+        retriever.release.set()
+        await asyncio.gather(*prefetcher._tasks)
+        return prefetcher, retriever
+
+    prefetcher, retriever = asyncio.run(scenario())
+    assert retriever.questions == ["one", "two"]
+    assert prefetcher.stats()["running"] == 0
+
+def test_cancelled_before_starting_frees_its_slot():
+    async def scenario():
+        prefetcher = RetrievalPrefetcher(_Retriever(), max_running=1)
+        prefetcher.prefetch("session", "collection", "one")
+        # Cancelled before the event loop ever runs the coroutine.
+        for task in list(prefetcher._tasks):
+            task.cancel()
+        await asyncio.sleep(0)
+        return prefetcher
+
+    prefetcher = asyncio.run(scenario())
+    assert prefetcher.stats()["running"] == 0
+    assert not prefetcher._tasks
+
+def test_record_prefetches_suggestions_from_the_stream():
+    async def scenario():
+        retriever = _Retriever()
+        retriever.release.set()
+        prefetcher = RetrievalPrefetcher(retriever)
+
+        async def answer():
+            for piece in ("The answer.\nSUGG", "ESTION: Next question?\n", "SUGGESTION: Last one"):
+                yield piece
+
+        pieces = [piece async for piece in prefetcher.record(answer(), "session", "collection")]
+        await asyncio.gather(*prefetcher._tasks)
+        return pieces, retriever
+
+    pieces, retriever = asyncio.run(scenario())
+    assert "".join(pieces).startswith("The answer.")
+    assert retriever.questions == ["Next question?", "Last one"]
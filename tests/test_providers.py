@@ -0,0 +1,73 @@
+# tests/test_providers.py
+
+import asyncio
+import threading
+
+from backend.core.providers import ProviderNotReady, ProviderRegistry
+
+class _Client:
+    def __init__(self):
+        self.thread = threading.current_thread()
+
+    def ping(self):
+        return "pong"
+
+def test_a_coroutine_never_builds_a_provider():
+    registry = ProviderRegistry()
+    calls = []
+    client = registry.register("client", lambda: calls.append(1) or _Client())
+
+    async def use():
+        try:
+            client.ping()
+        except ProviderNotReady:
+            pass
+        else:
+            raise AssertionError("expected ProviderNotReady")
+        await registry.ensure_ready()
+        return client.ping()
+
+    assert asyncio.run(use()) == "pong"
+    assert calls == [1]
+    # Built on a worker thread, not the event loop's.
+    assert client.thread is not threading.main_thread()
+    assert registry.status()["providers"]["client"]["status"] == "ready"
+
+def test_ensure_ready_waits_for_warm_up():
+    registry = ProviderRegistry()
+    release = threading.Event()
+    client = registry.register("client", lambda: release.wait(5) and _Client())
+
+    async def scenario():
+        registry.start_warm_up()
+        waiting = asyncio.create_task(registry.ensure_ready())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        assert not registry.status()["ready"]
+        release.set()
+        await waiting
+        return registry.status()["ready"], client.ping()
+
+    assert asyncio.run(scenario()) == (True, "pong")
+
+def test_ensure_ready_retries_and_reports_a_failed_factory():
+    registry = ProviderRegistry()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("API unreachable")
+        return _Client()
+
+    client = registry.register("client", flaky)
+    try:
+        asyncio.run(registry.ensure_ready())
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("expected a ConnectionError")
+    assert registry.status()["providers"]["client"]["status"] == "failed"
+    asyncio.run(registry.ensure_ready())
+    assert client.ping() == "pong"
+    assert len(attempts) == 2
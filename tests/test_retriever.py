@@ -0,0 +1,73 @@
+# tests/test_retriever.py
+
+import asyncio
+
+import pytest
+
+from backend.core.retriever import HybridRetriever, document_filter, select_mmr
+
+QUERY = [1.0, 0.0, 0.0]
+CANDIDATES = [
+    [0.9, 0.436, 0.0],    # 0: the best match
+    [0.88, 0.475, 0.0],   # 1: a near-duplicate of 0
+    [0.8, -0.3, 0.52],    # 2: relevant, but about something else
+    [0.0, 0.0, 1.0],      # 3: unrelated
+]
+
+def test_relevance_only_and_diversified_order():
+    chosen, relevance = select_mmr(QUERY, CANDIDATES, 2, mmr_lambda=1.0)
+    assert chosen == [0, 1]
+    assert relevance == pytest.approx([0.9, 0.88, 0.8, 0.0], abs=1e-3)
+    # Weighting redundancy more makes the second pick cover something new.
+    assert select_mmr(QUERY, CANDIDATES, 2, mmr_lambda=0.7)[0] == [0, 2]
+
+def test_near_duplicates_are_skipped():
+    chosen, _ = select_mmr(QUERY, CANDIDATES, 3, mmr_lambda=1.0, duplicate_threshold=0.95)
+    assert chosen == [0, 2, 3]
+
+def test_similarity_cutoffs():
+    assert select_mmr(QUERY, CANDIDATES, 4, mmr_lambda=1.0, min_similarity=0.5)[0] == [0, 1, 2]
+    assert select_mmr(QUERY, CANDIDATES, 4, mmr_lambda=1.0, relative_cutoff=0.95)[0] == [0, 1]
+    # The most relevant candidate is kept even when nothing clears the cutoff.
+    assert select_mmr(QUERY, CANDIDATES, 4, min_similarity=2.0)[0] == [0]
+    assert select_mmr(QUERY, CANDIDATES, 4, min_similarity=2.0, min_results=0)[0] == []
+
+def test_token_budget():
+    chosen, _ = select_mmr(QUERY, CANDIDATES, 4, mmr_lambda=1.0, costs=[5, 10, 1, 1], token_budget=7)
+    # The near-duplicate doesn't fit after the first pick; smaller candidates still do.
+    assert chosen == [0, 2, 3]
+    # The guaranteed first result ignores the budget.
+    assert select_mmr(QUERY, CANDIDATES, 4, costs=[100, 100, 100, 100], token_budget=10)[0] == [0]
+
+def test_per_group_cap():
+    groups = ["a.pdf", "a.pdf", "b.pdf", "b.pdf"]
+    assert select_mmr(QUERY, CANDIDATES, 2, mmr_lambda=1.0, groups=groups, max_per_group=1)[0] == [0, 2]
+    # The cap gives way once only capped groups are left.
+    assert select_mmr(QUERY, CANDIDATES, 3, mmr_lambda=1.0, groups=["a.pdf"] * 4, max_per_group=1)[0] == [0, 1, 2]
+
+def test_no_candidates():
+    assert select_mmr(QUERY, [], 5) == ([], [])
+
+def test_document_filter():
+    assert document_filter(None) is None
+    assert document_filter(["a"]) == {"document_id": "a"}
+    assert document_filter(["a", "b"]) == {"document_id": {"$in": ["a", "b"]}}
+
+class _LexicalIndexes:
+    def search(self, collection_name, question, n_results, where):
+        return [
+            {"id": "1", "text": "Invoice INV-2291 totals $4,200.", "metadata": {"document_id": "a"}, "score": 9.5},
+            {"id": "2", "text": "Invoices are due in 30 days.", "metadata": {"document_id": "a"}, "score": 2.0},
+        ]
+
+class _Unused:
+    def __getattr__(self, name):
+        raise AssertionError(f"the fast path shouldn't need {name}")
+
+def test_lexical_fast_path_keeps_bm25_out_of_score():
+    retriever = HybridRetriever(_Unused(), _Unused(), _LexicalIndexes())
+    result = asyncio.run(retriever.retrieve("docs", "INV-2291 total"))
+    assert result.mode == "lexical"
+    assert result.query_embedding is None
+    # 'score' means cosine similarity, which the fast path never computes.
+    assert [(hit["score"], hit["lexical_score"]) for hit in result.hits] == [(None, 9.5), (None, 2.0)]
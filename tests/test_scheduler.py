@@ -0,0 +1,33 @@
+# tests/test_scheduler.py
+
+import threading
+
+from backend.core.scheduler import LeaderLock
+
+def _in_thread(function):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+def test_leader_stays_leader_on_other_threads(tmp_path):
+    lock = LeaderLock(str(tmp_path / "scheduler.lock"))
+    assert lock.is_leader()
+    # Scheduled jobs run on the scheduler's executor threads.
+    assert _in_thread(lock.is_leader)
+
+def test_only_one_lock_holder(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    leader, follower = LeaderLock(path), LeaderLock(path)
+    assert leader.is_leader()
+    assert not follower.is_leader()
+    assert not _in_thread(follower.is_leader)
+
+def test_leader_only_runs_jobs_from_worker_threads(tmp_path):
+    lock = LeaderLock(str(tmp_path / "scheduler.lock"))
+    assert lock.is_leader()
+    calls = []
+    job = lock.leader_only(lambda: calls.append("ran"))
+    _in_thread(job)
+    assert calls == ["ran"]
@@ -0,0 +1,158 @@
+# tests/test_session_manager.py
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from backend.core import scheduler
+from backend.core.lexical import lexical_index_registry
+from backend.core.scheduler import SessionManager
+from backend.vector_store import vector_store_instance
+from backend.vector_store.numpy_store import NumpyStore
+
+def _loaded_collection() -> str:
+    name = f"resident-{uuid.uuid4().hex}"
+    vector_store_instance.create_collection(name)
+    vector_store_instance.add_documents(name, ["some text"], [[1.0, 0.0]], [{"document_id": name}])
+    lexical_index_registry.get(name)
+    return name
+
+def test_coldest_collections_are_unloaded_past_the_resident_bound(tmp_path):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), memory_budget_bytes=None, max_resident=2)
+    names = [_loaded_collection() for _ in range(3)]
+    for name in names:
+        manager.mark_ready(name, 100)
+
+    assert list(manager._resident) == names[1:]
+    # The vector and lexical indexes are unloaded together; the collection stays on disk.
+    assert names[0] not in vector_store_instance._collections
+    assert names[0] not in lexical_index_registry.indexes
+    assert all(name in lexical_index_registry.indexes for name in names[1:])
+    assert vector_store_instance.get_documents(names[0])[0]["text"] == "some text"
+
+def test_memory_budget_unloads_by_size(tmp_path):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), memory_budget_bytes=250, max_resident=None)
+    names = [_loaded_collection() for _ in range(3)]
+    for name in names:
+        manager.mark_ready(name, 100)
+    assert list(manager._resident) == names[1:]
+    assert names[0] not in lexical_index_registry.indexes
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> NumpyStore:
+    # A store of their own, so reconciling doesn't touch other tests' collections.
+    store = NumpyStore(str(tmp_path / "vector_index"))
+    monkeypatch.setattr(scheduler, "vector_store_instance", store)
+    return store
+
+def _stored(store: NumpyStore, name: str) -> str:
+    store.create_collection(name)
+    store.add_documents(name, ["some text"], [[1.0, 0.0]], [{"document_id": name}])
+    return name
+
+def test_queries_slide_the_expiry(tmp_path, store):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), expiry_minutes=1)
+    manager.register_session("s", _stored(store, "docs"))
+    manager.expiry_seconds = 0.05
+    for _ in range(3):
+        time.sleep(0.03)
+        manager.touch("s")
+    # Well past the first expiry, but each query pushed it forward.
+    assert manager.get_collection("s") == "docs"
+    time.sleep(0.06)
+    assert manager.get_collection("s") is None
+    manager.cleanup_expired_sessions()
+    assert store.list_collections() == []
+    assert manager.stats()["collections"] == {}
+
+def test_shared_collection_outlives_one_session(tmp_path, store):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), expiry_minutes=0)
+    name, claimed = manager.claim_document("fingerprint", _stored(store, "docs"), "first")
+    assert claimed
+    manager.register_session("first", name)
+    manager.expiry_seconds = 60
+    assert manager.claim_document("fingerprint", "unused", "second") == ("docs", False)
+    manager._conn.execute("UPDATE sessions SET expires_at = 0 WHERE session_id = 'first'")
+    manager.cleanup_expired_sessions()
+    assert manager.get_collection("second") == "docs"
+    assert store.list_collections() == ["docs"]
+
+def test_release_and_attach_do_not_interleave(tmp_path, store, monkeypatch):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"))
+    manager.claim_document("fingerprint", _stored(store, "docs"), "old")
+    manager.register_session("old", "docs")
+    deleting, resume = threading.Event(), threading.Event()
+    delete_data = SessionManager._delete_data
+
+    def slow_delete(collection_name):
+        deleting.set()
+        resume.wait(5)
+        delete_data(collection_name)
+
+    monkeypatch.setattr(manager, "_delete_data", slow_delete)
+    releasing = threading.Thread(target=manager._release, args=("old",))
+    releasing.start()
+    assert deleting.wait(5)
+    # An upload of the same document arrives while the last reference is being dropped.
+    results = []
+    attaching = threading.Thread(target=lambda: results.append(manager.claim_document("fingerprint", "docs", "new")))
+    attaching.start()
+    time.sleep(0.05)
+    assert results == []  # Waits for the deletion instead of attaching to it.
+    resume.set()
+    releasing.join()
+    attaching.join()
+    # The document is gone, so the new upload claims it afresh.
+    assert results == [("docs", True)]
+    assert "docs" not in store.list_collections()
+
+def test_disk_budget_evicts_least_recently_used(tmp_path, store):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), disk_budget_bytes=250, memory_budget_bytes=None)
+    for name in ("a", "b", "c"):
+        manager.register_session(f"session-{name}", _stored(store, name))
+        manager.mark_ready(name, 100)
+        time.sleep(0.01)
+    # Over budget once the third is ready: the least recently used one goes, with its sessions.
+    assert store.list_collections() == ["b", "c"]
+    assert manager.get_collection("session-a") is None
+    manager.touch("session-b")
+    manager.register_session("session-d", _stored(store, "d"))
+    manager.mark_ready("d", 100)
+    assert store.list_collections() == ["b", "d"]
+
+def test_disk_budget_can_evict_largest_first(tmp_path, store):
+    manager = SessionManager(
+        path=str(tmp_path / "sessions.db"), disk_budget_bytes=250, memory_budget_bytes=None, eviction_policy="largest"
+    )
+    for name, size in (("a", 50), ("b", 150), ("c", 100)):
+        manager.register_session(f"session-{name}", _stored(store, name))
+        manager.mark_ready(name, size)
+    assert store.list_collections() == ["a", "c"]
+
+def test_touch_keeps_a_collection_resident(tmp_path, store):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), memory_budget_bytes=None, max_resident=2)
+    for name in ("a", "b"):
+        manager.register_session(f"session-{name}", _stored(store, name))
+        manager.mark_ready(name, 100)
+    manager.touch("session-a")
+    manager.register_session("session-c", _stored(store, "c"))
+    manager.mark_ready("c", 100)
+    assert list(manager._resident) == ["a", "c"]
+
+def test_reconcile_after_a_restart(tmp_path, store):
+    manager = SessionManager(path=str(tmp_path / "sessions.db"), memory_budget_bytes=None)
+    manager.register_session("ready", _stored(store, "ready"))
+    manager.mark_ready("ready", 100)
+    manager.register_session("interrupted", _stored(store, "interrupted"))
+    manager.register_session("vanished", "vanished")
+    _stored(store, "orphan")
+
+    restarted = SessionManager(path=str(tmp_path / "sessions.db"), memory_budget_bytes=None)
+    restarted.reconcile()
+    assert store.list_collections() == ["ready"]
+    assert restarted.get_collection("ready") == "ready"
+    assert restarted.get_collection("interrupted") is None
+    assert restarted.get_collection("vanished") is None
+    assert restarted.stats()["collections"] == {"ready": 1}
@@ -0,0 +1,85 @@
+# tests/test_streaming.py
+
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from backend.core.streaming import SuggestionSplitter, accepts_gzip, answer_events, gzip_stream
+
+def _split(pieces: list[str]) -> list[tuple[str, str]]:
+    splitter = SuggestionSplitter()
+    events = [event for piece in pieces for event in splitter.feed(piece)]
+    return events + splitter.flush()
+
+def _merged(events):
+    """Joins adjacent token events, since where tokens are cut depends on the pieces."""
+    merged = []
+    for kind, text in events:
+        if merged and kind == "token" and merged[-1][0] == "token":
+            merged[-1] = ("token", merged[-1][1] + text)
+        else:
+            merged.append((kind, text))
+    return merged
+
+ANSWER = "The answer is 42.\nIt says so on page 3.\nSUGGESTION: Why 42?\n  SUGGESTION: What is on page 4?"
+EXPECTED = [
+    ("token", "The answer is 42.\nIt says so on page 3.\n"),
+    ("suggestion", "Why 42?"),
+    ("suggestion", "What is on page 4?"),
+]
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7, len(ANSWER)])
+def test_suggestions_are_split_out_however_the_stream_is_cut(piece_size):
+    pieces = [ANSWER[i:i + piece_size] for i in range(0, len(ANSWER), piece_size)]
+    assert _merged(_split(pieces)) == EXPECTED
+
+def test_text_is_released_without_waiting_for_the_line_end():
+    splitter = SuggestionSplitter()
+    # Can't be a suggestion line, so it streams straight away.
+    assert splitter.feed("Hello wor") == [("token", "Hello wor")]
+    # Might still become "SUGGESTION:", so it is held back.
+    assert splitter.feed("\nSUG") == [("token", "\n")]
+    assert splitter.feed("AR is sweet") == [("token", "SUGAR is sweet")]
+
+def test_marker_mid_line_is_plain_text():
+    assert _merged(_split(["See SUGGESTION: below\n"])) == [("token", "See SUGGESTION: below\n")]
+
+def test_empty_suggestion_is_dropped():
+    assert _split(["Done.\n", "SUGGESTION:   "]) == [("token", "Done.\n")]
+
+def test_answer_events_frame_the_stream():
+    async def answer():
+        for piece in ("Hi.\nSUGGESTION: ", "More?\n"):
+            yield piece
+
+    async def collect(use_sse):
+        events = answer_events(answer(), {"type": "sources", "sources": []}, {"prompt_tokens": 3}, 0.0, 0.25, use_sse)
+        return [event async for event in events]
+
+    lines = asyncio.run(collect(use_sse=False))
+    events = [json.loads(line) for line in lines]
+    assert [event["type"] for event in events] == ["sources", "token", "suggestion", "usage"]
+    assert events[2]["text"] == "More?"
+    assert events[-1]["usage"] == {"prompt_tokens": 3}
+    assert events[-1]["timing"]["retrieval_ms"] == 250.0
+
+    sse = asyncio.run(collect(use_sse=True))
+    assert sse[0].startswith("event: sources\ndata: ") and sse[0].endswith("\n\n")
+
+def test_gzip_stream_round_trips():
+    async def pieces():
+        for piece in ("first\n", "second\n"):
+            yield piece
+
+    async def collect():
+        return b"".join([chunk async for chunk in gzip_stream(pieces())])
+
+    assert gzip.decompress(asyncio.run(collect())) == b"first\nsecond\n"
+
+def test_accepts_gzip():
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip(None)
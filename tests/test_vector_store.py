@@ -0,0 +1,80 @@
+# tests/test_vector_store.py
+
+import numpy as np
+import pytest
+
+from backend.vector_store.base import matches_where
+from backend.vector_store.numpy_store import NumpyStore
+
+def test_matches_where_operators():
+    metadata = {"document_id": "a", "page": 3}
+    assert matches_where(metadata, None)
+    assert matches_where(metadata, {"document_id": "a"})
+    assert not matches_where(metadata, {"document_id": "b"})
+    assert matches_where(metadata, {"page": {"$eq": 3}})
+    assert matches_where(metadata, {"page": {"$ne": 4}})
+    assert matches_where(metadata, {"document_id": {"$in": ["a", "b"]}})
+    assert not matches_where(metadata, {"document_id": {"$nin": ["a"]}})
+    assert matches_where(metadata, {"$and": [{"document_id": "a"}, {"page": 3}]})
+    assert not matches_where(metadata, {"$and": [{"document_id": "a"}, {"page": 4}]})
+    assert matches_where(metadata, {"$or": [{"document_id": "b"}, {"page": 3}]})
+    # A missing field never equals a value.
+    assert not matches_where({}, {"document_id": "a"})
+    with pytest.raises(ValueError):
+        matches_where(metadata, {"page": {"$gt": 1}})
+
+def _store(tmp_path, dtype="float32") -> NumpyStore:
+    store = NumpyStore(str(tmp_path), dtype=dtype)
+    store.create_collection("docs")
+    store.add_documents(
+        "docs",
+        ["alpha", "beta", "gamma", "delta"],
+        [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]],
+        [{"document_id": "a"}, {"document_id": "b"}, {"document_id": "a"}, {"document_id": "b"}],
+        ids=["1", "2", "3", "4"],
+    )
+    return store
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_search_filters_by_metadata(tmp_path, dtype):
+    store = _store(tmp_path, dtype)
+    hits = store.search("docs", [1.0, 0.0], n_results=4, where={"document_id": "b"})
+    assert [hit["id"] for hit in hits] == ["2", "4"]
+    assert hits[0]["score"] == pytest.approx(0.9 / (0.82 ** 0.5), abs=0.02)
+
+def test_delete_documents_survives_reload(tmp_path):
+    store = _store(tmp_path)
+    store.delete_documents("docs", {"document_id": "a"})
+    assert [document["id"] for document in store.get_documents("docs")] == ["2", "4"]
+    assert [hit["id"] for hit in store.search("docs", [1.0, 0.0], n_results=4)] == ["2", "4"]
+
+    reopened = NumpyStore(str(tmp_path))
+    assert [document["text"] for document in reopened.get_documents("docs")] == ["beta", "delta"]
+    assert reopened.get_embeddings("docs", ["1", "4"]).keys() == {"4"}
+
+def test_delete_documents_needs_a_filter(tmp_path):
+    with pytest.raises(ValueError):
+        _store(tmp_path).delete_documents("docs", {})
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_batches_grow_the_files_in_place(tmp_path, dtype):
+    store = _store(tmp_path, dtype)
+    vectors_path = tmp_path / "docs" / "vectors.npy"
+    inode = vectors_path.stat().st_ino
+    store.add_documents("docs", ["epsilon"], [[-1.0, 0.0]], [{"document_id": "c"}], ids=["5"])
+    # Appended to the existing file rather than written out again.
+    assert vectors_path.stat().st_ino == inode
+    assert [hit["id"] for hit in store.search("docs", [-1.0, 0.0], n_results=1)] == ["5"]
+
+    reopened = NumpyStore(str(tmp_path), dtype=dtype)
+    assert [document["id"] for document in reopened.get_documents("docs")] == ["1", "2", "3", "4", "5"]
+    assert reopened.get_embeddings("docs", ["5"])["5"] == pytest.approx([-1.0, 0.0], abs=0.01)
+
+def test_interrupted_append_is_overwritten(tmp_path):
+    store = _store(tmp_path, "int8")
+    # Scales written but the vectors not: the stray scale row must not shift later ones.
+    NumpyStore._append_array(str(tmp_path / "docs" / "scales.npy"), np.ones(1, dtype=np.float32), 4)
+    reopened = NumpyStore(str(tmp_path), dtype="int8")
+    reopened.add_documents("docs", ["epsilon"], [[-1.0, 0.0]], [{"document_id": "c"}], ids=["5"])
+    hits = NumpyStore(str(tmp_path), dtype="int8").search("docs", [-1.0, 0.0], n_results=1)
+    assert hits[0]["id"] == "5" and hits[0]["score"] == pytest.approx(1.0, abs=0.01)